@@ -0,0 +1,278 @@
+"""Admission control for `/otlp`: a concurrency limit plus per-service and per-user quotas.
+
+Each resource span is charged against token buckets for its `service.name`
+and for the authenticated user, with one bucket for span rate and one for byte
+rate. Spans beyond what the buckets allow are cut from the payload before it
+is parsed or written, and the response reports them as a partial success.
+Error spans take a priority lane: they are always admitted and charged to the
+buckets afterwards, so a throttled service still reports its failures.
+
+`ADMISSION_BACKEND=memory` keeps buckets per process. `ADMISSION_BACKEND=database`
+keeps them in the `admission_buckets` table so every API worker shares them.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
+
+from .config import get_settings
+from .db import SessionLocal
+from .ingest import DEFAULT_SERVICE_NAME, ERROR_STATUS, resource_attributes
+from .metrics import REGISTRY
+from .models import AdmissionBucket
+from .serialization import dumps
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# The in-memory store sweeps full buckets once it holds this many (or twice the survivors of the last sweep).
+_SWEEP_MIN_BUCKETS = 1024
+
+ADMISSION_SPANS = REGISTRY.counter(
+    "tracefoundry_admission_spans_total",
+    "Spans offered to /otlp by outcome (accepted, priority, rejected).",
+    ("service", "outcome"),
+)
+ADMISSION_THROTTLED = REGISTRY.counter(
+    "tracefoundry_admission_throttled_spans_total",
+    "Spans rejected by ingest quotas, by the quota that ran out.",
+    ("scope", "subject", "unit"),
+)
+ADMISSION_OVERLOADED = REGISTRY.counter(
+    "tracefoundry_admission_overloaded_requests_total",
+    "Ingest requests rejected because the concurrency limit was reached.",
+)
+ADMISSION_IN_FLIGHT = REGISTRY.gauge(
+    "tracefoundry_admission_in_flight_requests",
+    "Ingest requests currently being processed.",
+)
+
+
+@dataclass(frozen=True)
+class Limit:
+    """One token bucket: `rate` tokens per second, `cost` tokens per span."""
+
+    scope: str
+    subject: str
+    unit: str
+    rate: float
+    cost: float
+
+    @property
+    def key(self) -> str:
+        return f"{self.scope}:{self.unit}:{self.subject}"
+
+    @property
+    def burst(self) -> float:
+        return self.rate * settings.admission_burst_seconds
+
+
+@dataclass
+class AdmissionResult:
+    payload: Dict[str, Any]
+    accepted_spans: int = 0
+    rejected_spans: int = 0
+    limited_by: List[Limit] = field(default_factory=list)
+
+    @property
+    def error_message(self) -> str:
+        quotas = sorted({f"{limit.scope} {limit.subject!r} ({limit.unit})" for limit in self.limited_by})
+        return "ingest quota exceeded for " + ", ".join(quotas)
+
+
+class MemoryBucketStore:
+    """Buckets of this process; buckets back at full capacity are swept out as the dict grows."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # key -> (tokens, updated_at, time the bucket is full again)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._sweep_at = _SWEEP_MIN_BUCKETS
+
+    def acquire(self, limits: Sequence[Limit], wanted: int, forced: int) -> Tuple[int, Optional[Limit]]:
+        """Grant up to `wanted` spans plus `forced` priority spans; returns the grant and the limiting bucket."""
+        now = time.monotonic()
+        with self._lock:
+            levels = {}
+            for limit in limits:
+                state = self._buckets.get(limit.key)
+                levels[limit.key] = _refill(limit, state[:2] if state else None, now)
+            granted, limiting = _grant(limits, levels, wanted)
+            for limit in limits:
+                tokens = _charge(limit, levels[limit.key], granted + forced)
+                self._buckets[limit.key] = (tokens, now, now + (limit.burst - tokens) / limit.rate)
+            if len(self._buckets) >= self._sweep_at:
+                self._sweep(now)
+        return granted, limiting
+
+    def _sweep(self, now: float) -> None:
+        # A missing bucket starts full, so dropping full ones changes no decision;
+        # bucket keys carry client-supplied service names and would otherwise pile up.
+        for key in [key for key, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[key]
+        self._sweep_at = max(_SWEEP_MIN_BUCKETS, 2 * len(self._buckets))
+
+
+class DatabaseBucketStore:
+    """Buckets shared by every API worker; rows are locked for update where the database supports it."""
+
+    def acquire(self, limits: Sequence[Limit], wanted: int, forced: int) -> Tuple[int, Optional[Limit]]:
+        try:
+            return self._acquire(limits, wanted, forced)
+        except IntegrityError:
+            # Another worker created one of the buckets concurrently; it exists now,
+            # so the second attempt locks and charges it.
+            return self._acquire(limits, wanted, forced)
+
+    def _acquire(self, limits: Sequence[Limit], wanted: int, forced: int) -> Tuple[int, Optional[Limit]]:
+        now = time.time()
+        db = SessionLocal()
+        try:
+            rows = {
+                row.key: row
+                for row in db.query(AdmissionBucket)
+                .filter(AdmissionBucket.key.in_([limit.key for limit in limits]))
+                .order_by(AdmissionBucket.key)
+                .with_for_update()
+                .all()
+            }
+            levels = {
+                limit.key: _refill(
+                    limit,
+                    (rows[limit.key].tokens, rows[limit.key].updated_at) if limit.key in rows else None,
+                    now,
+                )
+                for limit in limits
+            }
+            granted, limiting = _grant(limits, levels, wanted)
+            for limit in limits:
+                tokens = _charge(limit, levels[limit.key], granted + forced)
+                row = rows.get(limit.key)
+                if row is None:
+                    db.add(AdmissionBucket(key=limit.key, tokens=tokens, updated_at=now))
+                else:
+                    row.tokens = tokens
+                    row.updated_at = now
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return granted, limiting
+
+
+class AdmissionController:
+    def __init__(self, store: Optional[Any] = None) -> None:
+        if store is None:
+            store = DatabaseBucketStore() if settings.admission_backend == "database" else MemoryBucketStore()
+        self.store = store
+        self._slots = threading.BoundedSemaphore(settings.admission_max_concurrent_requests)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold one in-flight ingest slot; rejects with 429 instead of queueing."""
+        if not self._slots.acquire(blocking=False):
+            ADMISSION_OVERLOADED.inc()
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="ingest_overloaded",
+                headers={"Retry-After": "1"},
+            )
+        ADMISSION_IN_FLIGHT.inc()
+        try:
+            yield
+        finally:
+            ADMISSION_IN_FLIGHT.dec()
+            self._slots.release()
+
+    def admit(self, payload: Dict[str, Any], username: str) -> AdmissionResult:
+        """Charge each resource span to its quotas and cut the spans they do not cover."""
+        result = AdmissionResult(payload=payload)
+        admitted: List[Dict[str, Any]] = []
+        for resource_span in payload.get("resource_spans", []):
+            spans = [span for scope in resource_span.get("scope_spans", []) for span in scope.get("spans", [])]
+            if not spans:
+                admitted.append(resource_span)
+                continue
+            service = resource_attributes(resource_span).get("service.name", DEFAULT_SERVICE_NAME)
+            priority = sum(1 for span in spans if _is_priority(span))
+            bytes_per_span = len(dumps(resource_span)) / len(spans)
+            limits = self._limits(str(service), username, bytes_per_span)
+            granted, limiting = self.store.acquire(limits, len(spans) - priority, priority)
+            rejected = len(spans) - priority - granted
+            ADMISSION_SPANS.inc(granted, service=service, outcome="accepted")
+            if priority:
+                ADMISSION_SPANS.inc(priority, service=service, outcome="priority")
+            result.accepted_spans += granted + priority
+            if not rejected:
+                admitted.append(resource_span)
+                continue
+            ADMISSION_SPANS.inc(rejected, service=service, outcome="rejected")
+            if limiting is not None:
+                ADMISSION_THROTTLED.inc(
+                    rejected, scope=limiting.scope, subject=limiting.subject, unit=limiting.unit
+                )
+                result.limited_by.append(limiting)
+            result.rejected_spans += rejected
+            admitted.append(_keep_spans(resource_span, granted))
+        if result.rejected_spans:
+            result.payload = {**payload, "resource_spans": admitted}
+            logger.info("admission rejected %d spans: %s", result.rejected_spans, result.error_message)
+        return result
+
+    def _limits(self, service: str, username: str, bytes_per_span: float) -> List[Limit]:
+        candidates = (
+            Limit("service", service, "spans", settings.admission_service_spans_per_second, 1.0),
+            Limit("service", service, "bytes", settings.admission_service_bytes_per_second, bytes_per_span),
+            Limit("user", username, "spans", settings.admission_user_spans_per_second, 1.0),
+            Limit("user", username, "bytes", settings.admission_user_bytes_per_second, bytes_per_span),
+        )
+        return [limit for limit in candidates if limit.rate > 0]
+
+
+def _is_priority(span: Dict[str, Any]) -> bool:
+    return settings.admission_priority_errors and (span.get("status") or {}).get("code") == ERROR_STATUS
+
+
+def _keep_spans(resource_span: Dict[str, Any], budget: int) -> Dict[str, Any]:
+    """Copy of `resource_span` with its priority spans and the first `budget` other spans."""
+    scope_spans = []
+    for scope in resource_span.get("scope_spans", []):
+        kept = []
+        for span in scope.get("spans", []):
+            if _is_priority(span):
+                kept.append(span)
+            elif budget > 0:
+                kept.append(span)
+                budget -= 1
+        scope_spans.append({**scope, "spans": kept})
+    return {**resource_span, "scope_spans": scope_spans}
+
+
+def _refill(limit: Limit, state: Optional[Tuple[float, float]], now: float) -> float:
+    if state is None:
+        return limit.burst
+    tokens, updated_at = state
+    return min(limit.burst, tokens + max(0.0, now - updated_at) * limit.rate)
+
+
+def _grant(limits: Sequence[Limit], levels: Dict[str, float], wanted: int) -> Tuple[int, Optional[Limit]]:
+    granted, limiting = wanted, None
+    for limit in limits:
+        allowed = max(0, int(levels[limit.key] // limit.cost)) if limit.cost > 0 else wanted
+        if allowed < granted:
+            granted, limiting = allowed, limit
+    return granted, limiting
+
+
+def _charge(limit: Limit, level: float, spans: int) -> float:
+    # Priority spans may overdraw a bucket, but never below one burst of debt.
+    return max(-limit.burst, level - spans * limit.cost)
@@ -0,0 +1,277 @@
+"""Per-trace timing analysis: critical path, self time and operation breakdown."""
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, defer
+
+from .archive import load_trace_spans
+from .config import get_settings
+from .ingest import ERROR_STATUS
+from .models import Span, Trace, TraceAnalysis
+from .sampling import DECISION_SUMMARY
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+TOOL_NAME_ATTRIBUTE = "tracefoundry.tool.name"
+
+
+class _Node:
+    __slots__ = ("span", "start", "end", "children", "self_ms", "overlap_ms", "critical_ms")
+
+    def __init__(self, span: Any, start: float, end: float) -> None:
+        self.span = span
+        self.start = start
+        self.end = end
+        self.children: List[_Node] = []
+        self.self_ms = end - start
+        self.overlap_ms = 0.0
+        self.critical_ms = 0.0
+
+
+def analyze_spans(spans: Sequence[Any]) -> Dict[str, Any]:
+    """Compute timing analysis for the spans of one trace in O(n log n).
+
+    Spans are any objects exposing the `Span` model attributes. The result is
+    JSON-serializable and matches `schemas.TraceAnalysis`.
+    """
+    origin = min((s.start_time for s in spans if s.start_time), default=None)
+    nodes: Dict[str, _Node] = {}
+    for span in spans:
+        start = _offset_ms(origin, span.start_time)
+        end = _offset_ms(origin, span.end_time)
+        if end is None:
+            end = (start or 0.0) + (span.duration_ms or 0.0)
+        if start is None:
+            start = end - (span.duration_ms or 0.0)
+        nodes[span.span_id] = _Node(span, start, max(start, end))
+
+    roots: List[_Node] = []
+    for node in nodes.values():
+        parent = nodes.get(node.span.parent_span_id or "")
+        if parent is None or parent is node:
+            roots.append(node)
+        else:
+            parent.children.append(node)
+
+    for node in nodes.values():
+        _apply_self_time(node)
+
+    critical_path: List[Dict[str, Any]] = []
+    if roots:
+        primary = max(roots, key=lambda n: (n.end - n.start, -n.start))
+        critical_path = _critical_path(primary)
+
+    operations = _operation_breakdown(nodes.values())
+    slowest_tool = _slowest_tool(nodes.values())
+    return {
+        "span_count": len(nodes),
+        "critical_path_ms": sum(segment["critical_ms"] for segment in critical_path),
+        "critical_path": critical_path,
+        "spans": [
+            {
+                "span_id": span_id,
+                "self_ms": node.self_ms,
+                "child_overlap_ms": node.overlap_ms,
+                "critical_ms": node.critical_ms,
+            }
+            for span_id, node in nodes.items()
+        ],
+        "operations": operations,
+        "slowest_tool": slowest_tool,
+        "error_span_count": sum(op["error_count"] for op in operations),
+    }
+
+
+def run_analysis_pass(db: Session, now: Optional[datetime] = None) -> int:
+    """Analyze quiescent traces whose spans changed since the last analysis.
+
+    A trace is quiescent once its root span has arrived (spans are exported on
+    end) and no span has been ingested for `ANALYSIS_IDLE_SECONDS`, or once it
+    has been idle for `ANALYSIS_ORPHAN_SECONDS` without a root. A trace that
+    fails to analyze is logged and skipped until more spans arrive.
+    """
+    now = now or datetime.utcnow()
+    idle_cutoff = now - timedelta(seconds=settings.analysis_idle_seconds)
+    orphan_cutoff = now - timedelta(seconds=settings.analysis_orphan_seconds)
+    traces = (
+        db.query(Trace)
+        .filter(
+            Trace.last_span_at.isnot(None),
+            or_(Trace.sampling_decision.is_(None), Trace.sampling_decision != DECISION_SUMMARY),
+            or_(Trace.analyzed_at.is_(None), Trace.analyzed_at < Trace.last_span_at),
+            or_(
+                (Trace.root_span_name.isnot(None)) & (Trace.last_span_at <= idle_cutoff),
+                Trace.last_span_at <= orphan_cutoff,
+            ),
+        )
+        .order_by(Trace.last_span_at.asc())
+        .limit(settings.analysis_batch_size)
+        .all()
+    )
+    for trace in traces:
+        try:
+            result = analyze_spans(_trace_spans(db, trace))
+        except Exception:
+            # Stamp it anyway so one bad trace (e.g. a missing archive) does not stall
+            # every pass; it is retried when new spans arrive.
+            logger.exception("analysis of trace %s failed", trace.trace_id)
+            trace.analyzed_at = now
+            continue
+        store_analysis(db, trace, result, now)
+    db.commit()
+    return len(traces)
+
+
+def _trace_spans(db: Session, trace: Trace) -> Sequence[Any]:
+    if trace.archive_ref:
+        return load_trace_spans(db, trace.trace_id, trace.archive_ref)
+    return (
+        db.query(Span)
+        .filter(Span.trace_id == trace.trace_id)
+        .options(defer(Span.events), defer(Span.resource))
+        .all()
+    )
+
+
+def store_analysis(db: Session, trace: Trace, result: Dict[str, Any], analyzed_at: datetime) -> None:
+    row = db.get(TraceAnalysis, trace.trace_id)
+    if row is None:
+        row = TraceAnalysis(trace_id=trace.trace_id)
+        db.add(row)
+    row.result = result
+    row.analyzed_at = analyzed_at
+    slowest_tool = result.get("slowest_tool") or {}
+    trace.analyzed_at = analyzed_at
+    trace.critical_path_ms = result["critical_path_ms"]
+    trace.error_span_count = result["error_span_count"]
+    trace.slowest_tool = slowest_tool.get("tool_name")
+    trace.slowest_tool_ms = slowest_tool.get("duration_ms")
+
+
+def _offset_ms(origin: Optional[datetime], value: Optional[datetime]) -> Optional[float]:
+    if origin is None or value is None:
+        return None
+    return (value - origin).total_seconds() * 1000
+
+
+def _apply_self_time(node: _Node) -> None:
+    if not node.children:
+        return
+    intervals = sorted(
+        (max(child.start, node.start), min(child.end, node.end)) for child in node.children
+    )
+    covered = 0.0
+    clipped_total = 0.0
+    run_start, run_end = None, None
+    for start, end in intervals:
+        if end <= start:
+            continue
+        clipped_total += end - start
+        if run_end is None or start > run_end:
+            if run_end is not None:
+                covered += run_end - run_start
+            run_start, run_end = start, end
+        else:
+            run_end = max(run_end, end)
+    if run_end is not None:
+        covered += run_end - run_start
+    node.self_ms = max(0.0, (node.end - node.start) - covered)
+    node.overlap_ms = clipped_total - covered
+
+
+def _critical_path(root: _Node) -> List[Dict[str, Any]]:
+    """Walk backwards from the root's end, following the last-finishing child.
+
+    Iterative so very deep traces do not hit the recursion limit.
+    """
+    for node_children in _iter_with_children(root):
+        node_children.children.sort(key=lambda child: child.end, reverse=True)
+    path: List[_Node] = [root]
+    # Each frame: node, cursor (end of the not-yet-attributed window), next child index.
+    stack: List[List[Any]] = [[root, root.end, 0]]
+    while stack:
+        frame = stack[-1]
+        node, cursor, index = frame
+        pushed = False
+        while index < len(node.children) and cursor > node.start:
+            child = node.children[index]
+            index += 1
+            if child.start >= cursor:
+                continue
+            clip_end = min(child.end, cursor)
+            node.critical_ms += cursor - clip_end
+            frame[1] = max(child.start, node.start)
+            frame[2] = index
+            path.append(child)
+            stack.append([child, clip_end, 0])
+            pushed = True
+            break
+        if pushed:
+            continue
+        node.critical_ms += max(0.0, cursor - node.start)
+        stack.pop()
+    return [
+        {
+            "span_id": node.span.span_id,
+            "name": node.span.name,
+            "critical_ms": node.critical_ms,
+        }
+        for node in path
+    ]
+
+
+def _iter_with_children(root: _Node):
+    pending = [root]
+    while pending:
+        node = pending.pop()
+        if node.children:
+            yield node
+            pending.extend(node.children)
+
+
+def _operation_breakdown(nodes) -> List[Dict[str, Any]]:
+    operations: Dict[str, Dict[str, Any]] = {}
+    for node in nodes:
+        name = node.span.name or "span"
+        op = operations.get(name)
+        if op is None:
+            op = operations[name] = {
+                "name": name,
+                "count": 0,
+                "total_ms": 0.0,
+                "self_ms": 0.0,
+                "max_ms": 0.0,
+                "critical_ms": 0.0,
+                "error_count": 0,
+            }
+        duration = node.end - node.start
+        op["count"] += 1
+        op["total_ms"] += duration
+        op["self_ms"] += node.self_ms
+        op["max_ms"] = max(op["max_ms"], duration)
+        op["critical_ms"] += node.critical_ms
+        if node.span.status_code == ERROR_STATUS:
+            op["error_count"] += 1
+    return sorted(operations.values(), key=lambda op: op["total_ms"], reverse=True)
+
+
+def _slowest_tool(nodes) -> Optional[Dict[str, Any]]:
+    slowest: Optional[_Node] = None
+    for node in nodes:
+        attributes = node.span.attributes or {}
+        if not attributes.get(TOOL_NAME_ATTRIBUTE):
+            continue
+        if slowest is None or node.end - node.start > slowest.end - slowest.start:
+            slowest = node
+    if slowest is None:
+        return None
+    return {
+        "span_id": slowest.span.span_id,
+        "tool_name": str(slowest.span.attributes[TOOL_NAME_ATTRIBUTE]),
+        "duration_ms": slowest.end - slowest.start,
+    }
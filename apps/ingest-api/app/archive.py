@@ -0,0 +1,343 @@
+"""Cold storage: compact finished traces into compressed per-trace span archives.
+
+An archive is one zlib-compressed JSON document per trace holding its spans
+column by column, stored in the payload store. The `Trace` row keeps its
+summary plus `archive_ref`, and `archived_spans` maps span ids back to their
+trace so single-span lookups keep working.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, selectinload
+
+from .config import get_settings
+from .models import ArchivedSpan, PayloadBlob, Span, SpanPayloadRef, Trace
+from .payloads import PayloadNotFound, delete_payload, read_payload, store_payload
+from .sampling import DECISION_SUMMARY
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMAT = "tracefoundry.spans.columnar.v1"
+ARCHIVE_CONTENT_TYPE = "application/vnd.tracefoundry.spans+json"
+ARCHIVE_COMPRESSION = "zlib"
+_COLUMNS = (
+    "span_id",
+    "parent_span_id",
+    "name",
+    "kind",
+    "start_time",
+    "end_time",
+    "duration_ms",
+    "status_code",
+    "error_type",
+    "attributes",
+    "events",
+)
+
+
+class ArchiveUnavailable(Exception):
+    """An archive's payload is missing from the payload store or cannot be decoded."""
+
+
+@dataclass(frozen=True)
+class ArchivedPayloadRef:
+    payload_ref: str
+    payload_role: str
+
+
+@dataclass(frozen=True)
+class ArchivedSpanRecord:
+    """Read-only span decoded from an archive; duck-types the `Span` model."""
+
+    trace_id: str
+    span_id: str
+    parent_span_id: Optional[str]
+    name: str
+    kind: Optional[str]
+    start_time: Optional[datetime]
+    end_time: Optional[datetime]
+    duration_ms: Optional[float]
+    status_code: Optional[str]
+    error_type: Optional[str]
+    attributes: Any
+    events: Any
+    resource: Any
+    payload_refs: Tuple[ArchivedPayloadRef, ...] = field(default=())
+
+
+@dataclass(frozen=True)
+class DecodedArchive:
+    spans: Tuple[ArchivedSpanRecord, ...]
+    by_id: Dict[str, ArchivedSpanRecord]
+
+
+def encode_archive(trace_id: str, spans: Sequence[Span]) -> bytes:
+    columns: Dict[str, List[Any]] = {name: [] for name in _COLUMNS}
+    resources: List[Any] = []
+    resource_index: Dict[str, int] = {}
+    resource_ids: List[int] = []
+    payload_refs: List[List[List[str]]] = []
+    for span in spans:
+        for name in _COLUMNS:
+            value = getattr(span, name)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            columns[name].append(value)
+        # Every span of a trace usually shares one resource; store each once.
+        resource_key = json.dumps(span.resource, sort_keys=True, default=str)
+        if resource_key not in resource_index:
+            resource_index[resource_key] = len(resources)
+            resources.append(span.resource)
+        resource_ids.append(resource_index[resource_key])
+        payload_refs.append([[ref.payload_ref, ref.payload_role] for ref in span.payload_refs])
+    document = {
+        "format": ARCHIVE_FORMAT,
+        "trace_id": trace_id,
+        "columns": columns,
+        "resources": resources,
+        "resource_ids": resource_ids,
+        "payload_refs": payload_refs,
+    }
+    raw = json.dumps(document, separators=(",", ":"), default=str).encode("utf-8")
+    return zlib.compress(raw, 9)
+
+
+def decode_archive(blob: bytes) -> DecodedArchive:
+    document = json.loads(zlib.decompress(blob))
+    if document.get("format") != ARCHIVE_FORMAT:
+        raise ValueError(f"unsupported archive format: {document.get('format')}")
+    columns = document["columns"]
+    resources = document["resources"]
+    trace_id = document["trace_id"]
+    records = []
+    for index, span_id in enumerate(columns["span_id"]):
+        records.append(
+            ArchivedSpanRecord(
+                trace_id=trace_id,
+                span_id=span_id,
+                parent_span_id=columns["parent_span_id"][index],
+                name=columns["name"][index],
+                kind=columns["kind"][index],
+                start_time=_parse_datetime(columns["start_time"][index]),
+                end_time=_parse_datetime(columns["end_time"][index]),
+                duration_ms=columns["duration_ms"][index],
+                status_code=columns["status_code"][index],
+                error_type=columns["error_type"][index],
+                attributes=columns["attributes"][index],
+                events=columns["events"][index],
+                resource=resources[document["resource_ids"][index]],
+                payload_refs=tuple(
+                    ArchivedPayloadRef(payload_ref=ref, payload_role=role)
+                    for ref, role in document["payload_refs"][index]
+                ),
+            )
+        )
+    records.sort(key=span_order_key)
+    return DecodedArchive(spans=tuple(records), by_id={r.span_id: r for r in records})
+
+
+@lru_cache(maxsize=settings.archive_cache_size)
+def load_archive(archive_ref: str) -> DecodedArchive:
+    """Decode an archive; cached because archives are content-addressed and immutable."""
+    try:
+        return decode_archive(read_payload(archive_ref))
+    except (PayloadNotFound, ValueError, zlib.error) as exc:
+        raise ArchiveUnavailable(archive_ref) from exc
+
+
+def load_trace_spans(db: Session, trace_id: str, archive_ref: str) -> List[Any]:
+    """All spans of an archived trace, merged with rows ingested after compaction."""
+    merged: Dict[str, Any] = dict(load_archive(archive_ref).by_id)
+    late_rows = (
+        db.query(Span)
+        .filter(Span.trace_id == trace_id)
+        .options(selectinload(Span.payload_refs))
+        .all()
+    )
+    for span in late_rows:
+        merged[span.span_id] = span
+    return sorted(merged.values(), key=span_order_key)
+
+
+def find_archived_span(db: Session, span_id: str) -> Optional[Any]:
+    entry = db.get(ArchivedSpan, span_id)
+    if entry is None:
+        return None
+    archive_ref = db.query(Trace.archive_ref).filter(Trace.trace_id == entry.trace_id).scalar()
+    if not archive_ref:
+        return None
+    return load_archive(archive_ref).by_id.get(span_id)
+
+
+def select_spans(
+    spans: Sequence[Any],
+    *,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    subtree_root: Optional[str] = None,
+    max_depth: Optional[int] = None,
+    after: Optional[Tuple[Optional[datetime], str]] = None,
+) -> List[Any]:
+    """In-memory equivalent of the span list filters applied in SQL for row-stored traces.
+
+    `spans` must already be ordered by `span_order_key`.
+    """
+    selected = list(spans)
+    if start is not None:
+        selected = [s for s in selected if s.end_time is None or s.end_time >= start]
+    if end is not None:
+        selected = [s for s in selected if s.start_time is not None and s.start_time < end]
+    if subtree_root:
+        members = _subtree_members(spans, subtree_root, max_depth)
+        selected = [s for s in selected if s.span_id in members]
+    if after is not None:
+        position = span_order_key_for(*after)
+        selected = [s for s in selected if span_order_key(s) > position]
+    return selected
+
+
+def span_order_key(span: Any) -> Tuple[bool, datetime, str]:
+    return span_order_key_for(span.start_time, span.span_id)
+
+
+def span_order_key_for(start_time: Optional[datetime], span_id: str) -> Tuple[bool, datetime, str]:
+    # Matches `start_time ASC NULLS LAST, span_id ASC`.
+    return (start_time is None, start_time or datetime.min, span_id)
+
+
+def run_compaction_pass(db: Session, now: Optional[datetime] = None) -> int:
+    """Archive traces older than `ARCHIVE_AFTER_HOURS` and drop their span rows.
+
+    Archived traces that received spans after compaction are re-archived once
+    those late rows are idle as long, so the rows do not linger; the archive
+    they replace is deleted after the commit. A trace whose archive is missing
+    is logged and left as it is until more spans arrive.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(hours=settings.archive_after_hours)
+    traces = (
+        db.query(Trace)
+        .filter(
+            or_(Trace.archive_ref.is_(None), Trace.last_span_at > Trace.archived_at),
+            or_(Trace.sampling_decision.is_(None), Trace.sampling_decision != DECISION_SUMMARY),
+            Trace.started_at < cutoff,
+            or_(Trace.last_span_at.is_(None), Trace.last_span_at < cutoff),
+        )
+        .order_by(Trace.started_at.asc())
+        .limit(settings.archive_batch_size)
+        .all()
+    )
+    replaced: List[str] = []
+    for trace in traces:
+        previous = trace.archive_ref
+        try:
+            archive_ref = compact_trace(db, trace, now)
+        except ArchiveUnavailable:
+            logger.exception("cannot re-archive trace %s: archive %s is unavailable", trace.trace_id, previous)
+            trace.archived_at = now
+            continue
+        if previous and archive_ref and archive_ref != previous:
+            replaced.append(previous)
+    db.commit()
+    if replaced:
+        delete_archives(db, replaced)
+    return len(traces)
+
+
+def delete_archives(db: Session, archive_refs: Sequence[str]) -> None:
+    """Delete replaced archives that no trace references any more, rows first, then files."""
+    in_use = {
+        ref for (ref,) in db.query(Trace.archive_ref).filter(Trace.archive_ref.in_(archive_refs))
+    }
+    unused = [ref for ref in archive_refs if ref not in in_use]
+    if not unused:
+        return
+    db.query(PayloadBlob).filter(PayloadBlob.payload_ref.in_(unused)).delete(synchronize_session=False)
+    db.commit()
+    for ref in unused:
+        delete_payload(ref)
+
+
+def compact_trace(db: Session, trace: Trace, archived_at: datetime) -> Optional[str]:
+    rows = (
+        db.query(Span)
+        .filter(Span.trace_id == trace.trace_id)
+        .options(selectinload(Span.payload_refs))
+        .all()
+    )
+    if not rows:
+        if trace.archive_ref:
+            # Touched without new span rows; nothing to fold in.
+            trace.archived_at = archived_at
+        return None
+    merged: Dict[str, Any] = {}
+    if trace.archive_ref:
+        # Fold late rows into a new archive; a re-sent span replaces its archived copy.
+        merged = dict(load_archive(trace.archive_ref).by_id)
+    archived_ids = set(merged)
+    merged.update((span.span_id, span) for span in rows)
+    # Encode in a fixed order so the same spans always give the same archive ref.
+    spans = sorted(merged.values(), key=span_order_key)
+    blob = encode_archive(trace.trace_id, spans)
+    archive_ref, archive_path = store_payload(
+        blob, content_type=ARCHIVE_CONTENT_TYPE, compression=ARCHIVE_COMPRESSION
+    )
+    if db.get(PayloadBlob, archive_ref) is None:
+        db.add(
+            PayloadBlob(
+                payload_ref=archive_ref,
+                content_type=ARCHIVE_CONTENT_TYPE,
+                compression=ARCHIVE_COMPRESSION,
+                byte_length=len(blob),
+                storage_path=str(archive_path),
+            )
+        )
+    db.add_all(
+        ArchivedSpan(span_id=span.span_id, trace_id=trace.trace_id)
+        for span in rows
+        if span.span_id not in archived_ids
+    )
+    db.query(SpanPayloadRef).filter(SpanPayloadRef.trace_id == trace.trace_id).delete(
+        synchronize_session=False
+    )
+    db.query(Span).filter(Span.trace_id == trace.trace_id).delete(synchronize_session=False)
+    trace.archive_ref = archive_ref
+    trace.archived_at = archived_at
+    logger.info(
+        "archived trace %s: %d spans into %d bytes", trace.trace_id, len(spans), len(blob)
+    )
+    return archive_ref
+
+
+def _subtree_members(spans: Sequence[Any], root_span_id: str, max_depth: Optional[int]) -> set:
+    children: Dict[str, List[str]] = {}
+    known = set()
+    for span in spans:
+        known.add(span.span_id)
+        if span.parent_span_id:
+            children.setdefault(span.parent_span_id, []).append(span.span_id)
+    if root_span_id not in known:
+        return set()
+    members = {root_span_id}
+    frontier = [root_span_id]
+    depth = 0
+    while frontier and (max_depth is None or depth < max_depth):
+        frontier = [
+            child for parent in frontier for child in children.get(parent, []) if child not in members
+        ]
+        members.update(frontier)
+        depth += 1
+    return members
+
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
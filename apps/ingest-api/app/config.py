@@ -22,6 +22,55 @@ class Settings(BaseSettings):
     attribute_allowlist_path: Path = Field(
         Path("deploy/trace-allowlist.yaml"), alias="ATTRIBUTE_ALLOWLIST_PATH"
     )
+    gzip_minimum_size: int = Field(1024, alias="GZIP_MINIMUM_SIZE")
+    stream_threshold_rows: int = Field(1000, alias="STREAM_THRESHOLD_ROWS")
+    sampling_enabled: bool = Field(False, alias="SAMPLING_ENABLED")
+    sampling_buffer_bytes: int = Field(64 * 1024 * 1024, alias="SAMPLING_BUFFER_BYTES")
+    sampling_spill_dir: Path = Field(Path("/data/sampling-spill"), alias="SAMPLING_SPILL_DIR")
+    sampling_decision_wait_seconds: float = Field(5.0, alias="SAMPLING_DECISION_WAIT_SECONDS")
+    sampling_trace_timeout_seconds: float = Field(120.0, alias="SAMPLING_TRACE_TIMEOUT_SECONDS")
+    sampling_decision_cache_size: int = Field(100_000, alias="SAMPLING_DECISION_CACHE_SIZE")
+    sampling_slow_ms: float = Field(10_000.0, alias="SAMPLING_SLOW_MS")
+    sampling_cost_usd: float = Field(0.05, alias="SAMPLING_COST_USD")
+    sampling_baseline_rate: float = Field(0.05, alias="SAMPLING_BASELINE_RATE")
+    sampling_default_action: str = Field("summary", alias="SAMPLING_DEFAULT_ACTION")
+    sampling_flag_events: str = Field("retry,timeout", alias="SAMPLING_FLAG_EVENTS")
+    admission_enabled: bool = Field(False, alias="ADMISSION_ENABLED")
+    admission_backend: str = Field("memory", alias="ADMISSION_BACKEND")
+    admission_max_concurrent_requests: int = Field(32, alias="ADMISSION_MAX_CONCURRENT_REQUESTS")
+    admission_burst_seconds: float = Field(10.0, alias="ADMISSION_BURST_SECONDS")
+    admission_service_spans_per_second: float = Field(
+        2000.0, alias="ADMISSION_SERVICE_SPANS_PER_SECOND"
+    )
+    admission_service_bytes_per_second: float = Field(
+        8 * 1024 * 1024, alias="ADMISSION_SERVICE_BYTES_PER_SECOND"
+    )
+    admission_user_spans_per_second: float = Field(10_000.0, alias="ADMISSION_USER_SPANS_PER_SECOND")
+    admission_user_bytes_per_second: float = Field(
+        32 * 1024 * 1024, alias="ADMISSION_USER_BYTES_PER_SECOND"
+    )
+    admission_priority_errors: bool = Field(True, alias="ADMISSION_PRIORITY_ERRORS")
+    sketches_enabled: bool = Field(True, alias="SKETCHES_ENABLED")
+    sketch_relative_accuracy: float = Field(0.01, alias="SKETCH_RELATIVE_ACCURACY")
+    sketch_max_bins: int = Field(2048, alias="SKETCH_MAX_BINS")
+    sketch_bucket_seconds: int = Field(3600, alias="SKETCH_BUCKET_SECONDS")
+    sketch_rollup_seconds: int = Field(86400, alias="SKETCH_ROLLUP_SECONDS")
+    live_backend: str = Field("memory", alias="LIVE_BACKEND")
+    live_subscriber_buffer: int = Field(256, alias="LIVE_SUBSCRIBER_BUFFER")
+    live_replay_size: int = Field(1000, alias="LIVE_REPLAY_SIZE")
+    live_poll_interval_seconds: float = Field(0.5, alias="LIVE_POLL_INTERVAL_SECONDS")
+    live_keepalive_seconds: float = Field(15.0, alias="LIVE_KEEPALIVE_SECONDS")
+    live_gap_timeout_seconds: float = Field(30.0, alias="LIVE_GAP_TIMEOUT_SECONDS")
+    worker_enabled: bool = Field(True, alias="WORKER_ENABLED")
+    worker_interval_seconds: float = Field(5.0, alias="WORKER_INTERVAL_SECONDS")
+    worker_task_budget_seconds: float = Field(4.0, alias="WORKER_TASK_BUDGET_SECONDS")
+    analysis_idle_seconds: int = Field(30, alias="ANALYSIS_IDLE_SECONDS")
+    analysis_orphan_seconds: int = Field(600, alias="ANALYSIS_ORPHAN_SECONDS")
+    analysis_batch_size: int = Field(50, alias="ANALYSIS_BATCH_SIZE")
+    archive_enabled: bool = Field(True, alias="ARCHIVE_ENABLED")
+    archive_after_hours: float = Field(24, alias="ARCHIVE_AFTER_HOURS")
+    archive_batch_size: int = Field(20, alias="ARCHIVE_BATCH_SIZE")
+    archive_cache_size: int = Field(64, alias="ARCHIVE_CACHE_SIZE")
 
     class Config:
         env_file = ".env"
@@ -1,17 +1,57 @@
 """Database primitives."""
 from __future__ import annotations
 
-from sqlalchemy import create_engine
+import json
+import logging
+import re
+from typing import Any, List, Union
+
+import orjson
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError, ProgrammingError
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.schema import CreateColumn
 
 from .config import get_settings
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 connect_args = {}
 if settings.db_url.startswith("sqlite"):
     connect_args = {"check_same_thread": False}
 
-engine = create_engine(settings.db_url, future=True, echo=False, connect_args=connect_args)
+
+# orjson reads integers outside 64 bits as floats; documents with such a long
+# digit run are decoded by json instead so attributes come back unchanged.
+_LONG_DIGITS = re.compile(r"\d{20}")
+
+
+def _json_serializer(value: Any) -> str:
+    # Imported here: serialization imports the models, which import this module.
+    from .serialization import dumps
+
+    return dumps(value).decode("utf-8")
+
+
+def _json_deserializer(text: Union[str, bytes]) -> Any:
+    if isinstance(text, (bytes, bytearray, memoryview)):
+        # psycopg hands JSON columns over as bytes.
+        text = bytes(text).decode("utf-8")
+    if _LONG_DIGITS.search(text):
+        return json.loads(text)
+    return orjson.loads(text)
+
+
+engine = create_engine(
+    settings.db_url,
+    future=True,
+    echo=False,
+    connect_args=connect_args,
+    json_serializer=_json_serializer,
+    json_deserializer=_json_deserializer,
+)
+
 SessionLocal = sessionmaker(bind=engine, autoflush=True, autocommit=False, future=True)
 
 Base = declarative_base()
@@ -23,3 +63,53 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def create_missing_indexes(bind: Engine = engine) -> None:
+    """Create indexes that models gained after their table was created.
+
+    `create_all` skips existing tables, so an existing database would lack
+    e.g. the span paging indexes. Safe to run on every startup and from
+    several workers at once.
+    """
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        for index in table.indexes:
+            try:
+                index.create(bind, checkfirst=True)
+            except (OperationalError, ProgrammingError):
+                # Another worker created it first.
+                logger.info("index %s already created", index.name)
+
+
+def upgrade_schema(bind: Engine = engine) -> List[str]:
+    """Add columns that models gained after their table was created.
+
+    `create_all` only creates missing tables, so an existing database would
+    lack newer columns. Only nullable additions are expected here. Safe to run
+    on every startup and from several workers at once; returns the
+    `table.column` names it added.
+    """
+    inspector = inspect(bind)
+    preparer = bind.dialect.identifier_preparer
+    added: List[str] = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = CreateColumn(column).compile(dialect=bind.dialect)
+            try:
+                with bind.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}"))
+            except (OperationalError, ProgrammingError):
+                # Another worker added it first.
+                logger.info("column %s.%s already added", table.name, column.name)
+                continue
+            logger.info("added column %s.%s", table.name, column.name)
+            added.append(f"{table.name}.{column.name}")
+    return added
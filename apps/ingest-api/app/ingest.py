@@ -0,0 +1,309 @@
+"""OTLP/JSON span parsing and persistence."""
+from __future__ import annotations
+
+import base64
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .models import ArchivedSpan, PayloadBlob, Span, SpanPayloadRef, Trace
+from .payloads import store_payload
+
+settings = get_settings()
+
+DEFAULT_SERVICE_NAME = "demo-agent"
+COST_ATTRIBUTE = "tracefoundry.cost.usd_estimate"
+ERROR_STATUS = "STATUS_CODE_ERROR"
+
+
+@dataclass
+class SpanRecord:
+    """One span parsed from an OTLP/JSON request, allowlisted and normalized."""
+
+    trace_id: str
+    span_id: str
+    parent_span_id: Optional[str]
+    name: str
+    kind: Optional[str]
+    start_time: Optional[datetime]
+    end_time: Optional[datetime]
+    duration_ms: Optional[float]
+    status_code: Optional[str]
+    error_type: Optional[str]
+    attributes: Dict[str, Any]
+    events: List[Dict[str, Any]]
+    resource: Dict[str, Any]
+    service_name: str
+    environment: str
+    payloads: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def parse_otlp(payload: Dict[str, Any]) -> List[SpanRecord]:
+    records: List[SpanRecord] = []
+    for resource_span in payload.get("resource_spans", []):
+        records.extend(parse_resource_span(resource_span))
+    return records
+
+
+def resource_attributes(resource_span: Dict[str, Any]) -> Dict[str, Any]:
+    return _attributes_to_dict(resource_span.get("resource", {}).get("attributes"))
+
+
+def parse_resource_span(resource_span: Dict[str, Any]) -> List[SpanRecord]:
+    resource = resource_attributes(resource_span)
+    service_name = resource.get("service.name", DEFAULT_SERVICE_NAME)
+    environment = resource.get("deployment.environment", settings.tracefoundry_env)
+    records: List[SpanRecord] = []
+    for scope in resource_span.get("scope_spans", []):
+        for span in scope.get("spans", []):
+            trace_id = span.get("trace_id")
+            span_id = span.get("span_id")
+            if not trace_id or not span_id:
+                continue
+            start_time = _parse_time(span.get("start_time_unix_nano"))
+            end_time = _parse_time(span.get("end_time_unix_nano"))
+            records.append(
+                SpanRecord(
+                    trace_id=trace_id,
+                    span_id=span_id,
+                    parent_span_id=span.get("parent_span_id") or None,
+                    name=span.get("name", "span"),
+                    kind=span.get("kind"),
+                    start_time=start_time,
+                    end_time=end_time,
+                    duration_ms=_duration_ms(start_time, end_time),
+                    status_code=(span.get("status") or {}).get("code"),
+                    error_type=(span.get("status") or {}).get("message"),
+                    attributes=_allowlist_attributes(_attributes_to_dict(span.get("attributes"))),
+                    events=_normalize_events(span.get("events")),
+                    resource=resource,
+                    service_name=service_name,
+                    environment=environment,
+                    payloads=span.get("tracefoundry_payloads", []) or [],
+                )
+            )
+    return records
+
+
+def persist_records(db: Session, records: Iterable[SpanRecord], *, summary_only: bool = False) -> None:
+    """Upsert spans and fold them into their trace summaries; the caller commits.
+
+    With `summary_only` the trace summary is updated but no span rows or
+    payloads are written; there is nothing to dedupe against, so every record
+    counts as a new span and callers pass each span once (see `TailSampler`).
+    """
+    for record in records:
+        trace = db.query(Trace).filter(Trace.trace_id == record.trace_id).one_or_none()
+        if trace is None:
+            trace = Trace(trace_id=record.trace_id)
+            db.add(trace)
+            db.flush()
+        trace.service_name = record.service_name
+        trace.environment = record.environment
+        trace.last_span_at = datetime.utcnow()
+
+        is_new_span = True
+        if not summary_only:
+            span_obj = db.query(Span).filter(Span.span_id == record.span_id).one_or_none()
+            is_new_span = span_obj is None
+            if is_new_span and trace.archive_ref:
+                # A re-sent span of an archived trace is already counted.
+                is_new_span = db.get(ArchivedSpan, record.span_id) is None
+            if span_obj is None:
+                span_obj = Span(trace_id=record.trace_id, span_id=record.span_id)
+            span_obj.parent_span_id = record.parent_span_id
+            span_obj.name = record.name
+            span_obj.kind = record.kind
+            span_obj.start_time = to_naive_utc(record.start_time)
+            span_obj.end_time = to_naive_utc(record.end_time)
+            span_obj.duration_ms = record.duration_ms
+            span_obj.status_code = record.status_code
+            span_obj.error_type = record.error_type
+            span_obj.attributes = record.attributes
+            span_obj.events = record.events
+            span_obj.resource = record.resource
+            db.add(span_obj)
+        if is_new_span:
+            trace.span_count = (trace.span_count or 0) + 1
+        if record.parent_span_id is None:
+            trace.root_span_name = record.name
+        prior_start = trace.started_at
+        trace.started_at = min_with_default(trace.started_at, record.start_time)
+        reference_start = trace.started_at or prior_start or to_naive_utc(record.start_time)
+        if reference_start and record.end_time:
+            duration = (to_naive_utc(record.end_time) - reference_start).total_seconds() * 1000
+            trace.duration_ms = max(trace.duration_ms or 0, duration)
+        trace.status_code = _choose_status(trace.status_code, record.status_code)
+        attributes = record.attributes
+        if attributes.get("gen_ai.request.model"):
+            trace.model = attributes["gen_ai.request.model"]
+        trace.token_in = _sum_optional(trace.token_in, attributes.get("gen_ai.usage.input_tokens"))
+        trace.token_out = _sum_optional(trace.token_out, attributes.get("gen_ai.usage.output_tokens"))
+        trace.cost_usd_estimate = _sum_optional(trace.cost_usd_estimate, attributes.get(COST_ATTRIBUTE))
+
+        if not summary_only:
+            for payload_entry in record.payloads:
+                _persist_payload(db, record.trace_id, record.span_id, payload_entry)
+
+
+def _persist_payload(db: Session, trace_id: str, span_id: str, payload_entry: Dict[str, Any]) -> None:
+    content_type = payload_entry.get("content_type", "application/octet-stream")
+    data = payload_entry.get("data")
+    if data is None:
+        return
+    if payload_entry.get("encoding") == "base64":
+        content = base64.b64decode(data)
+    else:
+        content = data.encode("utf-8") if isinstance(data, str) else bytes(data)
+    payload_ref, payload_path = store_payload(content, content_type=content_type)
+    blob = db.query(PayloadBlob).filter(PayloadBlob.payload_ref == payload_ref).one_or_none()
+    if blob is None:
+        blob = PayloadBlob(
+            payload_ref=payload_ref,
+            content_type=content_type,
+            compression="none",
+            byte_length=len(content),
+            storage_path=str(payload_path),
+        )
+        db.add(blob)
+    link_exists = (
+        db.query(SpanPayloadRef)
+        .filter(
+            SpanPayloadRef.span_id == span_id,
+            SpanPayloadRef.payload_ref == payload_ref,
+            SpanPayloadRef.payload_role == payload_entry.get("role", "other"),
+        )
+        .one_or_none()
+    )
+    if not link_exists:
+        db.add(
+            SpanPayloadRef(
+                trace_id=trace_id,
+                span_id=span_id,
+                payload_ref=payload_ref,
+                payload_role=payload_entry.get("role", "other"),
+            )
+        )
+
+
+def _attributes_to_dict(attrs: Any) -> Dict[str, Any]:
+    if isinstance(attrs, dict):
+        return attrs
+    result: Dict[str, Any] = {}
+    if not isinstance(attrs, Iterable):
+        return result
+    for item in attrs or []:
+        key = item.get("key") if isinstance(item, dict) else None
+        if not key:
+            continue
+        value = item.get("value", {}) if isinstance(item, dict) else {}
+        if isinstance(value, dict):
+            for candidate_key in [
+                "string_value",
+                "int_value",
+                "double_value",
+                "bool_value",
+                "array_value",
+            ]:
+                if candidate_key in value:
+                    result[key] = value[candidate_key]
+                    break
+        else:
+            result[key] = value
+    return result
+
+
+def _normalize_events(events: Any) -> Any:
+    if events is None:
+        return []
+    normalized = []
+    for event in events:
+        name = event.get("name") if isinstance(event, dict) else None
+        attrs = _attributes_to_dict(event.get("attributes")) if isinstance(event, dict) else {}
+        normalized.append({"name": name, "attributes": attrs, "time_unix_nano": event.get("time_unix_nano")})
+    return normalized
+
+
+def _parse_time(unix_nano: Optional[Any]) -> Optional[datetime]:
+    if not unix_nano:
+        return None
+    try:
+        unix_nano = int(unix_nano)
+    except (TypeError, ValueError):
+        return None
+    seconds = unix_nano / 1_000_000_000
+    return datetime.fromtimestamp(seconds, tz=timezone.utc)
+
+
+def _duration_ms(start: Optional[datetime], end: Optional[datetime]) -> Optional[float]:
+    if start and end:
+        return (to_naive_utc(end) - to_naive_utc(start)).total_seconds() * 1000
+    return None
+
+
+def min_with_default(current: Optional[datetime], candidate: Optional[datetime]) -> Optional[datetime]:
+    if current is None:
+        return candidate
+    if candidate is None:
+        return current
+    current_naive = to_naive_utc(current)
+    candidate_naive = to_naive_utc(candidate)
+    if current_naive is None:
+        return candidate_naive
+    return candidate_naive if candidate_naive < current_naive else current_naive
+
+
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _choose_status(existing: Optional[str], new: Optional[str]) -> Optional[str]:
+    priority = {ERROR_STATUS: 2, "STATUS_CODE_UNSET": 1, "STATUS_CODE_OK": 0}
+    existing_priority = priority.get(existing or "STATUS_CODE_UNSET", 0)
+    new_priority = priority.get(new or "STATUS_CODE_UNSET", 0)
+    return new if new_priority >= existing_priority else existing
+
+
+def _sum_optional(current: Optional[float], addend: Optional[Any]) -> Optional[float]:
+    if addend is None:
+        return current
+    try:
+        add_value = float(addend)
+    except (TypeError, ValueError):
+        return current
+    if current is None:
+        return add_value
+    return current + add_value
+
+
+def _allowlist_attributes(attrs: Dict[str, Any]) -> Dict[str, Any]:
+    allowlist = _load_allowlist()
+    clean_attrs: Dict[str, Any] = {}
+    for key, value in attrs.items():
+        if key in allowlist or key.startswith("tracefoundry.payload"):
+            clean_attrs[key] = value
+    return clean_attrs
+
+
+@lru_cache
+def _load_allowlist() -> set[str]:
+    values: set[str] = set()
+    try:
+        with open(settings.attribute_allowlist_path, "r", encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if line.startswith("- "):
+                    values.add(line[2:].strip())
+    except FileNotFoundError:
+        pass
+    return values
@@ -0,0 +1,264 @@
+"""Live-tail pub/sub for trace summaries.
+
+Ingest publishes the summaries of traces it just committed. Subscribers are
+Server-Sent Events streams, each with a bounded queue. A subscriber whose
+queue overflows is disconnected and can resume from its last event id.
+
+`LIVE_BACKEND=memory` fans out within one process. `LIVE_BACKEND=database`
+appends events to the `live_events` table and every API worker polls it, so
+several workers share one stream. Event ids come from a database sequence, so
+a lower id can commit after a higher one; the poller keeps the skipped ids as
+gaps and re-checks them for `LIVE_GAP_TIMEOUT_SECONDS` before giving up on
+them (a rolled-back insert leaves a permanent gap).
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .db import SessionLocal
+from .metrics import REGISTRY
+from .models import LiveEvent, Trace
+from .serialization import TRACE_SUMMARY_COLUMNS, dumps, trace_to_dict
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+FILTER_FIELDS = {
+    "service": "service_name",
+    "env": "environment",
+    "status": "status_code",
+    "model": "model",
+}
+
+LIVE_SUBSCRIBERS = REGISTRY.gauge(
+    "tracefoundry_live_subscribers", "Open live-tail subscriptions in this process."
+)
+LIVE_EVENTS = REGISTRY.counter(
+    "tracefoundry_live_events_total", "Trace summary events published to live tail."
+)
+LIVE_DROPPED = REGISTRY.counter(
+    "tracefoundry_live_dropped_subscribers_total",
+    "Live-tail subscribers disconnected because their buffer overflowed.",
+)
+
+
+@dataclass(frozen=True)
+class TraceEvent:
+    id: int
+    summary: Dict[str, Any]
+    data: bytes
+
+
+class Subscription:
+    """One subscriber's bounded queue; touched only on its event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, filters: Dict[str, str]) -> None:
+        self.loop = loop
+        self.filters = {FILTER_FIELDS[key]: value for key, value in filters.items() if value}
+        self.queue: "asyncio.Queue[Optional[TraceEvent]]" = asyncio.Queue(
+            maxsize=settings.live_subscriber_buffer
+        )
+        self.dropped = False
+
+    def matches(self, summary: Dict[str, Any]) -> bool:
+        return all(summary.get(field) == value for field, value in self.filters.items())
+
+    def push(self, event: TraceEvent) -> None:
+        if self.dropped or not self.matches(event.summary):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped = True
+            LIVE_DROPPED.inc()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class LiveHub:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscriptions: List[Subscription] = []
+        self._recent: Deque[TraceEvent] = deque(maxlen=settings.live_replay_size)
+        self._ids = itertools.count(1)
+        self._stop = threading.Event()
+        self._poller: Optional[threading.Thread] = None
+
+    @property
+    def shared(self) -> bool:
+        return settings.live_backend == "database"
+
+    def start(self) -> None:
+        if not self.shared or self._poller is not None:
+            return
+        self._stop.clear()
+        self._poller = threading.Thread(target=self._poll, name="tracefoundry-live", daemon=True)
+        self._poller.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._poller is not None:
+            self._poller.join(timeout=5)
+            self._poller = None
+
+    def subscribe(self, filters: Dict[str, str]) -> Subscription:
+        subscription = Subscription(asyncio.get_running_loop(), filters)
+        with self._lock:
+            self._subscriptions.append(subscription)
+            LIVE_SUBSCRIBERS.set(len(self._subscriptions))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+            LIVE_SUBSCRIBERS.set(len(self._subscriptions))
+
+    def replay(self, last_event_id: int, subscription: Subscription) -> List[TraceEvent]:
+        """Events after `last_event_id` that match the subscription, oldest first.
+
+        The shared backend also returns events created within the gap timeout,
+        which may have committed after `last_event_id` was sent despite a lower
+        id; callers dedupe by id.
+        """
+        if self.shared:
+            overlap = datetime.utcnow() - timedelta(seconds=settings.live_gap_timeout_seconds)
+            db = SessionLocal()
+            try:
+                rows = (
+                    db.query(LiveEvent)
+                    .filter(or_(LiveEvent.id > last_event_id, LiveEvent.created_at >= overlap))
+                    .order_by(LiveEvent.id.asc())
+                    .limit(settings.live_replay_size)
+                    .all()
+                )
+                events = [_event_from_row(row) for row in rows]
+            finally:
+                db.close()
+        else:
+            with self._lock:
+                events = [event for event in self._recent if event.id > last_event_id]
+        return [event for event in events if subscription.matches(event.summary)]
+
+    def publish_traces(self, db: Session, trace_ids: Iterable[str]) -> None:
+        """Publish current summaries of `trace_ids`; call after the ingest commit."""
+        trace_ids = list(dict.fromkeys(trace_ids))
+        if not trace_ids:
+            return
+        rows = db.query(*TRACE_SUMMARY_COLUMNS).filter(Trace.trace_id.in_(trace_ids)).all()
+        summaries = [trace_to_dict(row) for row in rows]
+        if self.shared:
+            db.add_all(LiveEvent(summary=_jsonable(summary)) for summary in summaries)
+            db.commit()
+            return
+        with self._lock:
+            events = [TraceEvent(next(self._ids), s, dumps(s)) for s in summaries]
+            self._recent.extend(events)
+        self._deliver(events)
+
+    def prune(self, db: Session) -> int:
+        """Worker task: keep only the newest `LIVE_REPLAY_SIZE` shared events."""
+        if not self.shared:
+            return 0
+        newest = db.query(LiveEvent.id).order_by(LiveEvent.id.desc()).limit(1).scalar()
+        if newest is None:
+            return 0
+        removed = (
+            db.query(LiveEvent)
+            .filter(LiveEvent.id <= newest - settings.live_replay_size)
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        return removed
+
+    def _deliver(self, events: List[TraceEvent]) -> None:
+        if not events:
+            return
+        LIVE_EVENTS.inc(len(events))
+        with self._lock:
+            by_loop: Dict[asyncio.AbstractEventLoop, List[Subscription]] = {}
+            for subscription in self._subscriptions:
+                by_loop.setdefault(subscription.loop, []).append(subscription)
+        for loop, subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_push_all, subscriptions, events)
+            except RuntimeError:
+                # The subscriber's loop has shut down.
+                continue
+
+    def _poll(self) -> None:
+        db = SessionLocal()
+        try:
+            last_id = db.query(LiveEvent.id).order_by(LiveEvent.id.desc()).limit(1).scalar() or 0
+        finally:
+            db.close()
+        # Ids skipped over by a newer commit -> when they were first missed.
+        gaps: Dict[int, float] = {}
+        while not self._stop.wait(settings.live_poll_interval_seconds):
+            db = SessionLocal()
+            try:
+                condition = LiveEvent.id > last_id
+                if gaps:
+                    condition = or_(condition, LiveEvent.id.in_(list(gaps)))
+                rows = db.query(LiveEvent).filter(condition).order_by(LiveEvent.id.asc()).all()
+                events = [_event_from_row(row) for row in rows]
+            except Exception:  # noqa: BLE001
+                logger.exception("live event poll failed")
+                continue
+            finally:
+                db.close()
+            last_id = _track_gaps(gaps, last_id, [event.id for event in events], time.monotonic())
+            self._deliver(events)
+
+
+def format_sse(event: TraceEvent) -> bytes:
+    return b"id: %d\nevent: trace\ndata: %s\n\n" % (event.id, event.data)
+
+
+def _push_all(subscriptions: List[Subscription], events: List[TraceEvent]) -> None:
+    for subscription in subscriptions:
+        for event in events:
+            subscription.push(event)
+
+
+def _track_gaps(gaps: Dict[int, float], last_id: int, ids: List[int], now: float) -> int:
+    """Update `gaps` with the ids `ids` skipped past `last_id`; returns the new `last_id`."""
+    for event_id in ids:
+        gaps.pop(event_id, None)
+    newest = max(ids, default=last_id)
+    if newest > last_id:
+        seen = set(ids)
+        # A gap wider than the replay window is not worth tracking id by id.
+        first = max(last_id + 1, newest - settings.live_replay_size)
+        gaps.update((event_id, now) for event_id in range(first, newest) if event_id not in seen)
+    expired = now - settings.live_gap_timeout_seconds
+    for event_id in [event_id for event_id, missed_at in gaps.items() if missed_at < expired]:
+        del gaps[event_id]
+    return max(newest, last_id)
+
+
+def _event_from_row(row: LiveEvent) -> TraceEvent:
+    return TraceEvent(row.id, row.summary, dumps(row.summary))
+
+
+def _jsonable(summary: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in summary.items()
+    }
+
+
+hub = LiveHub()
@@ -1,28 +1,137 @@
 """FastAPI application entrypoint."""
 from __future__ import annotations
 
+import asyncio
 import base64
-from datetime import datetime, timezone
-from functools import lru_cache
-from typing import Any, Dict, Iterable, List, Optional
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import Depends, FastAPI, HTTPException, Response, status
-from sqlalchemy.orm import Session
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Response, status
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import and_, literal, or_, select
+from sqlalchemy.orm import Session, aliased
 
 from . import schemas
+from .admission import AdmissionController
+from .analysis import run_analysis_pass
+from .archive import (
+    ArchiveUnavailable,
+    find_archived_span,
+    load_trace_spans,
+    run_compaction_pass,
+    select_spans,
+)
 from .auth import BasicUser, get_current_user, require_roles
 from .config import get_settings
-from .db import Base, engine, get_db
-from .models import PayloadBlob, Span, SpanPayloadRef, Trace
-from .payloads import load_payload, store_payload
+from .db import Base, SessionLocal, create_missing_indexes, engine, get_db, upgrade_schema
+from .ingest import parse_otlp, persist_records, to_naive_utc
+from .live import format_sse, hub
+from .metrics import REGISTRY
+from .models import Span, SpanPayloadRef, Trace, TraceAnalysis
+from .payloads import load_payload
+from .sampling import DECISION_DROP, DECISION_SUMMARY, TailSampler
+from .serialization import (
+    SPAN_DETAIL_COLUMNS,
+    SPAN_SUMMARY_COLUMNS,
+    TRACE_SUMMARY_COLUMNS,
+    group_payload_refs,
+    json_array_response,
+    json_response,
+    payload_refs_of,
+    span_to_dict,
+    trace_to_dict,
+)
+from .sketches import (
+    SKETCH_METRICS,
+    SketchAggregator,
+    backfill_rollups,
+    bucket_start,
+    compare,
+    load_series,
+    series_to_dict,
+    summarize,
+)
+from .worker import BackgroundWorker
 
 settings = get_settings()
 app = FastAPI(title="TraceFoundry Ingest API", version="0.1.0")
+app.add_middleware(GZipMiddleware, minimum_size=settings.gzip_minimum_size, compresslevel=5)
+
+MAX_SPAN_PAGE_SIZE = 5000
+MAX_SUBTREE_DEPTH = 256
+TRACE_SORTS = {
+    "newest": Trace.started_at.desc(),
+    "slowest": Trace.duration_ms.desc().nulls_last(),
+    "most_expensive": Trace.cost_usd_estimate.desc().nulls_last(),
+    "slowest_tool": Trace.slowest_tool_ms.desc().nulls_last(),
+    "critical_path": Trace.critical_path_ms.desc().nulls_last(),
+    "most_errors": Trace.error_span_count.desc().nulls_last(),
+}
+
+admission = AdmissionController() if settings.admission_enabled else None
+sampler = TailSampler() if settings.sampling_enabled else None
+sketches = SketchAggregator() if settings.sketches_enabled else None
+worker = BackgroundWorker(
+    settings.worker_interval_seconds, [run_analysis_pass], budget_seconds=settings.worker_task_budget_seconds
+)
+if sampler is not None:
+    worker.tasks.insert(0, sampler.run_pass)
+if sketches is not None:
+    worker.tasks.append(sketches.flush)
+if hub.shared:
+    worker.tasks.append(hub.prune)
+if settings.archive_enabled:
+    worker.tasks.append(run_compaction_pass)
 
 
 @app.on_event("startup")
 def _startup() -> None:
     Base.metadata.create_all(bind=engine)
+    if "traces.last_span_at" in upgrade_schema(engine):
+        # Traces from before the upgrade are long idle; let the analysis worker pick them up.
+        db = SessionLocal()
+        try:
+            db.query(Trace).filter(Trace.last_span_at.is_(None)).update(
+                {Trace.last_span_at: Trace.started_at}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+    create_missing_indexes(engine)
+    if sketches is not None:
+        db = SessionLocal()
+        try:
+            backfill_rollups(db)
+        finally:
+            db.close()
+    if settings.worker_enabled:
+        worker.start()
+    hub.start()
+
+
+@app.on_event("shutdown")
+def _shutdown() -> None:
+    hub.stop()
+    worker.stop()
+    if sampler is not None:
+        db = SessionLocal()
+        try:
+            sampler.run_pass(db, force=True)
+        finally:
+            db.close()
+    if sketches is not None:
+        db = SessionLocal()
+        try:
+            sketches.flush(db)
+        finally:
+            db.close()
+
+
+@app.exception_handler(ArchiveUnavailable)
+def _archive_unavailable(request: Request, exc: ArchiveUnavailable) -> JSONResponse:
+    return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"detail": "archive_not_found"})
 
 
 @app.get("/healthz", response_model=schemas.HealthResponse)
@@ -30,82 +139,34 @@ def healthz() -> schemas.HealthResponse:
     return schemas.HealthResponse(ok=True)
 
 
+@app.get("/metrics", response_class=Response)
+def metrics(user: BasicUser = Depends(get_current_user)) -> Response:
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/otlp")
 def ingest_otlp(
     payload: Dict[str, Any],
     db: Session = Depends(get_db),
     user: BasicUser = Depends(get_current_user),
 ) -> Dict[str, Any]:
-    resource_spans = payload.get("resource_spans", [])
-    ingested = 0
-    for resource_span in resource_spans:
-        resource = _attributes_to_dict(resource_span.get("resource", {}).get("attributes"))
-        service_name = resource.get("service.name", "demo-agent")
-        environment = resource.get("deployment.environment", settings.tracefoundry_env)
-        scope_spans = resource_span.get("scope_spans", [])
-        for scope in scope_spans:
-            for span in scope.get("spans", []):
-                trace_id = span.get("trace_id")
-                span_id = span.get("span_id")
-                if not trace_id or not span_id:
-                    continue
-                start_time = _parse_time(span.get("start_time_unix_nano"))
-                end_time = _parse_time(span.get("end_time_unix_nano"))
-                duration_ms = _duration_ms(start_time, end_time)
-                attributes = _attributes_to_dict(span.get("attributes"))
-                safe_attributes = _allowlist_attributes(attributes)
-                events = _normalize_events(span.get("events"))
-                resource_data = resource
-                status_code = (span.get("status") or {}).get("code")
-                error_type = (span.get("status") or {}).get("message")
-
-                trace = db.query(Trace).filter(Trace.trace_id == trace_id).one_or_none()
-                is_new_trace = trace is None
-                if trace is None:
-                    trace = Trace(trace_id=trace_id)
-                    db.add(trace)
-                    db.flush()
-                trace.service_name = service_name
-                trace.environment = environment
-
-                span_obj = db.query(Span).filter(Span.span_id == span_id).one_or_none()
-                is_new_span = span_obj is None
-                if span_obj is None:
-                    span_obj = Span(trace_id=trace_id, span_id=span_id)
-                span_obj.parent_span_id = span.get("parent_span_id") or None
-                span_obj.name = span.get("name", "span")
-                span_obj.kind = span.get("kind")
-                span_obj.start_time = _to_naive_utc(start_time)
-                span_obj.end_time = _to_naive_utc(end_time)
-                span_obj.duration_ms = duration_ms
-                span_obj.status_code = status_code
-                span_obj.error_type = error_type
-                span_obj.attributes = safe_attributes
-                span_obj.events = events
-                span_obj.resource = resource_data
-                db.add(span_obj)
-                if is_new_span:
-                    trace.span_count = (trace.span_count or 0) + 1
-                if span_obj.parent_span_id in (None, ""):
-                    trace.root_span_name = span_obj.name
-                prior_start = trace.started_at
-                trace.started_at = min_with_default(trace.started_at, start_time)
-                reference_start = trace.started_at or prior_start or _to_naive_utc(start_time)
-                if reference_start and end_time:
-                    duration = (_to_naive_utc(end_time) - reference_start).total_seconds() * 1000
-                    trace.duration_ms = max(trace.duration_ms or 0, duration)
-                trace.status_code = _choose_status(trace.status_code, status_code)
-                if safe_attributes.get("gen_ai.request.model"):
-                    trace.model = safe_attributes["gen_ai.request.model"]
-                trace.token_in = _sum_optional(trace.token_in, safe_attributes.get("gen_ai.usage.input_tokens"))
-                trace.token_out = _sum_optional(trace.token_out, safe_attributes.get("gen_ai.usage.output_tokens"))
-                trace.cost_usd_estimate = _sum_optional(trace.cost_usd_estimate, safe_attributes.get("tracefoundry.cost.usd_estimate"))
-
-                for payload_entry in span.get("tracefoundry_payloads", []) or []:
-                    _persist_payload(db, trace_id, span_obj.span_id, payload_entry)
-                ingested += 1
-    db.commit()
-    return {"ingested_spans": ingested}
+    if admission is None:
+        return {"ingested_spans": _ingest_payload(db, payload)}
+    with admission.slot():
+        admitted = admission.admit(payload, user.username)
+        if admitted.rejected_spans and not admitted.accepted_spans:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="ingest_rate_limited",
+                headers={"Retry-After": "1"},
+            )
+        response: Dict[str, Any] = {"ingested_spans": _ingest_payload(db, admitted.payload)}
+    if admitted.rejected_spans:
+        response["partial_success"] = {
+            "rejected_spans": admitted.rejected_spans,
+            "error_message": admitted.error_message,
+        }
+    return response
 
 
 @app.get("/api/traces", response_model=List[schemas.TraceSummary])
@@ -116,11 +177,14 @@ def list_traces(
     env: Optional[str] = None,
     status: Optional[str] = None,
     model: Optional[str] = None,
+    sort: str = "newest",
     user: BasicUser = Depends(get_current_user),
     db: Session = Depends(get_db),
-) -> List[schemas.TraceSummary]:
+) -> Response:
     limit = max(1, min(limit, 200))
-    query = db.query(Trace)
+    if sort not in TRACE_SORTS:
+        raise HTTPException(status_code=400, detail="invalid_sort")
+    query = db.query(*TRACE_SUMMARY_COLUMNS)
     if service:
         query = query.filter(Trace.service_name == service)
     if env:
@@ -129,13 +193,70 @@ def list_traces(
         query = query.filter(Trace.status_code == status)
     if model:
         query = query.filter(Trace.model == model)
-    traces = (
-        query.order_by(Trace.started_at.desc())
+    rows = (
+        query.order_by(TRACE_SORTS[sort], Trace.started_at.desc())
         .offset(offset)
         .limit(limit)
         .all()
     )
-    return [schemas.TraceSummary(**_trace_to_dict(t)) for t in traces]
+    return json_response([trace_to_dict(row) for row in rows])
+
+
+@app.get("/api/live/traces")
+async def live_traces(
+    request: Request,
+    service: Optional[str] = None,
+    env: Optional[str] = None,
+    status: Optional[str] = None,
+    model: Optional[str] = None,
+    last_event_id: Optional[int] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    user: BasicUser = Depends(get_current_user),
+) -> StreamingResponse:
+    """Server-Sent Events stream of new and updated trace summaries matching the filters.
+
+    Resumes after `Last-Event-ID` (header or `last_event_id` query param). A
+    subscriber that falls too far behind gets a `dropped` event and is
+    disconnected.
+    """
+    resume_from = last_event_id
+    if resume_from is None and last_event_id_header and last_event_id_header.isdigit():
+        resume_from = int(last_event_id_header)
+    subscription = hub.subscribe({"service": service, "env": env, "status": status, "model": model})
+
+    async def stream():
+        try:
+            # Ids already sent by the replay; live events can arrive out of id order.
+            replayed_ids = set()
+            if resume_from is not None:
+                replayed = await asyncio.to_thread(hub.replay, resume_from, subscription)
+                for event in replayed:
+                    replayed_ids.add(event.id)
+                    yield format_sse(event)
+            yield b"retry: 2000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(), timeout=settings.live_keepalive_seconds
+                    )
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if event is None:
+                    yield b"event: dropped\ndata: {}\n\n"
+                    return
+                if event.id in replayed_ids:
+                    continue
+                yield format_sse(event)
+        finally:
+            hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        # Identity encoding keeps GZipMiddleware from buffering the stream.
+        headers={"Cache-Control": "no-cache", "Content-Encoding": "identity", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/api/traces/{trace_id}", response_model=schemas.TraceSummary)
@@ -143,21 +264,102 @@ def get_trace(
     trace_id: str,
     user: BasicUser = Depends(get_current_user),
     db: Session = Depends(get_db),
-) -> schemas.TraceSummary:
-    trace = db.query(Trace).filter(Trace.trace_id == trace_id).one_or_none()
-    if not trace:
+) -> Response:
+    row = db.query(*TRACE_SUMMARY_COLUMNS).filter(Trace.trace_id == trace_id).one_or_none()
+    if not row:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="trace_not_found")
-    return schemas.TraceSummary(**_trace_to_dict(trace))
+    return json_response(trace_to_dict(row))
+
+
+@app.get("/api/traces/{trace_id}/analysis", response_model=schemas.TraceAnalysis)
+def get_trace_analysis(
+    trace_id: str,
+    user: BasicUser = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> Response:
+    analysis = db.get(TraceAnalysis, trace_id)
+    if analysis is None:
+        if db.query(Trace.trace_id).filter(Trace.trace_id == trace_id).one_or_none() is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="trace_not_found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="analysis_not_ready")
+    return json_response({"trace_id": trace_id, "analyzed_at": analysis.analyzed_at, **analysis.result})
 
 
 @app.get("/api/traces/{trace_id}/spans", response_model=List[schemas.SpanRead])
 def list_trace_spans(
     trace_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    root_span_id: Optional[str] = None,
+    depth: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    details: bool = True,
     user: BasicUser = Depends(get_current_user),
     db: Session = Depends(get_db),
-) -> List[schemas.SpanRead]:
-    spans = db.query(Span).filter(Span.trace_id == trace_id).all()
-    return [_span_to_schema(span) for span in spans]
+) -> Response:
+    """List spans of a trace ordered by start time.
+
+    `start`/`end` keep spans overlapping the window, `root_span_id`/`depth`
+    restrict to a subtree, and `limit`/`cursor` page through the result with
+    the next cursor returned in the `X-Next-Cursor` header. `details=false`
+    omits attributes, events, resource and payload refs. Archived traces are
+    decoded from their archive and filtered in memory.
+    """
+    if limit is not None:
+        limit = max(1, min(limit, MAX_SPAN_PAGE_SIZE))
+    headers: Dict[str, str] = {}
+    archive_ref = db.query(Trace.archive_ref).filter(Trace.trace_id == trace_id).scalar()
+    if archive_ref:
+        spans = select_spans(
+            load_trace_spans(db, trace_id, archive_ref),
+            start=to_naive_utc(start),
+            end=to_naive_utc(end),
+            subtree_root=root_span_id,
+            max_depth=MAX_SUBTREE_DEPTH if depth is None else max(0, min(depth, MAX_SUBTREE_DEPTH)),
+            after=_decode_cursor(cursor) if cursor else None,
+        )
+        if limit is not None and len(spans) > limit:
+            spans = spans[:limit]
+            headers["X-Next-Cursor"] = _encode_cursor(spans[-1])
+        return json_array_response(
+            spans,
+            lambda span: span_to_dict(span, payload_refs_of(span) if details else None, details=details),
+            headers=headers,
+        )
+
+    query = db.query(*(SPAN_DETAIL_COLUMNS if details else SPAN_SUMMARY_COLUMNS)).filter(
+        Span.trace_id == trace_id
+    )
+    if start is not None:
+        query = query.filter(or_(Span.end_time.is_(None), Span.end_time >= to_naive_utc(start)))
+    if end is not None:
+        query = query.filter(Span.start_time < to_naive_utc(end))
+    if root_span_id:
+        query = query.filter(Span.span_id.in_(_subtree_span_ids(trace_id, root_span_id, depth)))
+    if cursor:
+        query = query.filter(_after_cursor(_decode_cursor(cursor)))
+    query = query.order_by(Span.start_time.asc().nulls_last(), Span.span_id.asc())
+    if limit is None:
+        rows = query.all()
+    else:
+        rows = query.limit(limit + 1).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            headers["X-Next-Cursor"] = _encode_cursor(rows[-1])
+    payload_refs: Dict[str, List[Dict[str, str]]] = {}
+    if details and rows:
+        refs_query = db.query(
+            SpanPayloadRef.span_id, SpanPayloadRef.payload_ref, SpanPayloadRef.payload_role
+        ).filter(SpanPayloadRef.trace_id == trace_id)
+        if limit is not None:
+            refs_query = refs_query.filter(SpanPayloadRef.span_id.in_([row.span_id for row in rows]))
+        payload_refs = group_payload_refs(refs_query.all())
+    return json_array_response(
+        rows,
+        lambda row: span_to_dict(row, payload_refs.get(row.span_id), details=details),
+        headers=headers,
+    )
 
 
 @app.get("/api/spans/{span_id}", response_model=schemas.SpanRead)
@@ -165,11 +367,13 @@ def get_span(
     span_id: str,
     user: BasicUser = Depends(get_current_user),
     db: Session = Depends(get_db),
-) -> schemas.SpanRead:
+) -> Response:
     span = db.query(Span).filter(Span.span_id == span_id).one_or_none()
+    if not span:
+        span = find_archived_span(db, span_id)
     if not span:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="span_not_found")
-    return _span_to_schema(span)
+    return json_response(span_to_dict(span, payload_refs_of(span)))
 
 
 @app.get(
@@ -184,201 +388,139 @@ def get_payload(
     return Response(content=content, media_type="application/octet-stream")
 
 
-def _persist_payload(db: Session, trace_id: str, span_id: str, payload_entry: Dict[str, Any]) -> None:
-    content_type = payload_entry.get("content_type", "application/octet-stream")
-    data = payload_entry.get("data")
-    if data is None:
-        return
-    if payload_entry.get("encoding") == "base64":
-        content = base64.b64decode(data)
-    else:
-        content = data.encode("utf-8") if isinstance(data, str) else bytes(data)
-    payload_ref, payload_path = store_payload(content, content_type=content_type)
-    blob = db.query(PayloadBlob).filter(PayloadBlob.payload_ref == payload_ref).one_or_none()
-    if blob is None:
-        blob = PayloadBlob(
-            payload_ref=payload_ref,
-            content_type=content_type,
-            compression="none",
-            byte_length=len(content),
-            storage_path=str(payload_path),
-        )
-        db.add(blob)
-    link_exists = (
-        db.query(SpanPayloadRef)
-        .filter(
-            SpanPayloadRef.span_id == span_id,
-            SpanPayloadRef.payload_ref == payload_ref,
-            SpanPayloadRef.payload_role == payload_entry.get("role", "other"),
-        )
-        .one_or_none()
+@app.get("/api/sketches/quantiles", response_model=List[schemas.SketchQuantiles])
+def sketch_quantiles(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    service: Optional[str] = None,
+    name: Optional[str] = None,
+    subject: Optional[str] = None,
+    metric: str = "duration_ms",
+    user: BasicUser = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> Response:
+    """p50/p95/p99 per (service, span name, tool or model) over `start`..`end`.
+
+    Defaults to the last 24 hours. Merged from per-bucket sketches, so the
+    window is widened to whole `SKETCH_BUCKET_SECONDS` buckets.
+    """
+    if metric not in SKETCH_METRICS:
+        raise HTTPException(status_code=400, detail="invalid_metric")
+    end = to_naive_utc(end) or datetime.utcnow()
+    start = to_naive_utc(start) or end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="invalid_window")
+    series = load_series(db, metric, start, end, service=service, name=name, subject=subject)
+    return json_response(
+        [
+            {**series_to_dict(key, metric), **summarize(sketch)}
+            for key, sketch in sorted(series.items(), key=lambda item: -item[1].count)
+        ]
     )
-    if not link_exists:
-        db.add(
-            SpanPayloadRef(
-                trace_id=trace_id,
-                span_id=span_id,
-                payload_ref=payload_ref,
-                payload_role=payload_entry.get("role", "other"),
-            )
-        )
-
-
-def _attributes_to_dict(attrs: Any) -> Dict[str, Any]:
-    if isinstance(attrs, dict):
-        return attrs
-    result: Dict[str, Any] = {}
-    if not isinstance(attrs, Iterable):
-        return result
-    for item in attrs or []:
-        key = item.get("key") if isinstance(item, dict) else None
-        if not key:
-            continue
-        value = item.get("value", {}) if isinstance(item, dict) else {}
-        if isinstance(value, dict):
-            for candidate_key in [
-                "string_value",
-                "int_value",
-                "double_value",
-                "bool_value",
-                "array_value",
-            ]:
-                if candidate_key in value:
-                    result[key] = value[candidate_key]
-                    break
-        else:
-            result[key] = value
-    return result
-
-
-def _normalize_events(events: Any) -> Any:
-    if events is None:
-        return []
-    normalized = []
-    for event in events:
-        name = event.get("name") if isinstance(event, dict) else None
-        attrs = _attributes_to_dict(event.get("attributes")) if isinstance(event, dict) else {}
-        normalized.append({"name": name, "attributes": attrs, "time_unix_nano": event.get("time_unix_nano")})
-    return normalized
-
-
-def _parse_time(unix_nano: Optional[Any]) -> Optional[datetime]:
-    if not unix_nano:
-        return None
-    try:
-        unix_nano = int(unix_nano)
-    except (TypeError, ValueError):
-        return None
-    seconds = unix_nano / 1_000_000_000
-    return datetime.fromtimestamp(seconds, tz=timezone.utc)
-
-
-def _duration_ms(start: Optional[datetime], end: Optional[datetime]) -> Optional[float]:
-    if start and end:
-        return (_to_naive_utc(end) - _to_naive_utc(start)).total_seconds() * 1000
-    return None
 
 
-def min_with_default(current: Optional[datetime], candidate: Optional[datetime]) -> Optional[datetime]:
-    if current is None:
-        return candidate
-    if candidate is None:
-        return current
-    current_naive = _to_naive_utc(current)
-    candidate_naive = _to_naive_utc(candidate)
-    if current_naive is None:
-        return candidate_naive
-    return candidate_naive if candidate_naive < current_naive else current_naive
-
-
-def _to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
-    if value is None:
-        return None
-    if value.tzinfo is None:
-        return value
-    return value.astimezone(timezone.utc).replace(tzinfo=None)
-
-
-def _choose_status(existing: Optional[str], new: Optional[str]) -> Optional[str]:
-    priority = {"STATUS_CODE_ERROR": 2, "STATUS_CODE_UNSET": 1, "STATUS_CODE_OK": 0}
-    existing_priority = priority.get(existing or "STATUS_CODE_UNSET", 0)
-    new_priority = priority.get(new or "STATUS_CODE_UNSET", 0)
-    return new if new_priority >= existing_priority else existing
+@app.get("/api/sketches/compare", response_model=List[schemas.SketchComparison])
+def compare_sketches(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    baseline_start: Optional[datetime] = None,
+    baseline_end: Optional[datetime] = None,
+    service: Optional[str] = None,
+    name: Optional[str] = None,
+    subject: Optional[str] = None,
+    metric: str = "duration_ms",
+    alpha: float = 0.01,
+    min_shift: float = 0.1,
+    user: BasicUser = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> Response:
+    """Flag series whose distribution shifted between a baseline and a current window.
+
+    The current window defaults to the last hour (from the start of its
+    bucket) and the baseline to the 7 days before it. Each series is compared with a two-sample KS test at
+    `alpha`; `shift` is `higher` or `lower` when the test is significant and
+    p50 or p95 moved by at least `min_shift`. Shifted series come first.
+    """
+    if metric not in SKETCH_METRICS:
+        raise HTTPException(status_code=400, detail="invalid_metric")
+    end = to_naive_utc(end) or datetime.utcnow()
+    # Align to buckets so a default baseline never shares a bucket with the current window.
+    start = bucket_start(to_naive_utc(start) or end - timedelta(hours=1))
+    baseline_end = to_naive_utc(baseline_end) or start
+    baseline_start = to_naive_utc(baseline_start) or baseline_end - timedelta(days=7)
+    if start >= end or baseline_start >= baseline_end:
+        raise HTTPException(status_code=400, detail="invalid_window")
+    filters = {"service": service, "name": name, "subject": subject}
+    current = load_series(db, metric, start, end, **filters)
+    baseline = load_series(db, metric, baseline_start, baseline_end, **filters)
+    results = [
+        {
+            **series_to_dict(key, metric),
+            **compare(baseline[key], sketch, alpha=alpha, min_shift=min_shift),
+        }
+        for key, sketch in current.items()
+        if key in baseline
+    ]
+    results.sort(key=lambda item: (item["shift"] == "none", -item["ks_statistic"]))
+    return json_response(results)
+
+
+def _ingest_payload(db: Session, payload: Dict[str, Any]) -> int:
+    records = parse_otlp(payload)
+    if sketches is not None:
+        sketches.observe(records)
+    persisted: List[str] = []
+    if sampler is None:
+        persist_records(db, records)
+        persisted = [record.trace_id for record in records]
+    else:
+        for decision, decided in sampler.offer(records):
+            if decision != DECISION_DROP:
+                persist_records(db, decided, summary_only=decision == DECISION_SUMMARY)
+                persisted.extend(record.trace_id for record in decided)
+    db.commit()
+    hub.publish_traces(db, persisted)
+    return len(records)
 
 
-def _sum_optional(current: Optional[float], addend: Optional[Any]) -> Optional[float]:
-    if addend is None:
-        return current
-    try:
-        add_value = float(addend)
-    except (TypeError, ValueError):
-        return current
-    if current is None:
-        return add_value
-    return current + add_value
-
-
-def _trace_to_dict(trace: Trace) -> Dict[str, Any]:
-    return {
-        "trace_id": trace.trace_id,
-        "service_name": trace.service_name,
-        "environment": trace.environment,
-        "started_at": trace.started_at,
-        "duration_ms": trace.duration_ms,
-        "root_span_name": trace.root_span_name,
-        "status_code": trace.status_code,
-        "error_type": trace.error_type,
-        "model": trace.model,
-        "token_in": trace.token_in,
-        "token_out": trace.token_out,
-        "cost_usd_estimate": trace.cost_usd_estimate,
-        "span_count": trace.span_count or 0,
-    }
-
-
-def _span_to_schema(span: Span) -> schemas.SpanRead:
-    payload_refs = [
-        schemas.SpanPayloadRefSchema(payload_ref=ref.payload_ref, payload_role=ref.payload_role)
-        for ref in span.payload_refs
-    ]
-    return schemas.SpanRead(
-        span_id=span.span_id,
-        trace_id=span.trace_id,
-        parent_span_id=span.parent_span_id,
-        name=span.name,
-        kind=span.kind,
-        start_time=span.start_time,
-        end_time=span.end_time,
-        duration_ms=span.duration_ms,
-        status_code=span.status_code,
-        error_type=span.error_type,
-        attributes=span.attributes,
-        events=span.events,
-        resource=span.resource,
-        payload_refs=payload_refs,
+def _subtree_span_ids(trace_id: str, root_span_id: str, depth: Optional[int]):
+    max_depth = MAX_SUBTREE_DEPTH if depth is None else max(0, min(depth, MAX_SUBTREE_DEPTH))
+    subtree = (
+        select(Span.span_id, literal(0).label("depth"))
+        .where(Span.trace_id == trace_id, Span.span_id == root_span_id)
+        .cte("subtree", recursive=True)
     )
+    child = aliased(Span)
+    subtree = subtree.union_all(
+        select(child.span_id, subtree.c.depth + 1).where(
+            child.trace_id == trace_id,
+            child.parent_span_id == subtree.c.span_id,
+            subtree.c.depth < max_depth,
+        )
+    )
+    return select(subtree.c.span_id)
 
 
-def _allowlist_attributes(attrs: Dict[str, Any]) -> Dict[str, Any]:
-    allowlist = _load_allowlist()
-    clean_attrs: Dict[str, Any] = {}
-    for key, value in attrs.items():
-        if key in allowlist or key.startswith("tracefoundry.payload"):
-            clean_attrs[key] = value
-    return clean_attrs
+def _encode_cursor(span: Any) -> str:
+    start = span.start_time.isoformat() if span.start_time else None
+    raw = json.dumps([start, span.span_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
 
 
-@lru_cache
-def _load_allowlist() -> set[str]:
-    values: set[str] = set()
+def _decode_cursor(cursor: str) -> Tuple[Optional[datetime], str]:
     try:
-        with open(settings.attribute_allowlist_path, "r", encoding="utf-8") as fh:
-            for line in fh:
-                line = line.strip()
-                if not line or line.startswith("#"):
-                    continue
-                if line.startswith("- "):
-                    values.add(line[2:].strip())
-    except FileNotFoundError:
-        pass
-    return values
+        start, span_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return (datetime.fromisoformat(start) if start else None), str(span_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="invalid_cursor")
+
+
+def _after_cursor(position: Tuple[Optional[datetime], str]):
+    start, span_id = position
+    if start is None:
+        return and_(Span.start_time.is_(None), Span.span_id > span_id)
+    return or_(
+        Span.start_time > start,
+        and_(Span.start_time == start, Span.span_id > span_id),
+        Span.start_time.is_(None),
+    )
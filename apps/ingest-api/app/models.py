@@ -3,7 +3,7 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, JSON, String, Text
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, JSON, String, Text
 from sqlalchemy.orm import relationship
 
 from .db import Base
@@ -25,12 +25,34 @@ class Trace(Base):
     token_out = Column(Integer)
     cost_usd_estimate = Column(Float)
     span_count = Column(Integer, default=0)
+    last_span_at = Column(DateTime, index=True)
+    analyzed_at = Column(DateTime)
+    critical_path_ms = Column(Float)
+    error_span_count = Column(Integer)
+    slowest_tool = Column(String(256))
+    slowest_tool_ms = Column(Float, index=True)
+    sampling_decision = Column(String(16))
+    archive_ref = Column(String(128))
+    archived_at = Column(DateTime)
 
     spans = relationship("Span", back_populates="trace", cascade="all, delete-orphan")
+    analysis = relationship("TraceAnalysis", uselist=False, cascade="all, delete-orphan")
+
+
+class TraceAnalysis(Base):
+    __tablename__ = "trace_analyses"
+
+    trace_id = Column(String(64), ForeignKey("traces.trace_id"), primary_key=True)
+    analyzed_at = Column(DateTime)
+    result = Column(JSON)
 
 
 class Span(Base):
     __tablename__ = "spans"
+    __table_args__ = (
+        Index("ix_spans_trace_start", "trace_id", "start_time", "span_id"),
+        Index("ix_spans_trace_parent", "trace_id", "parent_span_id"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     trace_id = Column(String(64), ForeignKey("traces.trace_id"), index=True)
@@ -51,6 +73,79 @@ class Span(Base):
     payload_refs = relationship("SpanPayloadRef", back_populates="span", cascade="all, delete-orphan")
 
 
+class ArchivedSpan(Base):
+    __tablename__ = "archived_spans"
+
+    span_id = Column(String(64), primary_key=True)
+    trace_id = Column(String(64), ForeignKey("traces.trace_id"))
+
+
+class LiveEvent(Base):
+    __tablename__ = "live_events"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    summary = Column(JSON)
+
+
+class LatencySketch(Base):
+    __tablename__ = "latency_sketches"
+    __table_args__ = (
+        Index(
+            "ix_latency_sketches_series",
+            "service_name",
+            "span_name",
+            "subject",
+            "metric",
+            "bucket_start",
+            unique=True,
+        ),
+        Index("ix_latency_sketches_bucket", "bucket_start"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    service_name = Column(String(128), nullable=False)
+    span_name = Column(String(256), nullable=False)
+    subject = Column(String(256), nullable=False, default="")
+    metric = Column(String(32), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    sketch = Column(JSON, nullable=False)
+
+
+class LatencySketchRollup(Base):
+    __tablename__ = "latency_sketch_rollups"
+    __table_args__ = (
+        Index(
+            "ix_latency_sketch_rollups_series",
+            "service_name",
+            "span_name",
+            "subject",
+            "metric",
+            "bucket_start",
+            unique=True,
+        ),
+        Index("ix_latency_sketch_rollups_bucket", "bucket_start"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    service_name = Column(String(128), nullable=False)
+    span_name = Column(String(256), nullable=False)
+    subject = Column(String(256), nullable=False, default="")
+    metric = Column(String(32), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    sketch = Column(JSON, nullable=False)
+
+
+class AdmissionBucket(Base):
+    __tablename__ = "admission_buckets"
+
+    key = Column(String(256), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)
+
+
 class PayloadBlob(Base):
     __tablename__ = "payload_blobs"
 
@@ -20,8 +20,23 @@ def store_payload(content: bytes, *, content_type: str, compression: str = "none
     return payload_ref, payload_path
 
 
-def load_payload(payload_ref: str) -> bytes:
+class PayloadNotFound(LookupError):
+    pass
+
+
+def read_payload(payload_ref: str) -> bytes:
     payload_path = settings.payload_dir / payload_ref
     if not payload_path.exists():
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="payload_not_found")
+        raise PayloadNotFound(payload_ref)
     return payload_path.read_bytes()
+
+
+def load_payload(payload_ref: str) -> bytes:
+    try:
+        return read_payload(payload_ref)
+    except PayloadNotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="payload_not_found")
+
+
+def delete_payload(payload_ref: str) -> None:
+    (settings.payload_dir / payload_ref).unlink(missing_ok=True)
@@ -0,0 +1,345 @@
+"""Tail-based sampling of in-flight traces at ingest.
+
+Spans are buffered per trace until the trace completes (its root span arrived
+and nothing new came in for `SAMPLING_DECISION_WAIT_SECONDS`) or times out.
+The whole trace is then kept in full, reduced to its `Trace` summary, or
+dropped. When the in-memory buffer exceeds `SAMPLING_BUFFER_BYTES`, the largest
+traces spill to disk until the decision.
+
+Buffers and decisions live in this process only: every span of a trace must
+reach the same API worker (a single worker, or trace-id affinity in front of
+several), or each worker decides its part of the trace on its own.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .ingest import COST_ATTRIBUTE, ERROR_STATUS, SpanRecord, persist_records
+from .live import hub
+from .metrics import REGISTRY
+from .models import Trace
+from .serialization import dumps
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+DECISION_FULL = "full"
+DECISION_SUMMARY = "summary"
+DECISION_DROP = "drop"
+_RECORD_OVERHEAD_BYTES = 512
+
+SAMPLING_DECISIONS = REGISTRY.counter(
+    "tracefoundry_sampling_traces_total",
+    "Traces decided by the tail sampler.",
+    ("decision", "reason"),
+)
+SAMPLING_SPANS = REGISTRY.counter(
+    "tracefoundry_sampling_spans_total",
+    "Spans decided by the tail sampler.",
+    ("decision",),
+)
+SAMPLING_KEPT_RATIO = REGISTRY.gauge(
+    "tracefoundry_sampling_kept_ratio",
+    "Share of decided traces persisted in full.",
+)
+SAMPLING_BUFFER_BYTES = REGISTRY.gauge(
+    "tracefoundry_sampling_buffer_bytes",
+    "Estimated bytes of spans buffered by the tail sampler.",
+    ("location",),
+)
+SAMPLING_BUFFERED_TRACES = REGISTRY.gauge(
+    "tracefoundry_sampling_buffered_traces",
+    "Traces awaiting a tail-sampling decision.",
+)
+
+
+@dataclass
+class _TraceBuffer:
+    trace_id: str
+    first_seen: float
+    last_seen: float
+    records: List[SpanRecord] = field(default_factory=list)
+    span_ids: Set[str] = field(default_factory=set)
+    memory_bytes: int = 0
+    spilled_bytes: int = 0
+    spilled_spans: int = 0
+    spill_path: Optional[Path] = None
+    root_seen: bool = False
+    has_error: bool = False
+    has_flagged_event: bool = False
+    min_start: Optional[datetime] = None
+    max_end: Optional[datetime] = None
+    cost_usd: float = 0.0
+
+    @property
+    def span_count(self) -> int:
+        return len(self.records) + self.spilled_spans
+
+    @property
+    def duration_ms(self) -> float:
+        if self.min_start is None or self.max_end is None:
+            return 0.0
+        return (self.max_end - self.min_start).total_seconds() * 1000
+
+
+class TailSampler:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buffers: Dict[str, _TraceBuffer] = {}
+        self._memory_bytes = 0
+        self._spilled_bytes = 0
+        # Recent decisions, so late spans follow their trace's decision. Summary
+        # decisions keep the span ids already counted, since no span rows exist
+        # to dedupe re-sent spans against.
+        self._decided: "OrderedDict[str, Tuple[str, FrozenSet[str]]]" = OrderedDict()
+        self._kept = 0
+        self._decided_total = 0
+        self._flag_events = {
+            name.strip().lower() for name in settings.sampling_flag_events.split(",") if name.strip()
+        }
+
+    def offer(self, records: List[SpanRecord]) -> List[Tuple[str, List[SpanRecord]]]:
+        """Buffer spans of undecided traces.
+
+        Returns spans of already-decided traces grouped by decision; the
+        caller persists them right away.
+        """
+        late: Dict[str, List[SpanRecord]] = {}
+        now = time.monotonic()
+        with self._lock:
+            for record in records:
+                decided = self._decided.get(record.trace_id)
+                if decided is not None:
+                    decision, counted = decided
+                    if decision == DECISION_SUMMARY:
+                        if record.span_id in counted:
+                            continue
+                        self._decided[record.trace_id] = (decision, counted | {record.span_id})
+                    late.setdefault(decision, []).append(record)
+                    continue
+                buffer = self._buffers.get(record.trace_id)
+                if buffer is None:
+                    buffer = self._buffers[record.trace_id] = _TraceBuffer(record.trace_id, now, now)
+                if record.span_id in buffer.span_ids:
+                    # A re-sent span; the first copy is already buffered.
+                    continue
+                self._add(buffer, record, now)
+            if self._memory_bytes > settings.sampling_buffer_bytes:
+                self._spill_until_under_budget()
+            self._update_gauges()
+        for decision, decided in late.items():
+            SAMPLING_SPANS.inc(len(decided), decision=decision)
+        return list(late.items())
+
+    def run_pass(self, db: Session, *, force: bool = False) -> int:
+        """Decide and persist every complete or timed-out trace (all of them with `force`).
+
+        Buffers and their spill files are released only after the commit; if
+        persisting fails, the traces are re-queued and retried on the next pass.
+        """
+        now = time.monotonic()
+        with self._lock:
+            ready = [
+                buffer for buffer in self._buffers.values() if force or self._is_ready(buffer, now)
+            ]
+            decisions = []
+            for buffer in ready:
+                del self._buffers[buffer.trace_id]
+                self._memory_bytes -= buffer.memory_bytes
+                self._spilled_bytes -= buffer.spilled_bytes
+                decision, reason = self.decide(buffer)
+                # Remember the decision before persisting so concurrent late spans follow it.
+                self._remember(buffer, decision)
+                decisions.append((buffer, decision, reason))
+            self._update_gauges()
+        if not ready:
+            return 0
+        try:
+            for buffer, decision, _ in decisions:
+                if decision == DECISION_DROP:
+                    continue
+                persist_records(
+                    db, self._load_records(buffer), summary_only=decision == DECISION_SUMMARY
+                )
+                db.flush()
+                trace = db.get(Trace, buffer.trace_id)
+                if trace is not None:
+                    trace.sampling_decision = decision
+            db.commit()
+        except Exception:
+            db.rollback()
+            self._requeue(ready)
+            raise
+        for buffer, decision, reason in decisions:
+            self._count(buffer, decision, reason)
+        for buffer in ready:
+            if buffer.spill_path is not None:
+                buffer.spill_path.unlink(missing_ok=True)
+        hub.publish_traces(
+            db, [buffer.trace_id for buffer, decision, _ in decisions if decision != DECISION_DROP]
+        )
+        return len(ready)
+
+    def decide(self, buffer: _TraceBuffer) -> Tuple[str, str]:
+        if buffer.has_error:
+            return DECISION_FULL, "error"
+        if buffer.duration_ms >= settings.sampling_slow_ms:
+            return DECISION_FULL, "slow"
+        if buffer.cost_usd >= settings.sampling_cost_usd:
+            return DECISION_FULL, "expensive"
+        if buffer.has_flagged_event:
+            return DECISION_FULL, "flagged_event"
+        if _sample_fraction(buffer.trace_id) < settings.sampling_baseline_rate:
+            return DECISION_FULL, "baseline"
+        if settings.sampling_default_action == DECISION_DROP:
+            return DECISION_DROP, "default"
+        return DECISION_SUMMARY, "default"
+
+    def _add(self, buffer: _TraceBuffer, record: SpanRecord, now: float) -> None:
+        size = _estimate_bytes(record)
+        buffer.records.append(record)
+        buffer.span_ids.add(record.span_id)
+        buffer.memory_bytes += size
+        self._memory_bytes += size
+        buffer.last_seen = now
+        if record.parent_span_id is None:
+            buffer.root_seen = True
+        if record.status_code == ERROR_STATUS:
+            buffer.has_error = True
+        if record.start_time and (buffer.min_start is None or record.start_time < buffer.min_start):
+            buffer.min_start = record.start_time
+        if record.end_time and (buffer.max_end is None or record.end_time > buffer.max_end):
+            buffer.max_end = record.end_time
+        try:
+            buffer.cost_usd += float(record.attributes.get(COST_ATTRIBUTE) or 0)
+        except (TypeError, ValueError):
+            pass
+        if any(
+            flag in str(event.get("name") or "").lower()
+            for event in record.events
+            for flag in self._flag_events
+        ):
+            buffer.has_flagged_event = True
+
+    def _is_ready(self, buffer: _TraceBuffer, now: float) -> bool:
+        if now - buffer.first_seen >= settings.sampling_trace_timeout_seconds:
+            return True
+        return buffer.root_seen and now - buffer.last_seen >= settings.sampling_decision_wait_seconds
+
+    def _spill_until_under_budget(self) -> None:
+        spill_dir = settings.sampling_spill_dir
+        spill_dir.mkdir(parents=True, exist_ok=True)
+        for buffer in sorted(self._buffers.values(), key=lambda b: b.memory_bytes, reverse=True):
+            if self._memory_bytes <= settings.sampling_buffer_bytes:
+                break
+            if not buffer.records:
+                continue
+            if buffer.spill_path is None:
+                digest = hashlib.sha256(buffer.trace_id.encode("utf-8")).hexdigest()
+                buffer.spill_path = spill_dir / f"{digest}.spill"
+            with buffer.spill_path.open("ab") as fh:
+                pickle.dump(buffer.records, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            buffer.spilled_spans += len(buffer.records)
+            buffer.spilled_bytes += buffer.memory_bytes
+            self._spilled_bytes += buffer.memory_bytes
+            self._memory_bytes -= buffer.memory_bytes
+            logger.debug("spilled %d spans of trace %s", len(buffer.records), buffer.trace_id)
+            buffer.records = []
+            buffer.memory_bytes = 0
+
+    def _load_records(self, buffer: _TraceBuffer) -> List[SpanRecord]:
+        """Spilled spans followed by in-memory ones, each span id once."""
+        records: List[SpanRecord] = []
+        if buffer.spill_path is not None and buffer.spill_path.exists():
+            with buffer.spill_path.open("rb") as fh:
+                while True:
+                    try:
+                        records.extend(pickle.load(fh))
+                    except EOFError:
+                        break
+        unique: Dict[str, SpanRecord] = {}
+        for record in records + buffer.records:
+            # A re-queued buffer merged with a newer one can hold a span twice.
+            unique.setdefault(record.span_id, record)
+        return list(unique.values())
+
+    def _remember(self, buffer: _TraceBuffer, decision: str) -> None:
+        counted = frozenset(buffer.span_ids) if decision == DECISION_SUMMARY else frozenset()
+        self._decided[buffer.trace_id] = (decision, counted)
+        while len(self._decided) > settings.sampling_decision_cache_size:
+            self._decided.popitem(last=False)
+
+    def _count(self, buffer: _TraceBuffer, decision: str, reason: str) -> None:
+        SAMPLING_DECISIONS.inc(decision=decision, reason=reason)
+        SAMPLING_SPANS.inc(buffer.span_count, decision=decision)
+        with self._lock:
+            self._decided_total += 1
+            if decision == DECISION_FULL:
+                self._kept += 1
+            SAMPLING_KEPT_RATIO.set(self._kept / self._decided_total)
+
+    def _requeue(self, buffers: List[_TraceBuffer]) -> None:
+        """Undo the decisions for `buffers` after a failed persist; their spill files are kept."""
+        with self._lock:
+            for buffer in buffers:
+                self._decided.pop(buffer.trace_id, None)
+                newer = self._buffers.get(buffer.trace_id)
+                if newer is not None:
+                    # Spans that arrived meanwhile; a spilled part shares the same spill file.
+                    self._memory_bytes -= newer.memory_bytes
+                    self._spilled_bytes -= newer.spilled_bytes
+                    _merge_buffer(buffer, newer)
+                self._buffers[buffer.trace_id] = buffer
+                self._memory_bytes += buffer.memory_bytes
+                self._spilled_bytes += buffer.spilled_bytes
+            self._update_gauges()
+        logger.warning("persisting sampled traces failed; re-queued %d traces", len(buffers))
+
+    def _update_gauges(self) -> None:
+        SAMPLING_BUFFER_BYTES.set(self._memory_bytes, location="memory")
+        SAMPLING_BUFFER_BYTES.set(self._spilled_bytes, location="disk")
+        SAMPLING_BUFFERED_TRACES.set(len(self._buffers))
+
+
+def _merge_buffer(buffer: _TraceBuffer, newer: _TraceBuffer) -> None:
+    buffer.records.extend(newer.records)
+    buffer.span_ids |= newer.span_ids
+    buffer.memory_bytes += newer.memory_bytes
+    buffer.spilled_bytes += newer.spilled_bytes
+    buffer.spilled_spans += newer.spilled_spans
+    buffer.spill_path = buffer.spill_path or newer.spill_path
+    buffer.last_seen = max(buffer.last_seen, newer.last_seen)
+    buffer.root_seen = buffer.root_seen or newer.root_seen
+    buffer.has_error = buffer.has_error or newer.has_error
+    buffer.has_flagged_event = buffer.has_flagged_event or newer.has_flagged_event
+    buffer.min_start = min(filter(None, (buffer.min_start, newer.min_start)), default=None)
+    buffer.max_end = max(filter(None, (buffer.max_end, newer.max_end)), default=None)
+    buffer.cost_usd += newer.cost_usd
+
+
+def _sample_fraction(trace_id: str) -> float:
+    """Deterministic value in [0, 1) derived from the trace id."""
+    digest = hashlib.sha256(trace_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64
+
+
+def _estimate_bytes(record: SpanRecord) -> int:
+    size = _RECORD_OVERHEAD_BYTES + len(record.name or "")
+    size += len(dumps(record.attributes))
+    size += len(dumps(record.events))
+    for payload in record.payloads:
+        data = payload.get("data") if isinstance(payload, dict) else None
+        size += len(data) if isinstance(data, (str, bytes)) else 0
+    return size
@@ -21,6 +21,11 @@ class TraceSummary(BaseModel):
     token_out: Optional[int] = None
     cost_usd_estimate: Optional[float] = None
     span_count: int = 0
+    critical_path_ms: Optional[float] = None
+    error_span_count: Optional[int] = None
+    slowest_tool: Optional[str] = None
+    slowest_tool_ms: Optional[float] = None
+    sampling_decision: Optional[str] = None
 
 
 class SpanPayloadRefSchema(BaseModel):
@@ -55,5 +60,79 @@ class PayloadBlobSchema(BaseModel):
     compression: Optional[str] = None
 
 
+class CriticalPathSegment(BaseModel):
+    span_id: str
+    name: Optional[str] = None
+    critical_ms: float
+
+
+class SpanTiming(BaseModel):
+    span_id: str
+    self_ms: float
+    child_overlap_ms: float
+    critical_ms: float
+
+
+class OperationBreakdown(BaseModel):
+    name: str
+    count: int
+    total_ms: float
+    self_ms: float
+    max_ms: float
+    critical_ms: float
+    error_count: int
+
+
+class SlowestTool(BaseModel):
+    span_id: str
+    tool_name: str
+    duration_ms: float
+
+
+class TraceAnalysis(BaseModel):
+    trace_id: str
+    analyzed_at: Optional[datetime] = None
+    span_count: int
+    critical_path_ms: float
+    critical_path: List[CriticalPathSegment] = []
+    spans: List[SpanTiming] = []
+    operations: List[OperationBreakdown] = []
+    slowest_tool: Optional[SlowestTool] = None
+    error_span_count: int = 0
+
+
+class SketchStats(BaseModel):
+    count: int
+    min: Optional[float] = None
+    max: Optional[float] = None
+    mean: Optional[float] = None
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+    p99: Optional[float] = None
+
+
+class SketchQuantiles(SketchStats):
+    service_name: str
+    span_name: str
+    subject: str
+    metric: str
+
+
+class SketchComparison(BaseModel):
+    service_name: str
+    span_name: str
+    subject: str
+    metric: str
+    baseline: SketchStats
+    current: SketchStats
+    ks_statistic: float
+    p_value: Optional[float] = None
+    significant: bool
+    shift: str
+    p50_change: Optional[float] = None
+    p95_change: Optional[float] = None
+    p99_change: Optional[float] = None
+
+
 class HealthResponse(BaseModel):
     ok: bool
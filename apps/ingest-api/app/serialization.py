@@ -0,0 +1,171 @@
+"""Fast response serialization for query endpoints.
+
+Query endpoints select plain column tuples and encode them straight to JSON
+bytes with orjson, skipping ORM object construction and response-model
+re-validation. The `schemas` models still document the response shapes. The
+bytes match FastAPI's default encoder except for floats in exponent form,
+which orjson writes as `1e16` rather than `1e+16`.
+"""
+from __future__ import annotations
+
+import json
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import orjson
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+
+from .config import get_settings
+from .models import Span, Trace
+
+settings = get_settings()
+
+JSON_MEDIA_TYPE = "application/json"
+STREAM_CHUNK_ROWS = 500
+
+SPAN_SUMMARY_COLUMNS = (
+    Span.span_id,
+    Span.trace_id,
+    Span.parent_span_id,
+    Span.name,
+    Span.kind,
+    Span.start_time,
+    Span.end_time,
+    Span.duration_ms,
+    Span.status_code,
+    Span.error_type,
+)
+SPAN_DETAIL_COLUMNS = SPAN_SUMMARY_COLUMNS + (Span.attributes, Span.events, Span.resource)
+
+TRACE_SUMMARY_COLUMNS = (
+    Trace.trace_id,
+    Trace.service_name,
+    Trace.environment,
+    Trace.started_at,
+    Trace.duration_ms,
+    Trace.root_span_name,
+    Trace.status_code,
+    Trace.error_type,
+    Trace.model,
+    Trace.token_in,
+    Trace.token_out,
+    Trace.cost_usd_estimate,
+    Trace.span_count,
+    Trace.critical_path_ms,
+    Trace.error_span_count,
+    Trace.slowest_tool,
+    Trace.slowest_tool_ms,
+    Trace.sampling_decision,
+)
+
+PayloadRefs = Mapping[str, List[Dict[str, str]]]
+
+
+def dumps(content: Any) -> bytes:
+    try:
+        return orjson.dumps(content)
+    except TypeError:
+        # orjson rejects integers outside 64 bits; fall back for the rare row holding one.
+        return json.dumps(
+            content, default=_json_default, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+
+def json_response(content: Any, *, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(content=dumps(content), media_type=JSON_MEDIA_TYPE, headers=headers)
+
+
+def json_array_response(
+    items: Sequence[Any],
+    convert: Callable[[Any], Dict[str, Any]],
+    *,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """Encode `items` as a JSON array, streaming it in chunks when it is large."""
+    if len(items) <= settings.stream_threshold_rows:
+        return json_response([convert(item) for item in items], headers=headers)
+    return StreamingResponse(
+        _iter_json_array(items, convert), media_type=JSON_MEDIA_TYPE, headers=headers
+    )
+
+
+def span_to_dict(span: Any, payload_refs: Optional[List[Dict[str, str]]] = None, *, details: bool = True) -> Dict[str, Any]:
+    """Build a `SpanRead`-shaped dict from a row tuple, `Span` or archived span."""
+    data = {
+        "span_id": span.span_id,
+        "trace_id": span.trace_id,
+        "parent_span_id": span.parent_span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "start_time": span.start_time,
+        "end_time": span.end_time,
+        "duration_ms": span.duration_ms,
+        "status_code": span.status_code,
+        "error_type": span.error_type,
+        "attributes": None,
+        "events": None,
+        "resource": None,
+        "payload_refs": [],
+    }
+    if details:
+        data["attributes"] = span.attributes
+        data["events"] = span.events
+        data["resource"] = span.resource
+        data["payload_refs"] = payload_refs or []
+    return data
+
+
+def payload_refs_of(span: Any) -> List[Dict[str, str]]:
+    return [
+        {"payload_ref": ref.payload_ref, "payload_role": ref.payload_role}
+        for ref in span.payload_refs
+    ]
+
+
+def group_payload_refs(rows: Iterable[Tuple[str, str, str]]) -> PayloadRefs:
+    grouped: Dict[str, List[Dict[str, str]]] = {}
+    for span_id, payload_ref, payload_role in rows:
+        grouped.setdefault(span_id, []).append(
+            {"payload_ref": payload_ref, "payload_role": payload_role}
+        )
+    return grouped
+
+
+def trace_to_dict(trace: Any) -> Dict[str, Any]:
+    """Build a `TraceSummary`-shaped dict from a row tuple or `Trace`."""
+    return {
+        "trace_id": trace.trace_id,
+        "service_name": trace.service_name,
+        "environment": trace.environment,
+        "started_at": trace.started_at,
+        "duration_ms": trace.duration_ms,
+        "root_span_name": trace.root_span_name,
+        "status_code": trace.status_code,
+        "error_type": trace.error_type,
+        "model": trace.model,
+        "token_in": trace.token_in,
+        "token_out": trace.token_out,
+        "cost_usd_estimate": trace.cost_usd_estimate,
+        "span_count": trace.span_count or 0,
+        "critical_path_ms": trace.critical_path_ms,
+        "error_span_count": trace.error_span_count,
+        "slowest_tool": trace.slowest_tool,
+        "slowest_tool_ms": trace.slowest_tool_ms,
+        "sampling_decision": trace.sampling_decision,
+    }
+
+
+def _iter_json_array(items: Sequence[Any], convert: Callable[[Any], Dict[str, Any]]) -> Iterator[bytes]:
+    yield b"["
+    for offset in range(0, len(items), STREAM_CHUNK_ROWS):
+        chunk = dumps([convert(item) for item in items[offset : offset + STREAM_CHUNK_ROWS]])
+        # Strip the chunk's own brackets so the chunks join into one array.
+        yield (b"," if offset else b"") + chunk[1:-1]
+    yield b"]"
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
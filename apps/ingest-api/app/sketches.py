@@ -0,0 +1,424 @@
+"""Mergeable latency and cost sketches per operation.
+
+Ingest feeds every span into a DDSketch keyed by (service, span name, tool
+name or model, metric, time bucket). Sketches accumulate in memory and the
+background worker merges them into `latency_sketches`, one row per series and
+`SKETCH_BUCKET_SECONDS` bucket, and into a coarser `SKETCH_ROLLUP_SECONDS`
+rollup row, under row locks so several API workers can flush into the same
+rows. A row holds at most `SKETCH_MAX_BINS` bins, so storage per series is
+constant, and any time range is answered by merging rollups for its whole
+periods and buckets for the rest, with quantiles accurate to
+`SKETCH_RELATIVE_ACCURACY`.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .analysis import TOOL_NAME_ATTRIBUTE
+from .config import get_settings
+from .ingest import COST_ATTRIBUTE, SpanRecord, to_naive_utc
+from .models import LatencySketch, LatencySketchRollup
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+METRIC_DURATION = "duration_ms"
+METRIC_COST = "cost_usd"
+SKETCH_METRICS = (METRIC_DURATION, METRIC_COST)
+MODEL_ATTRIBUTE = "gen_ai.request.model"
+QUANTILES = (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+# Below this a value is counted as zero; keeps bin indexes bounded.
+_MIN_INDEXABLE = 1e-9
+# Series keys per lookup; five bound parameters each stays under SQLite's limit.
+_KEYS_PER_QUERY = 500
+
+SeriesKey = Tuple[str, str, str, str, datetime]
+SeriesName = Tuple[str, str, str]
+
+
+class DDSketch:
+    """Quantile sketch with relative-error guarantees (Masson et al., VLDB 2019).
+
+    Value `v` lands in bin `ceil(log_gamma(v))`; two sketches with the same
+    accuracy merge by adding bin counts. When the bin count exceeds `max_bins`
+    the lowest bins are collapsed, which preserves the upper quantiles.
+    """
+
+    def __init__(self, relative_accuracy: Optional[float] = None, max_bins: Optional[int] = None) -> None:
+        self.relative_accuracy = relative_accuracy or settings.sketch_relative_accuracy
+        self.max_bins = max_bins or settings.sketch_max_bins
+        self.gamma = (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float, count: int = 1) -> None:
+        value = max(0.0, float(value))
+        if value < _MIN_INDEXABLE:
+            self.zero_count += count
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += count
+        self.sum += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def merge(self, other: "DDSketch") -> "DDSketch":
+        if not math.isclose(other.relative_accuracy, self.relative_accuracy):
+            raise ValueError("cannot merge sketches with different relative accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                return min(self.max, max(self.min, self.bin_value(index)))
+        return self.max
+
+    def bin_value(self, index: int) -> float:
+        return 2 * self.gamma**index / (self.gamma + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "bins": {str(index): count for index, count in self.bins.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DDSketch":
+        sketch = cls(relative_accuracy=data["relative_accuracy"])
+        sketch.bins = {int(index): count for index, count in data["bins"].items()}
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        sketch.sum = data["sum"]
+        if sketch.count:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        return sketch
+
+    def _collapse(self) -> None:
+        indexes = sorted(self.bins)
+        excess = indexes[: len(indexes) - self.max_bins]
+        target = indexes[len(excess)]
+        self.bins[target] += sum(self.bins.pop(index) for index in excess)
+
+
+class SketchAggregator:
+    """Accumulates sketches between worker flushes; thread-safe."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pending: Dict[SeriesKey, DDSketch] = {}
+
+    def observe(self, records: Iterable[SpanRecord]) -> None:
+        with self._lock:
+            for record in records:
+                bucket = bucket_start(to_naive_utc(record.start_time or record.end_time))
+                if bucket is None:
+                    continue
+                subject = str(
+                    record.attributes.get(TOOL_NAME_ATTRIBUTE) or record.attributes.get(MODEL_ATTRIBUTE) or ""
+                )
+                series = (record.service_name, record.name, subject)
+                if record.duration_ms is not None:
+                    self._sketch(series, METRIC_DURATION, bucket).add(record.duration_ms)
+                cost = _as_float(record.attributes.get(COST_ATTRIBUTE))
+                if cost is not None:
+                    self._sketch(series, METRIC_COST, bucket).add(cost)
+
+    def flush(self, db: Session) -> int:
+        """Worker task: merge pending sketches into their `latency_sketches` and rollup rows."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        rollups: Dict[SeriesKey, DDSketch] = {}
+        for key, sketch in pending.items():
+            rollup_key = key[:4] + (rollup_start(key[4]),)
+            rollups.setdefault(rollup_key, DDSketch(sketch.relative_accuracy)).merge(sketch)
+        _merge_rows(db, LatencySketch, pending)
+        _merge_rows(db, LatencySketchRollup, rollups)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another API worker created one of the rows first; retry on the next pass.
+            db.rollback()
+            logger.info("sketch flush raced another worker; retrying %d series next pass", len(pending))
+            with self._lock:
+                for key, sketch in pending.items():
+                    existing = self._pending.get(key)
+                    self._pending[key] = sketch if existing is None else sketch.merge(existing)
+            return 0
+        return len(pending)
+
+    def _sketch(self, series: SeriesName, metric: str, bucket: datetime) -> DDSketch:
+        key = series + (metric, bucket)
+        sketch = self._pending.get(key)
+        if sketch is None:
+            sketch = self._pending[key] = DDSketch()
+        return sketch
+
+
+def _merge_rows(db: Session, model: Any, sketches: Dict[SeriesKey, DDSketch]) -> None:
+    """Merge `sketches` into the rows of `model`, creating missing ones; the caller commits.
+
+    Only the rows of the given keys are read and locked, in id order so API
+    workers flushing the same rows wait for each other instead of deadlocking.
+    """
+    columns = (model.service_name, model.span_name, model.subject, model.metric, model.bucket_start)
+    keys = sorted(sketches)
+    ids: List[int] = []
+    for offset in range(0, len(keys), _KEYS_PER_QUERY):
+        chunk = keys[offset : offset + _KEYS_PER_QUERY]
+        ids.extend(row_id for (row_id,) in db.query(model.id).filter(tuple_(*columns).in_(chunk)))
+    ids.sort()
+    rows = {}
+    for offset in range(0, len(ids), _KEYS_PER_QUERY):
+        chunk = ids[offset : offset + _KEYS_PER_QUERY]
+        for row in db.query(model).filter(model.id.in_(chunk)).order_by(model.id).with_for_update():
+            rows[(row.service_name, row.span_name, row.subject, row.metric, row.bucket_start)] = row
+    for key, sketch in sketches.items():
+        row = rows.get(key)
+        if row is None:
+            # A row created since the id lookup makes the insert fail; the flush retries.
+            service_name, span_name, subject, metric, bucket = key
+            db.add(
+                model(
+                    service_name=service_name,
+                    span_name=span_name,
+                    subject=subject,
+                    metric=metric,
+                    bucket_start=bucket,
+                    count=sketch.count,
+                    sketch=sketch.to_dict(),
+                )
+            )
+            continue
+        merged = DDSketch.from_dict(row.sketch).merge(sketch)
+        row.count = merged.count
+        row.sketch = merged.to_dict()
+
+
+def bucket_start(value: Optional[datetime], seconds: Optional[int] = None) -> Optional[datetime]:
+    if value is None:
+        return None
+    seconds = seconds or settings.sketch_bucket_seconds
+    epoch = datetime(1970, 1, 1)
+    offset = int((value - epoch).total_seconds()) // seconds * seconds
+    return epoch + timedelta(seconds=offset)
+
+
+def rollup_start(value: datetime) -> datetime:
+    return bucket_start(value, settings.sketch_rollup_seconds)
+
+
+def backfill_rollups(db: Session) -> int:
+    """Build rollup rows from existing buckets when the rollup table is still empty.
+
+    Run at startup, so databases from before rollups existed answer long
+    ranges the same way; returns the number of rollup rows written.
+    """
+    if db.query(LatencySketchRollup.id).first() is not None:
+        return 0
+    rollups: Dict[SeriesKey, DDSketch] = {}
+    query = db.query(
+        LatencySketch.service_name,
+        LatencySketch.span_name,
+        LatencySketch.subject,
+        LatencySketch.metric,
+        LatencySketch.bucket_start,
+        LatencySketch.sketch,
+    )
+    for service_name, span_name, subject, metric, bucket, data in query.yield_per(1000):
+        sketch = DDSketch.from_dict(data)
+        key = (service_name, span_name, subject, metric, rollup_start(bucket))
+        rollups.setdefault(key, DDSketch(sketch.relative_accuracy)).merge(sketch)
+    if not rollups:
+        return 0
+    _merge_rows(db, LatencySketchRollup, rollups)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another API worker backfilled at the same time.
+        db.rollback()
+        return 0
+    logger.info("backfilled %d sketch rollups", len(rollups))
+    return len(rollups)
+
+
+def load_series(
+    db: Session,
+    metric: str,
+    start: datetime,
+    end: datetime,
+    *,
+    service: Optional[str] = None,
+    name: Optional[str] = None,
+    subject: Optional[str] = None,
+) -> Dict[SeriesName, DDSketch]:
+    """Merge the stored sketches of every matching series over buckets overlapping `start`..`end`.
+
+    Whole rollup periods inside the range are read from `latency_sketch_rollups`
+    and only the partial periods at either end from `latency_sketches`, so a
+    30-day range merges about 30 rows per series instead of 720.
+    """
+    first = bucket_start(start)
+    rollup_from = rollup_start(first)
+    if rollup_from < first:
+        rollup_from += timedelta(seconds=settings.sketch_rollup_seconds)
+    rollup_to = rollup_start(end)
+    if rollup_to <= rollup_from:
+        rollup_from = rollup_to = first
+    ranges = (
+        (LatencySketch, first, rollup_from),
+        (LatencySketchRollup, rollup_from, rollup_to),
+        (LatencySketch, rollup_to, end),
+    )
+    merged: Dict[SeriesName, DDSketch] = {}
+    for model, range_start, range_end in ranges:
+        if range_start >= range_end:
+            continue
+        query = db.query(model.service_name, model.span_name, model.subject, model.sketch).filter(
+            model.metric == metric,
+            model.bucket_start >= range_start,
+            model.bucket_start < range_end,
+        )
+        if service:
+            query = query.filter(model.service_name == service)
+        if name:
+            query = query.filter(model.span_name == name)
+        if subject is not None:
+            query = query.filter(model.subject == subject)
+        for service_name, span_name, row_subject, data in query:
+            sketch = DDSketch.from_dict(data)
+            series = (service_name, span_name, row_subject)
+            if series in merged:
+                merged[series].merge(sketch)
+            else:
+                merged[series] = sketch
+    return merged
+
+
+def summarize(sketch: DDSketch) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {
+        "count": sketch.count,
+        "min": sketch.min if sketch.count else None,
+        "max": sketch.max if sketch.count else None,
+        "mean": sketch.sum / sketch.count if sketch.count else None,
+    }
+    for label, q in QUANTILES:
+        summary[label] = sketch.quantile(q)
+    return summary
+
+
+def compare(
+    baseline: DDSketch, current: DDSketch, *, alpha: float, min_shift: float, min_count: int = 30
+) -> Dict[str, Any]:
+    """Two-sample Kolmogorov-Smirnov test over the aligned bins of two sketches.
+
+    A shift is reported only when the test is significant at `alpha` and the
+    p50 or p95 moved by at least `min_shift` (relative), since with large
+    counts even negligible differences are statistically significant.
+    """
+    statistic = ks_statistic(baseline, current)
+    if baseline.count < min_count or current.count < min_count:
+        p_value = None
+    else:
+        effective = baseline.count * current.count / (baseline.count + current.count)
+        p_value = _kolmogorov_survival((math.sqrt(effective) + 0.12 + 0.11 / math.sqrt(effective)) * statistic)
+    base_summary, current_summary = summarize(baseline), summarize(current)
+    changes = {
+        f"{label}_change": _relative_change(base_summary[label], current_summary[label])
+        for label, _ in QUANTILES
+    }
+    significant = p_value is not None and p_value < alpha
+    shift = "none"
+    if significant:
+        moved = [c for c in (changes["p50_change"], changes["p95_change"]) if c is not None and abs(c) >= min_shift]
+        if moved:
+            shift = "higher" if max(moved, key=abs) > 0 else "lower"
+    return {
+        "baseline": base_summary,
+        "current": current_summary,
+        "ks_statistic": statistic,
+        "p_value": p_value,
+        "significant": significant,
+        "shift": shift,
+        **changes,
+    }
+
+
+def ks_statistic(first: DDSketch, second: DDSketch) -> float:
+    if not first.count or not second.count:
+        return 0.0
+    seen_first, seen_second = first.zero_count, second.zero_count
+    statistic = abs(seen_first / first.count - seen_second / second.count)
+    for index in sorted(set(first.bins) | set(second.bins)):
+        seen_first += first.bins.get(index, 0)
+        seen_second += second.bins.get(index, 0)
+        statistic = max(statistic, abs(seen_first / first.count - seen_second / second.count))
+    return statistic
+
+
+def series_to_dict(series: SeriesName, metric: str) -> Dict[str, Any]:
+    service_name, span_name, subject = series
+    return {"service_name": service_name, "span_name": span_name, "subject": subject, "metric": metric}
+
+
+def _kolmogorov_survival(value: float) -> float:
+    """P(K > value) for the Kolmogorov distribution."""
+    if value < 1e-3:
+        return 1.0
+    total = sum((-1) ** (k - 1) * math.exp(-2 * k * k * value * value) for k in range(1, 101))
+    return min(1.0, max(0.0, 2 * total))
+
+
+def _relative_change(before: Optional[float], after: Optional[float]) -> Optional[float]:
+    if before is None or after is None or before <= 0:
+        return None
+    return after / before - 1
+
+
+def _as_float(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
@@ -0,0 +1,75 @@
+"""Background maintenance worker."""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+Task = Callable[[Session], int]
+
+
+class BackgroundWorker:
+    """Runs maintenance tasks on a daemon thread at a fixed interval.
+
+    Each task receives a fresh session and returns how many items it handled.
+    A task that handled anything is called again right away, so a backlog
+    drains in one tick instead of one batch per interval, until it comes back
+    empty or has run for `budget_seconds`. A failing task is logged and does
+    not stop the others.
+    """
+
+    def __init__(
+        self, interval_seconds: float, tasks: Optional[List[Task]] = None, budget_seconds: Optional[float] = None
+    ) -> None:
+        self.interval_seconds = interval_seconds
+        self.budget_seconds = interval_seconds if budget_seconds is None else budget_seconds
+        self.tasks: List[Task] = list(tasks or [])
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="tracefoundry-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval_seconds + self.budget_seconds * len(self.tasks) + 5)
+            self._thread = None
+
+    def run_once(self) -> int:
+        handled = 0
+        for task in self.tasks:
+            deadline = time.monotonic() + self.budget_seconds
+            while True:
+                count = self._run_task(task)
+                handled += count
+                if count <= 0 or time.monotonic() >= deadline or self._stop.is_set():
+                    break
+        return handled
+
+    def _run_task(self, task: Task) -> int:
+        db = SessionLocal()
+        try:
+            return task(db)
+        except Exception:  # noqa: BLE001
+            db.rollback()
+            logger.exception("worker task %s failed", getattr(task, "__name__", task))
+            return 0
+        finally:
+            db.close()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval_seconds)
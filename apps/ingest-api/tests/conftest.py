@@ -0,0 +1,14 @@
+"""Point the app at a throwaway database and payload store before it is imported."""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+API_ROOT = Path(__file__).resolve().parents[1]
+_scratch = Path(tempfile.mkdtemp(prefix="tracefoundry-tests-"))
+
+os.environ["DB_URL"] = f"sqlite:///{_scratch / 'test.db'}"
+os.environ["PAYLOAD_DIR"] = str(_scratch / "payloads")
+os.environ["SAMPLING_SPILL_DIR"] = str(_scratch / "spill")
+os.environ["ATTRIBUTE_ALLOWLIST_PATH"] = str(API_ROOT.parents[1] / "deploy" / "trace-allowlist.yaml")
+sys.path.insert(0, str(API_ROOT))
@@ -0,0 +1,136 @@
+import pytest
+
+from app import admission
+from app.admission import DatabaseBucketStore, Limit, MemoryBucketStore, _charge, _grant, _keep_spans, _refill
+from app.config import get_settings
+from app.db import Base, SessionLocal, engine
+from app.models import AdmissionBucket
+
+BURST_SECONDS = get_settings().admission_burst_seconds
+
+
+def _limit(rate=10.0, cost=1.0, subject="svc", unit="spans"):
+    return Limit("service", subject, unit, rate, cost)
+
+
+def test_new_bucket_starts_full():
+    limit = _limit()
+    assert limit.burst == 10.0 * BURST_SECONDS
+    assert _refill(limit, None, now=100.0) == limit.burst
+
+
+def test_refill_adds_rate_per_second_up_to_burst():
+    limit = _limit()
+    assert _refill(limit, (5.0, 100.0), now=102.0) == 25.0
+    assert _refill(limit, (5.0, 100.0), now=1e9) == limit.burst
+    # A clock that went backwards does not drain the bucket.
+    assert _refill(limit, (5.0, 100.0), now=99.0) == 5.0
+
+
+def test_grant_is_limited_by_the_tightest_bucket():
+    spans = _limit(rate=10.0)
+    bytes_ = _limit(rate=1000.0, cost=250.0, unit="bytes")
+    granted, limiting = _grant([spans, bytes_], {spans.key: 7.0, bytes_.key: 1000.0}, wanted=10)
+
+    assert (granted, limiting) == (4, bytes_)
+    assert _grant([spans], {spans.key: 50.0}, wanted=10) == (10, None)
+    assert _grant([spans], {spans.key: -3.0}, wanted=10) == (0, spans)
+
+
+def test_charge_allows_debt_down_to_one_burst():
+    limit = _limit()
+    assert _charge(limit, 20.0, spans=5) == 15.0
+    assert _charge(limit, 20.0, spans=30) == -10.0
+    assert _charge(limit, 20.0, spans=10_000) == -limit.burst
+
+
+def test_memory_store_throttles_then_refills(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: clock[0])
+    store = MemoryBucketStore()
+    limit = _limit(rate=10.0)
+    burst = int(limit.burst)
+
+    assert store.acquire([limit], burst + 5, forced=0) == (burst, limit)
+    assert store.acquire([limit], 1, forced=0) == (0, limit)
+    clock[0] += 1.0
+    assert store.acquire([limit], 50, forced=0) == (10, limit)
+
+
+def test_priority_spans_overdraw_and_delay_later_grants(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: clock[0])
+    store = MemoryBucketStore()
+    limit = _limit(rate=10.0)
+
+    # Error spans are always taken, leaving the bucket 20 tokens in debt.
+    assert store.acquire([limit], 0, forced=int(limit.burst) + 20) == (0, None)
+    clock[0] += 2.0
+    assert store.acquire([limit], 5, forced=0) == (0, limit)
+    clock[0] += 1.0
+    assert store.acquire([limit], 5, forced=0) == (5, None)
+
+
+def test_keep_spans_keeps_priority_spans_and_a_budget_of_others():
+    error = {"name": "e", "status": {"code": "STATUS_CODE_ERROR"}}
+    ok = [{"name": f"ok{i}", "status": {"code": "STATUS_CODE_OK"}} for i in range(3)]
+    resource_span = {"resource": {}, "scope_spans": [{"spans": [ok[0], error, ok[1], ok[2]]}]}
+
+    kept = _keep_spans(resource_span, budget=1)
+
+    assert [span["name"] for span in kept["scope_spans"][0]["spans"]] == ["ok0", "e"]
+    assert len(resource_span["scope_spans"][0]["spans"]) == 4
+
+
+@pytest.mark.parametrize("rate, expected", [(0, 2), (5, 3)])
+def test_zero_rate_disables_a_quota(monkeypatch, rate, expected):
+    monkeypatch.setattr(admission.settings, "admission_user_spans_per_second", rate)
+    monkeypatch.setattr(admission.settings, "admission_user_bytes_per_second", 0)
+    limits = admission.AdmissionController(store=MemoryBucketStore())._limits("svc", "alice", 100.0)
+
+    assert len(limits) == expected
+
+
+def test_memory_store_sweeps_buckets_that_refilled(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(admission, "_SWEEP_MIN_BUCKETS", 8)
+    store = MemoryBucketStore()
+    user = _limit(rate=10.0, subject="alice")
+    # Leave alice's bucket one burst in debt; it needs 2 bursts to refill.
+    store.acquire([user], 0, forced=10_000)
+    for i in range(6):
+        store.acquire([_limit(rate=10.0, subject=f"random-{i}")], 1, forced=0)
+    assert len(store._buckets) == 7
+
+    clock[0] += BURST_SECONDS
+    store.acquire([_limit(rate=10.0, subject="last")], 1, forced=0)
+    # The random service buckets were full again and are gone; alice's debt is kept.
+    assert set(store._buckets) == {user.key, _limit(subject="last").key}
+    assert store.acquire([user], 1, forced=0) == (0, user)
+
+
+def test_database_store_retries_when_a_bucket_is_created_concurrently(monkeypatch):
+    Base.metadata.create_all(bind=engine)
+    limit = _limit(rate=10.0, subject="raced")
+    calls = []
+    grant = admission._grant
+
+    def racing_grant(limits, levels, wanted):
+        if not calls:
+            # Another worker creates the same bucket between our read and our insert.
+            other = SessionLocal()
+            other.add(AdmissionBucket(key=limit.key, tokens=7.0, updated_at=admission.time.time() + 60))
+            other.commit()
+            other.close()
+        calls.append(wanted)
+        return grant(limits, levels, wanted)
+
+    monkeypatch.setattr(admission, "_grant", racing_grant)
+    assert DatabaseBucketStore().acquire([limit], 5, forced=0) == (5, None)
+    assert len(calls) == 2
+    db = SessionLocal()
+    try:
+        assert db.get(AdmissionBucket, limit.key).tokens == 2.0
+    finally:
+        db.close()
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.analysis import TOOL_NAME_ATTRIBUTE, analyze_spans, run_analysis_pass
+from app.db import Base, SessionLocal, engine
+from app.models import Span, Trace, TraceAnalysis
+
+ORIGIN = datetime(2024, 1, 1)
+
+
+def _span(span_id, parent, start_ms, end_ms, name="op", status="STATUS_CODE_OK", attributes=None):
+    return SimpleNamespace(
+        span_id=span_id,
+        parent_span_id=parent,
+        name=name,
+        start_time=ORIGIN + timedelta(milliseconds=start_ms),
+        end_time=ORIGIN + timedelta(milliseconds=end_ms),
+        duration_ms=end_ms - start_ms,
+        status_code=status,
+        attributes=attributes or {},
+    )
+
+
+def _by_id(result):
+    return {span["span_id"]: span for span in result["spans"]}
+
+
+def test_critical_path_follows_last_finishing_overlapping_children():
+    # root  0-100
+    #   a  10-60   (overlaps b by 20 ms)
+    #     a1 15-35
+    #   b  40-90
+    #   c  20-30   (entirely hidden behind a, never critical)
+    result = analyze_spans(
+        [
+            _span("root", None, 0, 100),
+            _span("a", "root", 10, 60),
+            _span("a1", "a", 15, 35),
+            _span("b", "root", 40, 90),
+            _span("c", "root", 20, 30),
+        ]
+    )
+
+    # Walking back from 100: root 90-100, b 40-90, then a up to 40 (a1 15-35 inside it), root 0-10.
+    assert [(s["span_id"], s["critical_ms"]) for s in result["critical_path"]] == [
+        ("root", pytest.approx(20.0)),
+        ("b", pytest.approx(50.0)),
+        ("a", pytest.approx(10.0)),
+        ("a1", pytest.approx(20.0)),
+    ]
+    assert result["critical_path_ms"] == pytest.approx(100.0)
+
+
+def test_self_time_subtracts_the_union_of_overlapping_children():
+    result = analyze_spans(
+        [
+            _span("root", None, 0, 100),
+            _span("a", "root", 10, 60),
+            _span("b", "root", 40, 90),
+            _span("c", "root", 20, 30),
+        ]
+    )
+    spans = _by_id(result)
+
+    # Children cover 10-90, leaving 20 ms of self time; they sum to 110 ms, so 30 ms overlap.
+    assert spans["root"]["self_ms"] == pytest.approx(20.0)
+    assert spans["root"]["child_overlap_ms"] == pytest.approx(30.0)
+    assert spans["a"]["self_ms"] == pytest.approx(50.0)
+    assert spans["c"]["critical_ms"] == 0.0
+
+
+def test_children_are_clipped_to_their_parent():
+    result = analyze_spans([_span("root", None, 0, 50), _span("late", "root", 40, 80)])
+
+    assert _by_id(result)["root"]["self_ms"] == pytest.approx(40.0)
+    assert result["critical_path_ms"] == pytest.approx(50.0)
+
+
+def test_breakdown_counts_errors_and_slowest_tool():
+    result = analyze_spans(
+        [
+            _span("root", None, 0, 100, name="invoke_agent"),
+            _span("t1", "root", 0, 30, name="tool.execute", attributes={TOOL_NAME_ATTRIBUTE: "search"}),
+            _span(
+                "t2",
+                "root",
+                30,
+                90,
+                name="tool.execute",
+                status="STATUS_CODE_ERROR",
+                attributes={TOOL_NAME_ATTRIBUTE: "fetch"},
+            ),
+        ]
+    )
+    operations = {op["name"]: op for op in result["operations"]}
+
+    assert operations["tool.execute"]["count"] == 2
+    assert operations["tool.execute"]["error_count"] == 1
+    assert result["error_span_count"] == 1
+    assert result["slowest_tool"] == {"span_id": "t2", "tool_name": "fetch", "duration_ms": pytest.approx(60.0)}
+
+
+def test_pass_skips_a_trace_that_fails_and_analyzes_the_rest():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        idle = datetime(2024, 1, 1)
+        db.add(Trace(trace_id="analysis-broken", root_span_name="root", last_span_at=idle, archive_ref="missing"))
+        db.add(Trace(trace_id="analysis-ok", root_span_name="root", last_span_at=idle))
+        db.add(Span(trace_id="analysis-ok", span_id="analysis-ok-root", name="root", duration_ms=5.0))
+        db.commit()
+        now = datetime(2024, 1, 2)
+
+        assert run_analysis_pass(db, now) >= 2
+        broken, ok = db.get(Trace, "analysis-broken"), db.get(Trace, "analysis-ok")
+        assert broken.analyzed_at == now and db.get(TraceAnalysis, "analysis-broken") is None
+        assert ok.analyzed_at == now and db.get(TraceAnalysis, "analysis-ok").result["span_count"] == 1
+        assert run_analysis_pass(db, now) == 0
+    finally:
+        db.close()
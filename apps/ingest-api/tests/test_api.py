@@ -0,0 +1,142 @@
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, inspect, text
+
+from app.db import Base, SessionLocal, create_missing_indexes, engine
+from app.main import app
+from app.models import Span, Trace
+
+ORIGIN = datetime(2024, 1, 1, 12, 0, 0)
+AUTH = ("viewer", "viewer")
+
+
+@pytest.fixture(scope="module")
+def client():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        _add_trace(
+            db,
+            "paged",
+            [
+                ("b", None, 0),
+                ("a", "b", 0),
+                ("c", "b", 5),
+                ("n2", "b", None),
+                ("n1", "b", None),
+                ("d", "b", 1),
+            ],
+        )
+        _add_trace(
+            db,
+            "tree",
+            [
+                ("t-root", None, 0),
+                ("t-1", "t-root", 1),
+                ("t-2", "t-1", 2),
+                ("t-3", "t-2", 3),
+                ("t-side", "t-root", 4),
+                # A cycle: neither span reaches a root.
+                ("t-x", "t-y", 5),
+                ("t-y", "t-x", 6),
+            ],
+        )
+        db.commit()
+    finally:
+        db.close()
+    # Not entered as a context manager, so the background worker does not start.
+    return TestClient(app)
+
+
+def _add_trace(db, trace_id, spans):
+    db.add(Trace(trace_id=trace_id, span_count=len(spans)))
+    for span_id, parent, start_s in spans:
+        start = ORIGIN + timedelta(seconds=start_s) if start_s is not None else None
+        db.add(
+            Span(
+                trace_id=trace_id,
+                span_id=span_id,
+                parent_span_id=parent,
+                name=f"op-{span_id}",
+                start_time=start,
+                end_time=(start or ORIGIN) + timedelta(seconds=1),
+                attributes={},
+                events=[],
+                resource={},
+            )
+        )
+
+
+def _span_ids(response):
+    assert response.status_code == 200, response.text
+    return [span["span_id"] for span in response.json()]
+
+
+def test_cursor_pages_through_ties_and_null_start_times(client):
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 2, "details": "false"}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/traces/paged/spans", params=params, auth=AUTH)
+        seen.extend(_span_ids(response))
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    # start_time ascending with span_id breaking ties, spans without a start time last.
+    assert seen == ["a", "b", "d", "c", "n1", "n2"]
+    assert pages == 3
+    assert _span_ids(client.get("/api/traces/paged/spans", auth=AUTH)) == seen
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        base64.urlsafe_b64encode(b"[1]").decode(),
+        base64.urlsafe_b64encode(b"5").decode(),
+        base64.urlsafe_b64encode(b'["yesterday", "a"]').decode(),
+    ],
+)
+def test_bad_cursor_is_rejected(client, cursor):
+    response = client.get("/api/traces/paged/spans", params={"cursor": cursor}, auth=AUTH)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "invalid_cursor"
+
+
+def test_subtree_depth_limits_descendants(client):
+    def subtree(root, depth=None):
+        params = {"root_span_id": root}
+        if depth is not None:
+            params["depth"] = depth
+        return set(_span_ids(client.get("/api/traces/tree/spans", params=params, auth=AUTH)))
+
+    assert subtree("t-1", depth=0) == {"t-1"}
+    assert subtree("t-1", depth=1) == {"t-1", "t-2"}
+    assert subtree("t-1") == {"t-1", "t-2", "t-3"}
+    assert subtree("t-root", depth=1) == {"t-root", "t-1", "t-side"}
+    assert subtree("missing") == set()
+
+
+def test_subtree_of_a_parent_cycle_terminates(client):
+    assert set(_span_ids(client.get("/api/traces/tree/spans", params={"root_span_id": "t-x"}, auth=AUTH))) == {
+        "t-x",
+        "t-y",
+    }
+
+
+def test_span_paging_indexes_reach_existing_tables(tmp_path):
+    old = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with old.begin() as conn:
+        conn.execute(text("CREATE TABLE spans (id INTEGER PRIMARY KEY, trace_id VARCHAR(64), span_id VARCHAR(64))"))
+        conn.execute(text("ALTER TABLE spans ADD COLUMN parent_span_id VARCHAR(64)"))
+        conn.execute(text("ALTER TABLE spans ADD COLUMN start_time DATETIME"))
+    create_missing_indexes(old)
+    create_missing_indexes(old)
+
+    names = {index["name"] for index in inspect(old).get_indexes("spans")}
+    assert {"ix_spans_trace_start", "ix_spans_trace_parent"} <= names
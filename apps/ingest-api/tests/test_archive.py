@@ -0,0 +1,165 @@
+import zlib
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.archive import (
+    ArchivedPayloadRef,
+    ArchiveUnavailable,
+    compact_trace,
+    decode_archive,
+    encode_archive,
+    load_archive,
+    load_trace_spans,
+    run_compaction_pass,
+    select_spans,
+)
+from app.config import get_settings
+from app.db import Base, SessionLocal, engine
+from app.ingest import SpanRecord, persist_records
+from app.models import ArchivedSpan, PayloadBlob, Span, Trace
+
+settings = get_settings()
+ORIGIN = datetime(2024, 1, 1, 12, 0, 0)
+RESOURCE = {"service.name": "svc", "deployment.environment": "test"}
+
+
+def _span(span_id, parent, start_s, end_s, refs=(), resource=RESOURCE):
+    return SimpleNamespace(
+        span_id=span_id,
+        parent_span_id=parent,
+        name=f"op-{span_id}",
+        kind="SPAN_KIND_INTERNAL",
+        start_time=ORIGIN + timedelta(seconds=start_s) if start_s is not None else None,
+        end_time=ORIGIN + timedelta(seconds=end_s),
+        duration_ms=(end_s - (start_s or 0)) * 1000,
+        status_code="STATUS_CODE_OK",
+        error_type=None,
+        attributes={"k": span_id, "n": 1.5},
+        events=[{"name": "retry", "attributes": {"attempt": 2}}],
+        resource=resource,
+        payload_refs=[ArchivedPayloadRef(payload_ref=ref, payload_role="prompt") for ref in refs],
+    )
+
+
+def test_encode_decode_round_trip():
+    spans = [
+        _span("b", "a", 2, 3, refs=("ref-1", "ref-2")),
+        _span("a", None, 0, 5),
+        _span("c", "a", None, 4, resource={"service.name": "other"}),
+    ]
+    decoded = decode_archive(encode_archive("t1", spans))
+
+    # Decoded spans come back in read order: start time, undated spans last.
+    assert [span.span_id for span in decoded.spans] == ["a", "b", "c"]
+    for original in spans:
+        restored = decoded.by_id[original.span_id]
+        assert restored.trace_id == "t1"
+        for field in ("parent_span_id", "name", "kind", "start_time", "end_time", "duration_ms"):
+            assert getattr(restored, field) == getattr(original, field)
+        assert restored.attributes == original.attributes
+        assert restored.events == original.events
+        assert restored.resource == original.resource
+        assert list(restored.payload_refs) == list(original.payload_refs)
+
+
+def test_decode_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        decode_archive(zlib.compress(b'{"format": "something-else"}'))
+
+
+def test_select_spans_filters_like_the_sql_path():
+    originals = [_span("a", None, 0, 10), _span("b", "a", 1, 2), _span("c", "b", 3, 4), _span("d", "a", 6, 8)]
+    spans = decode_archive(encode_archive("t1", originals)).spans
+
+    assert [s.span_id for s in select_spans(spans, start=ORIGIN + timedelta(seconds=5))] == ["a", "d"]
+    assert [s.span_id for s in select_spans(spans, subtree_root="b")] == ["b", "c"]
+    assert [s.span_id for s in select_spans(spans, subtree_root="a", max_depth=1)] == ["a", "b", "d"]
+    assert [s.span_id for s in select_spans(spans, after=(ORIGIN + timedelta(seconds=1), "b"))] == ["c", "d"]
+
+
+def _record(span_id, parent=None, trace_id="late-trace"):
+    return SpanRecord(
+        trace_id=trace_id,
+        span_id=span_id,
+        parent_span_id=parent,
+        name="op",
+        kind=None,
+        start_time=ORIGIN,
+        end_time=ORIGIN + timedelta(seconds=1),
+        duration_ms=1000.0,
+        status_code="STATUS_CODE_OK",
+        error_type=None,
+        attributes={},
+        events=[],
+        resource=RESOURCE,
+        service_name="svc",
+        environment="test",
+    )
+
+
+def test_resent_and_late_spans_after_compaction():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        persist_records(db, [_record("root"), _record("child", "root")])
+        db.commit()
+        trace = db.get(Trace, "late-trace")
+        compact_trace(db, trace, datetime.utcnow())
+        db.commit()
+        first_ref = trace.archive_ref
+
+        persist_records(db, [_record("child", "root"), _record("late", "root")])
+        db.commit()
+        assert trace.span_count == 3
+        assert {span.span_id for span in load_trace_spans(db, "late-trace", first_ref)} == {"root", "child", "late"}
+
+        # Once the late rows are idle they are folded into a new archive.
+        assert run_compaction_pass(db, datetime.utcnow() + timedelta(days=365)) >= 1
+        db.refresh(trace)
+        assert trace.archive_ref != first_ref
+        assert db.query(Span).filter(Span.trace_id == "late-trace").count() == 0
+        assert db.query(ArchivedSpan).filter(ArchivedSpan.trace_id == "late-trace").count() == 3
+        # The replaced archive is deleted, row and file.
+        assert db.get(PayloadBlob, first_ref) is None
+        assert not (settings.payload_dir / first_ref).exists()
+        assert [span.span_id for span in load_trace_spans(db, "late-trace", trace.archive_ref)] == [
+            "child",
+            "late",
+            "root",
+        ]
+    finally:
+        db.close()
+
+
+def test_missing_archive_does_not_block_the_pass():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        persist_records(db, [_record("lost-root", trace_id="lost-trace")])
+        db.commit()
+        lost = db.get(Trace, "lost-trace")
+        lost_ref = compact_trace(db, lost, datetime.utcnow())
+        db.commit()
+        (settings.payload_dir / lost_ref).unlink()
+        load_archive.cache_clear()
+        with pytest.raises(ArchiveUnavailable):
+            load_trace_spans(db, "lost-trace", lost_ref)
+
+        persist_records(db, [_record("lost-late", "lost-root", trace_id="lost-trace")])
+        persist_records(db, [_record("ok-root", trace_id="ok-trace")])
+        db.commit()
+        now = datetime.utcnow() + timedelta(days=365)
+        run_compaction_pass(db, now)
+
+        # The broken trace keeps its rows and is not picked again until new spans arrive.
+        db.refresh(lost)
+        assert (lost.archive_ref, lost.archived_at) == (lost_ref, now)
+        assert db.query(Span).filter(Span.trace_id == "lost-trace").count() == 1
+        assert db.get(Trace, "ok-trace").archive_ref is not None
+        run_compaction_pass(db, now + timedelta(seconds=1))
+        db.refresh(lost)
+        assert lost.archived_at == now
+    finally:
+        db.close()
@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+
+SCRIPT = Path(__file__).resolve().parents[3] / "scripts" / "gen_corpus.py"
+
+
+def test_tiny_corpus_writes_analyses_sketches_and_archives(tmp_path):
+    env = {
+        **os.environ,
+        "DB_URL": f"sqlite:///{tmp_path / 'corpus.db'}",
+        "PAYLOAD_DIR": str(tmp_path / "payloads"),
+        "CORPUS_TRACES": "2",
+        "CORPUS_ARCHIVED_RATE": "1",
+        "CORPUS_LARGE_TRACE_RATE": "0",
+        "CORPUS_END": "2024-06-01T00:00:00",
+    }
+    result = subprocess.run(
+        [sys.executable, str(SCRIPT)], env=env, cwd=tmp_path, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    summary = json.loads(result.stdout)
+    assert (summary["traces"], summary["archived_traces"]) == (2, 2)
+    assert summary["sketch_series_buckets"] > 0
+
+    engine = create_engine(env["DB_URL"])
+    with engine.connect() as conn:
+
+        def count(sql):
+            return conn.execute(text(sql)).scalar()
+
+        assert count("SELECT COUNT(*) FROM trace_analyses") == 2
+        assert count("SELECT COUNT(*) FROM traces WHERE analyzed_at IS NOT NULL") == 2
+        assert count("SELECT COUNT(*) FROM latency_sketches") > 0
+        assert count("SELECT COUNT(*) FROM latency_sketch_rollups") > 0
+        assert count("SELECT COUNT(*) FROM spans") == 0
+        assert count("SELECT COUNT(*) FROM archived_spans") == summary["spans"]
+        refs = [ref for (ref,) in conn.execute(text("SELECT archive_ref FROM traces"))]
+    engine.dispose()
+    assert all(ref and (tmp_path / "payloads" / ref).exists() for ref in refs)
@@ -0,0 +1,140 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import live
+from app.db import Base, SessionLocal, engine
+from app.live import LiveHub, _track_gaps
+from app.models import LiveEvent, Trace
+
+settings = live.settings
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    for trace_id, service in (("live-a", "checkout"), ("live-b", "search"), ("live-c", "checkout")):
+        if session.get(Trace, trace_id) is None:
+            session.add(Trace(trace_id=trace_id, service_name=service, started_at=datetime(2024, 1, 1)))
+    session.commit()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _drain(subscription):
+    events = []
+    while not subscription.queue.empty():
+        event = subscription.queue.get_nowait()
+        events.append(event.summary["trace_id"] if event is not None else None)
+    return events
+
+
+def test_memory_backend_fans_out_to_matching_subscribers(db):
+    async def scenario():
+        hub = LiveHub()
+        everything = hub.subscribe({})
+        checkout = hub.subscribe({"service": "checkout"})
+        hub.publish_traces(db, ["live-a", "live-b", "live-a"])
+        await asyncio.sleep(0)
+        return _drain(everything), _drain(checkout)
+
+    everything, checkout = asyncio.run(scenario())
+    assert sorted(everything) == ["live-a", "live-b"]
+    assert checkout == ["live-a"]
+
+
+def test_slow_subscriber_is_dropped(db, monkeypatch):
+    monkeypatch.setattr(settings, "live_subscriber_buffer", 2)
+
+    async def scenario():
+        hub = LiveHub()
+        slow = hub.subscribe({})
+        hub.publish_traces(db, ["live-a", "live-b", "live-c"])
+        await asyncio.sleep(0)
+        hub.publish_traces(db, ["live-a"])
+        await asyncio.sleep(0)
+        return slow
+
+    slow = asyncio.run(scenario())
+    assert slow.dropped
+    # The backlog is discarded and replaced by the disconnect marker.
+    assert _drain(slow) == [None]
+
+
+def test_memory_replay_resumes_after_last_event_id(db):
+    async def scenario():
+        hub = LiveHub()
+        hub.publish_traces(db, ["live-a"])
+        hub.publish_traces(db, ["live-b"])
+        hub.publish_traces(db, ["live-c"])
+        return hub, hub.subscribe({}), hub.subscribe({"service": "checkout"})
+
+    hub, everything, checkout = asyncio.run(scenario())
+    assert [(e.id, e.summary["trace_id"]) for e in hub.replay(1, everything)] == [(2, "live-b"), (3, "live-c")]
+    assert [e.summary["trace_id"] for e in hub.replay(0, checkout)] == ["live-a", "live-c"]
+
+
+def test_track_gaps_until_filled_or_expired(monkeypatch):
+    monkeypatch.setattr(settings, "live_gap_timeout_seconds", 30.0)
+    gaps = {}
+    assert _track_gaps(gaps, 10, [11, 14], now=100.0) == 14
+    assert gaps == {12: 100.0, 13: 100.0}
+    # A filled gap is delivered once and forgotten; an older id than last_id does not move it back.
+    assert _track_gaps(gaps, 14, [12], now=105.0) == 14
+    assert gaps == {13: 100.0}
+    assert _track_gaps(gaps, 14, [], now=131.0) == 14
+    assert gaps == {}
+
+
+def test_database_replay_includes_recent_ids_below_last_event_id(db, monkeypatch):
+    monkeypatch.setattr(settings, "live_backend", "database")
+    db.query(LiveEvent).delete()
+    db.add_all(
+        [
+            LiveEvent(id=1, created_at=datetime.utcnow() - timedelta(hours=1), summary={"trace_id": "old"}),
+            LiveEvent(id=2, created_at=datetime.utcnow(), summary={"trace_id": "late-commit"}),
+            LiveEvent(id=3, created_at=datetime.utcnow(), summary={"trace_id": "sent"}),
+            LiveEvent(id=4, created_at=datetime.utcnow(), summary={"trace_id": "new"}),
+        ]
+    )
+    db.commit()
+
+    async def scenario():
+        hub = LiveHub()
+        return hub.replay(3, hub.subscribe({}))
+
+    # Id 2 may have committed after id 3 was sent; the stream dedupes by id.
+    assert [e.summary["trace_id"] for e in asyncio.run(scenario())] == ["late-commit", "sent", "new"]
+
+
+def test_database_poller_delivers_an_id_that_commits_late(db, monkeypatch):
+    monkeypatch.setattr(settings, "live_backend", "database")
+    monkeypatch.setattr(settings, "live_poll_interval_seconds", 0.01)
+    base = (db.query(LiveEvent.id).order_by(LiveEvent.id.desc()).limit(1).scalar() or 0) + 10
+
+    async def next_trace_id(subscription):
+        event = await asyncio.wait_for(subscription.queue.get(), timeout=5)
+        return event.summary["trace_id"]
+
+    async def scenario():
+        hub = LiveHub()
+        subscription = hub.subscribe({})
+        hub.start()
+        try:
+            await asyncio.sleep(0.1)
+            db.add(LiveEvent(id=base + 2, summary={"trace_id": "second"}))
+            db.commit()
+            first = await next_trace_id(subscription)
+            # The lower id commits after the poller moved past it.
+            db.add(LiveEvent(id=base + 1, summary={"trace_id": "first"}))
+            db.commit()
+            return first, await next_trace_id(subscription)
+        finally:
+            hub.stop()
+
+    assert asyncio.run(scenario()) == ("second", "first")
+
@@ -0,0 +1,143 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import sampling
+from app.db import Base, SessionLocal, engine
+from app.ingest import SpanRecord, persist_records
+from app.models import Trace
+from app.sampling import DECISION_DROP, DECISION_FULL, DECISION_SUMMARY, TailSampler
+
+ORIGIN = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def _record(trace_id, span_id, parent=None, seconds=1.0):
+    return SpanRecord(
+        trace_id=trace_id,
+        span_id=span_id,
+        parent_span_id=parent,
+        name="op",
+        kind=None,
+        start_time=ORIGIN,
+        end_time=ORIGIN + timedelta(seconds=seconds),
+        duration_ms=seconds * 1000,
+        status_code="STATUS_CODE_OK",
+        error_type=None,
+        attributes={},
+        events=[],
+        resource={"service.name": "svc"},
+        service_name="svc",
+        environment="test",
+    )
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(sampling.settings, "sampling_baseline_rate", 0.0)
+    monkeypatch.setattr(sampling.settings, "sampling_default_action", DECISION_SUMMARY)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def test_resent_spans_of_a_summary_trace_count_once(db):
+    sampler = TailSampler()
+    sampler.offer([_record("summary-resent", "root"), _record("summary-resent", "child", "root")])
+    sampler.offer([_record("summary-resent", "child", "root")])
+    assert sampler.run_pass(db, force=True) == 1
+    trace = db.get(Trace, "summary-resent")
+    assert (trace.sampling_decision, trace.span_count) == (DECISION_SUMMARY, 2)
+
+    late = sampler.offer([_record("summary-resent", "child", "root"), _record("summary-resent", "late", "root")])
+    assert [(decision, [r.span_id for r in records]) for decision, records in late] == [(DECISION_SUMMARY, ["late"])]
+    for _, records in late:
+        persist_records(db, records, summary_only=True)
+    db.commit()
+    assert trace.span_count == 3
+    assert sampler.offer([_record("summary-resent", "late", "root")]) == []
+
+
+def _buffer(sampler, *records):
+    sampler.offer(list(records))
+    return sampler._buffers[records[0].trace_id]
+
+
+def test_decide_keeps_interesting_traces_in_full(monkeypatch):
+    monkeypatch.setattr(sampling.settings, "sampling_baseline_rate", 0.0)
+    monkeypatch.setattr(sampling.settings, "sampling_default_action", DECISION_SUMMARY)
+    sampler = TailSampler()
+    error = _record("decide-error", "root")
+    error.status_code = "STATUS_CODE_ERROR"
+    expensive = _record("decide-cost", "root")
+    expensive.attributes = {sampling.COST_ATTRIBUTE: 1.0}
+    flagged = _record("decide-flag", "root")
+    flagged.events = [{"name": "Tool Timeout", "attributes": {}}]
+
+    assert sampler.decide(_buffer(sampler, error)) == (DECISION_FULL, "error")
+    assert sampler.decide(_buffer(sampler, _record("decide-slow", "root", seconds=60))) == (DECISION_FULL, "slow")
+    assert sampler.decide(_buffer(sampler, expensive)) == (DECISION_FULL, "expensive")
+    assert sampler.decide(_buffer(sampler, flagged)) == (DECISION_FULL, "flagged_event")
+    plain = _buffer(sampler, _record("decide-plain", "root"))
+    assert sampler.decide(plain) == (DECISION_SUMMARY, "default")
+
+    monkeypatch.setattr(sampling.settings, "sampling_default_action", DECISION_DROP)
+    assert sampler.decide(plain) == (DECISION_DROP, "default")
+    monkeypatch.setattr(sampling.settings, "sampling_baseline_rate", 1.0)
+    assert sampler.decide(plain) == (DECISION_FULL, "baseline")
+
+
+def test_spilled_spans_load_back_in_arrival_order(db, monkeypatch):
+    monkeypatch.setattr(sampling.settings, "sampling_buffer_bytes", 1)
+    sampler = TailSampler()
+    sampler.offer([_record("spill", "root"), _record("spill", "a", "root")])
+    sampler.offer([_record("spill", "b", "root")])
+    buffer = sampler._buffers["spill"]
+    assert buffer.spill_path.exists()
+    assert (buffer.records, buffer.memory_bytes, buffer.spilled_spans) == ([], 0, 3)
+
+    monkeypatch.setattr(sampling.settings, "sampling_buffer_bytes", 1 << 30)
+    sampler.offer([_record("spill", "c", "root")])
+    assert [record.span_id for record in sampler._load_records(buffer)] == ["root", "a", "b", "c"]
+    assert buffer.span_count == 4
+
+    assert sampler.run_pass(db, force=True) == 1
+    assert not buffer.spill_path.exists()
+    assert db.get(Trace, "spill").span_count == 4
+
+
+def test_failed_persist_requeues_and_merges_newer_spans(db, monkeypatch):
+    # Without a cached decision, spans that arrive mid-persist start a new buffer.
+    monkeypatch.setattr(sampling.settings, "sampling_decision_cache_size", 0)
+    sampler = TailSampler()
+    sampler.offer([_record("requeue", "root")])
+
+    def failing_persist(session, records, *, summary_only=False):
+        sampler.offer([_record("requeue", "root"), _record("requeue", "late", "root")])
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(sampling, "persist_records", failing_persist)
+    with pytest.raises(RuntimeError):
+        sampler.run_pass(db, force=True)
+    assert "requeue" not in sampler._decided
+    buffer = sampler._buffers["requeue"]
+    assert [record.span_id for record in sampler._load_records(buffer)] == ["root", "late"]
+    assert sampler._memory_bytes == buffer.memory_bytes
+
+    monkeypatch.setattr(sampling, "persist_records", persist_records)
+    assert sampler.run_pass(db, force=True) == 1
+    trace = db.get(Trace, "requeue")
+    assert (trace.sampling_decision, trace.span_count) == (DECISION_SUMMARY, 2)
+
+
+def test_run_pass_waits_for_complete_traces_unless_forced(db):
+    sampler = TailSampler()
+    sampler.offer([_record("forced", "child", "root")])
+    assert sampler.run_pass(db) == 0
+    assert db.get(Trace, "forced") is None
+
+    assert sampler.run_pass(db, force=True) == 1
+    assert sampler._buffers == {} and sampler._memory_bytes == 0
+    assert db.get(Trace, "forced").sampling_decision == DECISION_SUMMARY
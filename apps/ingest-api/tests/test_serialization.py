@@ -0,0 +1,116 @@
+import json
+from datetime import datetime
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app import schemas
+from app.db import Base, SessionLocal, engine
+from app.main import app
+from app.models import Span, Trace
+from app.serialization import dumps
+
+AUTH = ("viewer", "viewer")
+BIG = 2**70
+ATTRIBUTES = {
+    "gen_ai.request.model": "gpt-4o",
+    "text": "héllo ✓ 😀 </script>",
+    "count": 3,
+    "ratio": 0.125,
+    "flag": True,
+    "nothing": None,
+    "nested": {"list": [1, 2.5, "x"], "u64": 2**64 - 1},
+}
+
+
+@pytest.fixture(scope="module")
+def client():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        db.add(
+            Trace(
+                trace_id="encoded",
+                service_name="svc",
+                environment="test",
+                started_at=datetime(2024, 1, 1, 12, 0, 0, 5),
+                duration_ms=1234.5,
+                root_span_name="agent.run",
+                status_code="STATUS_CODE_OK",
+                model="gpt-4o",
+                token_in=12,
+                token_out=34,
+                cost_usd_estimate=0.0042,
+                span_count=2,
+            )
+        )
+        for span_id, parent, attributes in (("enc-root", None, ATTRIBUTES), ("enc-big", "enc-root", {"id": BIG})):
+            db.add(
+                Span(
+                    trace_id="encoded",
+                    span_id=span_id,
+                    parent_span_id=parent,
+                    name=f"op {span_id}",
+                    kind="SPAN_KIND_INTERNAL",
+                    start_time=datetime(2024, 1, 1, 12, 0, 0, 5),
+                    end_time=datetime(2024, 1, 1, 12, 0, 1),
+                    duration_ms=999.995,
+                    status_code="STATUS_CODE_OK",
+                    attributes=attributes,
+                    events=[{"name": "retry", "attributes": {"attempt": 2}}],
+                    resource={"service.name": "svc"},
+                )
+            )
+        db.commit()
+    finally:
+        db.close()
+    return TestClient(app)
+
+
+def _default_encoding(model, content):
+    """What FastAPI returned before: response-model validation, jsonable_encoder, JSONResponse."""
+    if isinstance(content, list):
+        return JSONResponse([jsonable_encoder(model.model_validate(item)) for item in content]).body
+    return JSONResponse(jsonable_encoder(model.model_validate(content))).body
+
+
+def test_responses_match_the_default_encoder_byte_for_byte(client):
+    for path, model in (
+        ("/api/traces/encoded", schemas.TraceSummary),
+        ("/api/traces?service=svc", schemas.TraceSummary),
+        ("/api/traces/encoded/spans", schemas.SpanRead),
+        ("/api/spans/enc-root", schemas.SpanRead),
+    ):
+        response = client.get(path, auth=AUTH)
+        assert response.status_code == 200, path
+        assert response.content == _default_encoding(model, response.json()), path
+
+
+def test_exponent_floats_differ_only_in_notation():
+    content = {"small": 1e-7, "large": 1e16}
+    assert dumps(content) == b'{"small":1e-7,"large":1e16}'
+    assert json.loads(dumps(content)) == json.loads(JSONResponse(content).body) == content
+
+
+def test_integers_beyond_64_bits_fall_back_without_changing_the_rest():
+    content = {"big": BIG, "text": "héllo ✓", "at": datetime(2024, 1, 1, 12, 0, 0, 5), "n": 1.5}
+    assert dumps(content) == (
+        '{"big":1180591620717411303424,"text":"héllo ✓","at":"2024-01-01T12:00:00.000005","n":1.5}'.encode("utf-8")
+    )
+    without_big = {key: value for key, value in content.items() if key != "big"}
+    assert dumps(content)[len(b'{"big":1180591620717411303424,') :] == dumps(without_big)[1:]
+
+
+def test_json_columns_round_trip_large_integers_exactly(client):
+    db = SessionLocal()
+    try:
+        attributes = db.get(Span, db.query(Span.id).filter(Span.span_id == "enc-big").scalar()).attributes
+        nested = db.query(Span.attributes).filter(Span.span_id == "enc-root").scalar()["nested"]
+    finally:
+        db.close()
+    assert attributes == {"id": BIG} and isinstance(attributes["id"], int)
+    assert nested["u64"] == 2**64 - 1
+    response = client.get("/api/spans/enc-big", auth=AUTH)
+    assert b'"attributes":{"id":1180591620717411303424}' in response.content
@@ -0,0 +1,206 @@
+import math
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db import Base, SessionLocal, engine
+from app.ingest import SpanRecord
+from app.models import LatencySketch, LatencySketchRollup
+from app.sketches import (
+    METRIC_DURATION,
+    DDSketch,
+    SketchAggregator,
+    _kolmogorov_survival,
+    backfill_rollups,
+    compare,
+    ks_statistic,
+    load_series,
+)
+
+ACCURACY = 0.01
+
+
+def _sketch(values, max_bins=2048):
+    sketch = DDSketch(relative_accuracy=ACCURACY, max_bins=max_bins)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def _exact(sorted_values, q):
+    # The sketch answers with the value at rank floor(q * (n - 1)).
+    return sorted_values[int(q * (len(sorted_values) - 1))]
+
+
+@pytest.mark.parametrize("q", [0.0, 0.1, 0.5, 0.9, 0.95, 0.99, 1.0])
+def test_quantiles_stay_within_relative_accuracy(q):
+    rng = random.Random(7)
+    values = [rng.lognormvariate(math.log(200), 1.5) for _ in range(20000)]
+    estimate = _sketch(values).quantile(q)
+
+    exact = _exact(sorted(values), q)
+    assert abs(estimate - exact) <= ACCURACY * exact * (1 + 1e-9)
+
+
+def test_merge_equals_sketch_of_the_union():
+    rng = random.Random(11)
+    first = [rng.expovariate(1 / 50) for _ in range(5000)]
+    second = [rng.expovariate(1 / 400) for _ in range(3000)]
+    merged = _sketch(first).merge(_sketch(second))
+    union = _sketch(first + second)
+
+    assert merged.bins == union.bins
+    assert merged.count == union.count == 8000
+    assert merged.min == union.min and merged.max == union.max
+    assert merged.sum == pytest.approx(union.sum)
+    for q in (0.5, 0.95, 0.99):
+        assert merged.quantile(q) == union.quantile(q)
+
+
+def test_merge_rejects_different_accuracy():
+    with pytest.raises(ValueError):
+        DDSketch(relative_accuracy=0.01).merge(DDSketch(relative_accuracy=0.02))
+
+
+def test_collapse_bounds_bins_and_keeps_upper_quantiles():
+    rng = random.Random(3)
+    values = [10 ** rng.uniform(-3, 6) for _ in range(20000)]
+    sketch = _sketch(values, max_bins=64)
+
+    assert len(sketch.bins) <= 64
+    exact = _exact(sorted(values), 0.99)
+    assert abs(sketch.quantile(0.99) - exact) <= ACCURACY * exact * (1 + 1e-9)
+
+
+def test_zero_and_round_trip():
+    sketch = _sketch([0.0, 0.0, 5.0, 12.5])
+    restored = DDSketch.from_dict(sketch.to_dict())
+
+    assert restored.zero_count == 2
+    assert restored.bins == sketch.bins
+    assert restored.quantile(0.0) == 0.0
+    assert restored.quantile(1.0) == 12.5
+    assert DDSketch(relative_accuracy=ACCURACY).quantile(0.5) is None
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [(0.5, 0.9639), (1.0, 0.2700), (1.36, 0.0495), (1.63, 0.0098)],
+)
+def test_kolmogorov_survival_matches_tabulated_values(value, expected):
+    assert _kolmogorov_survival(value) == pytest.approx(expected, abs=1e-4)
+
+
+def test_ks_statistic_bounds():
+    same = _sketch([1.0, 2.0, 3.0])
+    assert ks_statistic(same, _sketch([1.0, 2.0, 3.0])) == 0.0
+    assert ks_statistic(_sketch([1.0, 2.0]), _sketch([100.0, 200.0])) == 1.0
+
+
+def test_compare_flags_shift_but_not_resampling():
+    rng = random.Random(5)
+    baseline = _sketch(rng.lognormvariate(math.log(100), 0.5) for _ in range(2000))
+    resampled = _sketch(rng.lognormvariate(math.log(100), 0.5) for _ in range(2000))
+    slower = _sketch(rng.lognormvariate(math.log(160), 0.5) for _ in range(2000))
+
+    stable = compare(baseline, resampled, alpha=0.01, min_shift=0.1)
+    shifted = compare(baseline, slower, alpha=0.01, min_shift=0.1)
+
+    assert stable["shift"] == "none"
+    assert shifted["significant"] and shifted["shift"] == "higher"
+    assert shifted["p50_change"] == pytest.approx(0.6, abs=0.1)
+
+
+def test_compare_skips_p_value_for_small_samples():
+    result = compare(_sketch([1.0] * 5), _sketch([9.0] * 5), alpha=0.01, min_shift=0.1)
+
+    assert result["p_value"] is None
+    assert result["shift"] == "none"
+
+
+def _records(service, hours, origin=datetime(2024, 3, 1)):
+    return [
+        SpanRecord(
+            trace_id=f"{service}-{hour}",
+            span_id=f"{service}-{hour}",
+            parent_span_id=None,
+            name="op",
+            kind=None,
+            start_time=origin + timedelta(hours=hour, minutes=30),
+            end_time=None,
+            duration_ms=float(hour + 1),
+            status_code=None,
+            error_type=None,
+            attributes={},
+            events=[],
+            resource={},
+            service_name=service,
+            environment="test",
+        )
+        for hour in hours
+    ]
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def test_flush_merges_into_existing_rows_and_rollups(db):
+    aggregator = SketchAggregator()
+    aggregator.observe(_records("flush-a", range(3)) + _records("flush-b", range(1)))
+    assert aggregator.flush(db) == 4
+    aggregator.observe(_records("flush-a", [0]))
+    assert aggregator.flush(db) == 1
+
+    rows = db.query(LatencySketch).filter(LatencySketch.service_name.in_(["flush-a", "flush-b"]))
+    assert sorted((row.service_name, row.bucket_start.hour, row.count) for row in rows) == [
+        ("flush-a", 0, 2),
+        ("flush-a", 1, 1),
+        ("flush-a", 2, 1),
+        ("flush-b", 0, 1),
+    ]
+    rollups = db.query(LatencySketchRollup).filter(LatencySketchRollup.service_name == "flush-a").all()
+    assert [(row.bucket_start, row.count) for row in rollups] == [(datetime(2024, 3, 1), 4)]
+
+
+def test_load_series_reads_whole_days_from_rollups(db):
+    aggregator = SketchAggregator()
+    aggregator.observe(_records("rollup", range(72)))
+    aggregator.flush(db)
+    start, end = datetime(2024, 3, 1, 5, 10), datetime(2024, 3, 3, 7)
+
+    expected = _sketch(float(hour + 1) for hour in range(5, 55))
+    merged = load_series(db, METRIC_DURATION, start, end, service="rollup")[("rollup", "op", "")]
+    assert merged.to_dict() == expected.to_dict()
+
+    # Drop the hourly rows of the whole day in the middle: it must come from the rollup.
+    db.query(LatencySketch).filter(
+        LatencySketch.service_name == "rollup",
+        LatencySketch.bucket_start >= datetime(2024, 3, 2),
+        LatencySketch.bucket_start < datetime(2024, 3, 3),
+    ).delete()
+    db.commit()
+    merged = load_series(db, METRIC_DURATION, start, end, service="rollup")[("rollup", "op", "")]
+    assert merged.to_dict() == expected.to_dict()
+    short = load_series(db, METRIC_DURATION, datetime(2024, 3, 1, 2), datetime(2024, 3, 1, 4), service="rollup")
+    assert short[("rollup", "op", "")].count == 2
+
+
+def test_backfill_builds_rollups_from_buckets(db):
+    aggregator = SketchAggregator()
+    aggregator.observe(_records("backfill", range(30)))
+    aggregator.flush(db)
+    db.query(LatencySketchRollup).delete()
+    db.commit()
+
+    assert backfill_rollups(db) >= 2
+    assert backfill_rollups(db) == 0
+    rollups = db.query(LatencySketchRollup).filter(LatencySketchRollup.service_name == "backfill").all()
+    assert sorted((row.bucket_start.day, row.count) for row in rollups) == [(1, 24), (2, 6)]
@@ -0,0 +1,32 @@
+import type { NextRequest } from "next/server";
+import { openLiveTraceStream } from "@/lib/api";
+
+export const dynamic = "force-dynamic";
+export const runtime = "nodejs";
+
+const FORWARDED_PARAMS = ["service", "env", "status", "model", "last_event_id"];
+
+export async function GET(request: NextRequest) {
+  const params = new URLSearchParams();
+  FORWARDED_PARAMS.forEach((key) => {
+    const value = request.nextUrl.searchParams.get(key);
+    if (value) params.set(key, value);
+  });
+  let upstream: Response;
+  try {
+    upstream = await openLiveTraceStream(params, request.headers.get("last-event-id"), request.signal);
+  } catch {
+    return new Response("live stream unavailable", { status: 502 });
+  }
+  if (!upstream.ok || !upstream.body) {
+    return new Response("live stream unavailable", { status: upstream.status || 502 });
+  }
+  return new Response(upstream.body, {
+    headers: {
+      "Content-Type": "text/event-stream",
+      "Cache-Control": "no-cache, no-transform",
+      Connection: "keep-alive",
+      "X-Accel-Buffering": "no"
+    }
+  });
+}
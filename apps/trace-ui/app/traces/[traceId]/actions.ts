@@ -0,0 +1,12 @@
+"use server";
+
+import { fetchSpan, fetchTraceSpanPage, type SpanPage, type SpanRead } from "@/lib/api";
+
+// Called from the span explorer so the browser never talks to the ingest API directly.
+export async function loadSpanPage(traceId: string, cursor: string, limit: number): Promise<SpanPage> {
+  return fetchTraceSpanPage(traceId, { cursor, limit, details: false });
+}
+
+export async function loadSpanDetail(spanId: string): Promise<SpanRead> {
+  return fetchSpan(spanId);
+}
@@ -1,9 +1,8 @@
-import type { ReactNode } from "react";
 import Link from "next/link";
 import { ArrowLeft, Cpu, Layers, Network, Timer } from "lucide-react";
-import { fetchTrace, fetchTraceSpans } from "@/lib/api";
+import { fetchTrace, fetchTraceSpanPage } from "@/lib/api";
 import { Badge } from "@/components/ui/badge";
-import { ScrollArea } from "@/components/ui/scroll-area";
+import { TraceSpanExplorer } from "@/components/trace-span-explorer";
 
 type TraceDetailPageProps = {
   params: Promise<{ traceId: string }>;
@@ -15,83 +14,15 @@ const formatter = {
   date: (value?: string) => (value ? new Date(value).toLocaleString() : "—")
 };
 
-type SpanNode = Awaited<ReturnType<typeof fetchTraceSpans>>[number] & {
-  children: SpanNode[];
-};
-
-const buildSpanTree = (spans: Awaited<ReturnType<typeof fetchTraceSpans>>): SpanNode[] => {
-  const nodes = new Map<string, SpanNode>();
-  spans.forEach((span) => nodes.set(span.span_id, { ...span, children: [] }));
-
-  const roots: SpanNode[] = [];
-  nodes.forEach((node) => {
-    if (node.parent_span_id && nodes.has(node.parent_span_id)) {
-      nodes.get(node.parent_span_id)!.children.push(node);
-    } else {
-      roots.push(node);
-    }
-  });
-
-  return roots;
-};
-
-const buildTimeline = (spans: Awaited<ReturnType<typeof fetchTraceSpans>>) => {
-  const sorted = spans
-    .map((span) => {
-      const start = span.start_time ? new Date(span.start_time).getTime() : 0;
-      const end = span.end_time ? new Date(span.end_time).getTime() : start + (span.duration_ms ?? 0);
-      return {
-        id: span.span_id,
-        name: span.name,
-        start,
-        end,
-        duration: span.duration_ms ?? end - start,
-        status: span.status_code ?? "OK"
-      };
-    })
-    .sort((a, b) => a.start - b.start);
-
-  if (!sorted.length) return [];
-  const min = sorted[0].start;
-  const max = sorted.reduce((acc, span) => Math.max(acc, span.end), sorted[0].end);
-  const total = max - min || 1;
-
-  return sorted.map((span) => ({
-    ...span,
-    offset: ((span.start - min) / total) * 100,
-    width: ((span.end - span.start) / total) * 100
-  }));
-};
-
-const renderSpanNode = (node: SpanNode): ReactNode => (
-  <li key={node.span_id} className="space-y-2 rounded-xl border border-white/10 bg-white/5 p-4 text-slate-200">
-    <div className="flex flex-col gap-1">
-      <div className="flex flex-wrap items-center justify-between gap-2">
-        <div className="flex flex-wrap items-center gap-2">
-          <span className="font-mono text-[11px] text-slate-500">{node.span_id.slice(0, 10)}…</span>
-          <span className="text-sm font-semibold text-white">{node.name}</span>
-          <Badge className="bg-white/10 text-slate-200 border border-white/10">{node.kind ?? "SPAN"}</Badge>
-        </div>
-        <Badge className="bg-cyan-500/20 text-cyan-200 border border-cyan-500/30">{formatter.duration(node.duration_ms)}</Badge>
-      </div>
-      <p className="text-xs text-slate-500">
-        Status: {node.status_code ?? "OK"} · parent {node.parent_span_id ? node.parent_span_id.slice(0, 8) : "root"}
-      </p>
-    </div>
-    {node.children.length > 0 && (
-      <ul className="mt-3 space-y-2 border-l border-dashed border-white/20 pl-4">{node.children.map((child) => renderSpanNode(child))}</ul>
-    )}
-  </li>
-);
+const FIRST_SCREEN_SPANS = 500;
 
 export default async function TraceDetail({ params }: TraceDetailPageProps) {
   const resolvedParams = await params;
-  const [trace, spans] = await Promise.all([
+  const [trace, firstPage] = await Promise.all([
     fetchTrace(resolvedParams.traceId),
-    fetchTraceSpans(resolvedParams.traceId)
+    fetchTraceSpanPage(resolvedParams.traceId, { limit: FIRST_SCREEN_SPANS, details: false })
   ]);
-  const spanTree = buildSpanTree(spans);
-  const timeline = buildTimeline(spans);
+  const spans = firstPage.spans;
 
   const attributes = [
     { label: "Environment", value: trace.environment ?? "demo" },
@@ -152,47 +83,13 @@ export default async function TraceDetail({ params }: TraceDetailPageProps) {
       </div>
 
       <div className="grid gap-6 lg:grid-cols-[2fr,1fr]">
-        <div className="bento-card p-6 space-y-6">
-          <div>
-            <h2 className="text-lg font-medium text-white">Runtime anatomy</h2>
-            <p className="text-xs text-slate-500">A combined timeline + depth map for every persisted span.</p>
-          </div>
-          {timeline.length ? (
-            <div className="space-y-3 rounded-3xl border border-white/10 bg-white/5 p-4">
-              {timeline.map((span) => (
-                <div key={span.id} className="space-y-1">
-                  <div className="flex items-center justify-between text-xs text-slate-400">
-                    <span className="font-semibold text-slate-200">{span.name}</span>
-                    <span>{formatter.duration(span.duration)}</span>
-                  </div>
-                  <div className="relative h-2 w-full rounded-full bg-white/10">
-                    <div
-                      className="absolute h-2 rounded-full bg-gradient-to-r from-cyan-400 to-indigo-500 shadow-[0_0_10px_rgba(34,211,238,0.35)]"
-                      style={{ left: `${span.offset}%`, width: `${Math.max(span.width, 2)}%` }}
-                    />
-                  </div>
-                </div>
-              ))}
-            </div>
-          ) : (
-            <div className="rounded-2xl border border-dashed border-white/10 p-8 text-center text-sm text-slate-500">
-              No span timeline available for this trace.
-            </div>
-          )}
-
-          <div>
-            <p className="text-sm font-semibold text-white">Span hierarchy</p>
-            {spanTree.length === 0 ? (
-              <div className="mt-3 rounded-2xl border border-dashed border-white/10 p-6 text-center text-sm text-slate-500">
-                No spans were persisted for this trace.
-              </div>
-            ) : (
-              <ScrollArea className="mt-4 h-[420px] rounded-3xl border border-white/10 bg-white/5 p-4">
-                <ul className="space-y-3">{spanTree.map((node) => renderSpanNode(node))}</ul>
-              </ScrollArea>
-            )}
-          </div>
-        </div>
+        <TraceSpanExplorer
+          traceId={trace.trace_id}
+          initialSpans={spans}
+          initialCursor={firstPage.nextCursor}
+          spanCount={trace.span_count}
+          pageSize={FIRST_SCREEN_SPANS}
+        />
         <div className="space-y-6">
           <div className="bento-card p-6">
             <h2 className="text-lg font-medium text-white">Trace metadata</h2>
@@ -1,5 +1,6 @@
 import Link from "next/link";
 import { fetchTraces } from "@/lib/api";
+import { LiveTraceList } from "@/components/live-trace-list";
 
 type TracesPageProps = {
   searchParams?: Promise<{
@@ -10,12 +11,6 @@ type TracesPageProps = {
   }>;
 };
 
-const formatter = {
-  date: (value?: string) => (value ? new Date(value).toLocaleString() : "—"),
-  duration: (value?: number) => (value ? `${value.toFixed(2)} ms` : "—"),
-  cost: (value?: number) => (value ? `$${value.toFixed(4)}` : "—")
-};
-
 export default async function TracesPage({ searchParams }: TracesPageProps) {
   const params = await searchParams;
   const traces = await fetchTraces();
@@ -138,34 +133,7 @@ export default async function TracesPage({ searchParams }: TracesPageProps) {
         </div>
       </form>
 
-      <div className="bento-card p-6">
-        <div className="grid grid-cols-12 px-6 py-2 text-[10px] font-bold text-slate-500 uppercase tracking-widest font-mono">
-          <div className="col-span-3">Trace</div>
-          <div className="col-span-2">Service</div>
-          <div className="col-span-2">Environment</div>
-          <div className="col-span-2">Started</div>
-          <div className="col-span-2">Duration</div>
-          <div className="col-span-1 text-right">Cost</div>
-        </div>
-        {filtered.length === 0 ? (
-          <p className="text-sm text-slate-500 px-6 py-4">No traces match the selected filters.</p>
-        ) : (
-          filtered.map((trace) => (
-            <Link
-              key={trace.trace_id}
-              href={`/traces/${trace.trace_id}`}
-              className="grid grid-cols-12 px-6 py-3 rounded-xl border border-white/5 bg-white/5 mb-2 text-sm text-slate-200 hover:border-cyan-500/30 transition"
-            >
-              <span className="col-span-3 font-mono text-[10px] text-cyan-500/80">{trace.trace_id}</span>
-              <span className="col-span-2">{trace.service_name ?? "demo"}</span>
-              <span className="col-span-2 uppercase tracking-widest text-[10px]">{trace.environment ?? "demo"}</span>
-              <span className="col-span-2 text-slate-400">{formatter.date(trace.started_at)}</span>
-              <span className="col-span-2 text-slate-400">{formatter.duration(trace.duration_ms)}</span>
-              <span className="col-span-1 text-right font-mono text-xs text-slate-400">{formatter.cost(trace.cost_usd_estimate)}</span>
-            </Link>
-          ))
-        )}
-      </div>
+      <LiveTraceList initialTraces={filtered} filters={filters} />
     </section>
   );
 }
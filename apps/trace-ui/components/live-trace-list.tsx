@@ -0,0 +1,79 @@
+"use client";
+
+import { useEffect, useState } from "react";
+import Link from "next/link";
+import type { TraceSummary } from "@/lib/api";
+import { subscribeToTraces, type LiveTraceFilters } from "@/lib/live";
+
+type LiveTraceListProps = {
+  initialTraces: TraceSummary[];
+  filters: LiveTraceFilters;
+  limit?: number;
+};
+
+const formatter = {
+  date: (value?: string) => (value ? new Date(value).toLocaleString() : "—"),
+  duration: (value?: number) => (value ? `${value.toFixed(2)} ms` : "—"),
+  cost: (value?: number) => (value ? `$${value.toFixed(4)}` : "—")
+};
+
+const byNewest = (a: TraceSummary, b: TraceSummary) =>
+  new Date(b.started_at ?? 0).getTime() - new Date(a.started_at ?? 0).getTime();
+
+export function LiveTraceList({ initialTraces, filters, limit = 200 }: LiveTraceListProps) {
+  const [traces, setTraces] = useState(initialTraces);
+  const [connected, setConnected] = useState(false);
+  const { service, env, status, model } = filters;
+
+  useEffect(() => {
+    setTraces(initialTraces);
+  }, [initialTraces]);
+
+  useEffect(
+    () =>
+      subscribeToTraces({
+        filters: { service, env, status, model },
+        onStatus: setConnected,
+        onTrace: (trace) =>
+          setTraces((current) =>
+            [trace, ...current.filter((item) => item.trace_id !== trace.trace_id)].sort(byNewest).slice(0, limit)
+          )
+      }),
+    [service, env, status, model, limit]
+  );
+
+  return (
+    <div className="bento-card p-6">
+      <div className="flex items-center justify-end gap-2 px-6 pb-2 text-[10px] font-mono uppercase tracking-widest text-slate-500">
+        <span className={connected ? "h-2 w-2 rounded-full bg-emerald-400" : "h-2 w-2 rounded-full bg-slate-600"} />
+        {connected ? "Live" : "Reconnecting"}
+      </div>
+      <div className="grid grid-cols-12 px-6 py-2 text-[10px] font-bold text-slate-500 uppercase tracking-widest font-mono">
+        <div className="col-span-3">Trace</div>
+        <div className="col-span-2">Service</div>
+        <div className="col-span-2">Environment</div>
+        <div className="col-span-2">Started</div>
+        <div className="col-span-2">Duration</div>
+        <div className="col-span-1 text-right">Cost</div>
+      </div>
+      {traces.length === 0 ? (
+        <p className="text-sm text-slate-500 px-6 py-4">No traces match the selected filters.</p>
+      ) : (
+        traces.map((trace) => (
+          <Link
+            key={trace.trace_id}
+            href={`/traces/${trace.trace_id}`}
+            className="grid grid-cols-12 px-6 py-3 rounded-xl border border-white/5 bg-white/5 mb-2 text-sm text-slate-200 hover:border-cyan-500/30 transition"
+          >
+            <span className="col-span-3 font-mono text-[10px] text-cyan-500/80">{trace.trace_id}</span>
+            <span className="col-span-2">{trace.service_name ?? "demo"}</span>
+            <span className="col-span-2 uppercase tracking-widest text-[10px]">{trace.environment ?? "demo"}</span>
+            <span className="col-span-2 text-slate-400">{formatter.date(trace.started_at)}</span>
+            <span className="col-span-2 text-slate-400">{formatter.duration(trace.duration_ms)}</span>
+            <span className="col-span-1 text-right font-mono text-xs text-slate-400">{formatter.cost(trace.cost_usd_estimate)}</span>
+          </Link>
+        ))
+      )}
+    </div>
+  );
+}
@@ -0,0 +1,224 @@
+"use client";
+
+import { useState, useTransition, type ReactNode } from "react";
+import type { SpanRead } from "@/lib/api";
+import { loadSpanDetail, loadSpanPage } from "@/app/traces/[traceId]/actions";
+import { Badge } from "@/components/ui/badge";
+import { ScrollArea } from "@/components/ui/scroll-area";
+
+type TraceSpanExplorerProps = {
+  traceId: string;
+  initialSpans: SpanRead[];
+  initialCursor?: string;
+  spanCount?: number;
+  pageSize: number;
+};
+
+type SpanNode = SpanRead & {
+  children: SpanNode[];
+};
+
+const formatDuration = (value?: number) => (value ? `${value.toFixed(2)} ms` : "—");
+
+const buildSpanTree = (spans: SpanRead[]): SpanNode[] => {
+  const nodes = new Map<string, SpanNode>();
+  spans.forEach((span) => nodes.set(span.span_id, { ...span, children: [] }));
+
+  const roots: SpanNode[] = [];
+  nodes.forEach((node) => {
+    if (node.parent_span_id && nodes.has(node.parent_span_id)) {
+      nodes.get(node.parent_span_id)!.children.push(node);
+    } else {
+      roots.push(node);
+    }
+  });
+
+  return roots;
+};
+
+const buildTimeline = (spans: SpanRead[]) => {
+  const sorted = spans
+    .map((span) => {
+      const start = span.start_time ? new Date(span.start_time).getTime() : 0;
+      const end = span.end_time ? new Date(span.end_time).getTime() : start + (span.duration_ms ?? 0);
+      return {
+        id: span.span_id,
+        name: span.name,
+        start,
+        end,
+        duration: span.duration_ms ?? end - start,
+        status: span.status_code ?? "OK"
+      };
+    })
+    .sort((a, b) => a.start - b.start);
+
+  if (!sorted.length) return [];
+  const min = sorted[0].start;
+  const max = sorted.reduce((acc, span) => Math.max(acc, span.end), sorted[0].end);
+  const total = max - min || 1;
+
+  return sorted.map((span) => ({
+    ...span,
+    offset: ((span.start - min) / total) * 100,
+    width: ((span.end - span.start) / total) * 100
+  }));
+};
+
+function SpanDetail({ span }: { span: SpanRead }) {
+  const sections = [
+    { label: "Attributes", value: span.attributes },
+    { label: "Events", value: span.events },
+    { label: "Resource", value: span.resource },
+    { label: "Payloads", value: span.payload_refs }
+  ];
+  return (
+    <div className="mt-2 space-y-2 rounded-lg border border-white/10 bg-black/20 p-3">
+      {sections.map((section) => (
+        <div key={section.label}>
+          <p className="text-[10px] uppercase tracking-[0.3em] text-slate-500">{section.label}</p>
+          <pre className="mt-1 overflow-x-auto whitespace-pre-wrap break-all font-mono text-[11px] text-slate-300">
+            {JSON.stringify(section.value ?? null, null, 2)}
+          </pre>
+        </div>
+      ))}
+    </div>
+  );
+}
+
+// Renders the first page of light span rows, then pages further with the API cursor;
+// attributes, events and payload refs are fetched per span when opened.
+export function TraceSpanExplorer({ traceId, initialSpans, initialCursor, spanCount, pageSize }: TraceSpanExplorerProps) {
+  const [spans, setSpans] = useState(initialSpans);
+  const [cursor, setCursor] = useState(initialCursor);
+  const [details, setDetails] = useState<Record<string, SpanRead>>({});
+  const [openSpanId, setOpenSpanId] = useState<string | null>(null);
+  const [error, setError] = useState<string | null>(null);
+  const [loadingMore, startLoadingMore] = useTransition();
+  const [loadingDetail, startLoadingDetail] = useTransition();
+
+  const spanTree = buildSpanTree(spans);
+  const timeline = buildTimeline(spans);
+
+  const loadMore = () => {
+    if (!cursor) return;
+    startLoadingMore(async () => {
+      try {
+        const page = await loadSpanPage(traceId, cursor, pageSize);
+        setSpans((current) => [...current, ...page.spans]);
+        setCursor(page.nextCursor);
+        setError(null);
+      } catch {
+        setError("Could not load more spans.");
+      }
+    });
+  };
+
+  const toggleDetail = (spanId: string) => {
+    if (openSpanId === spanId) {
+      setOpenSpanId(null);
+      return;
+    }
+    setOpenSpanId(spanId);
+    if (details[spanId]) return;
+    startLoadingDetail(async () => {
+      try {
+        const span = await loadSpanDetail(spanId);
+        setDetails((current) => ({ ...current, [spanId]: span }));
+        setError(null);
+      } catch {
+        setError("Could not load span details.");
+      }
+    });
+  };
+
+  const renderSpanNode = (node: SpanNode): ReactNode => (
+    <li key={node.span_id} className="space-y-2 rounded-xl border border-white/10 bg-white/5 p-4 text-slate-200">
+      <div className="flex flex-col gap-1">
+        <div className="flex flex-wrap items-center justify-between gap-2">
+          <button
+            type="button"
+            onClick={() => toggleDetail(node.span_id)}
+            className="flex flex-wrap items-center gap-2 text-left"
+          >
+            <span className="font-mono text-[11px] text-slate-500">{node.span_id.slice(0, 10)}…</span>
+            <span className="text-sm font-semibold text-white">{node.name}</span>
+            <Badge className="bg-white/10 text-slate-200 border border-white/10">{node.kind ?? "SPAN"}</Badge>
+          </button>
+          <Badge className="bg-cyan-500/20 text-cyan-200 border border-cyan-500/30">{formatDuration(node.duration_ms)}</Badge>
+        </div>
+        <p className="text-xs text-slate-500">
+          Status: {node.status_code ?? "OK"} · parent {node.parent_span_id ? node.parent_span_id.slice(0, 8) : "root"}
+        </p>
+        {openSpanId === node.span_id &&
+          (details[node.span_id] ? (
+            <SpanDetail span={details[node.span_id]} />
+          ) : (
+            <p className="text-xs text-slate-500">{loadingDetail ? "Loading details…" : ""}</p>
+          ))}
+      </div>
+      {node.children.length > 0 && (
+        <ul className="mt-3 space-y-2 border-l border-dashed border-white/20 pl-4">{node.children.map((child) => renderSpanNode(child))}</ul>
+      )}
+    </li>
+  );
+
+  return (
+    <div className="bento-card p-6 space-y-6">
+      <div>
+        <h2 className="text-lg font-medium text-white">Runtime anatomy</h2>
+        <p className="text-xs text-slate-500">
+          {cursor
+            ? `A combined timeline + depth map for the first ${spans.length} of ${spanCount ?? "many"} spans.`
+            : "A combined timeline + depth map for every persisted span."}
+        </p>
+      </div>
+      {timeline.length ? (
+        <div className="space-y-3 rounded-3xl border border-white/10 bg-white/5 p-4">
+          {timeline.map((span) => (
+            <div key={span.id} className="space-y-1">
+              <div className="flex items-center justify-between text-xs text-slate-400">
+                <span className="font-semibold text-slate-200">{span.name}</span>
+                <span>{formatDuration(span.duration)}</span>
+              </div>
+              <div className="relative h-2 w-full rounded-full bg-white/10">
+                <div
+                  className="absolute h-2 rounded-full bg-gradient-to-r from-cyan-400 to-indigo-500 shadow-[0_0_10px_rgba(34,211,238,0.35)]"
+                  style={{ left: `${span.offset}%`, width: `${Math.max(span.width, 2)}%` }}
+                />
+              </div>
+            </div>
+          ))}
+        </div>
+      ) : (
+        <div className="rounded-2xl border border-dashed border-white/10 p-8 text-center text-sm text-slate-500">
+          No span timeline available for this trace.
+        </div>
+      )}
+
+      <div>
+        <p className="text-sm font-semibold text-white">Span hierarchy</p>
+        {spanTree.length === 0 ? (
+          <div className="mt-3 rounded-2xl border border-dashed border-white/10 p-6 text-center text-sm text-slate-500">
+            No spans were persisted for this trace.
+          </div>
+        ) : (
+          <ScrollArea className="mt-4 h-[420px] rounded-3xl border border-white/10 bg-white/5 p-4">
+            <ul className="space-y-3">{spanTree.map((node) => renderSpanNode(node))}</ul>
+          </ScrollArea>
+        )}
+      </div>
+
+      {error && <p className="text-xs text-rose-300">{error}</p>}
+      {cursor && (
+        <button
+          type="button"
+          onClick={loadMore}
+          disabled={loadingMore}
+          className="inline-flex items-center gap-2 rounded-lg border border-white/10 px-4 py-2 text-sm text-slate-200 hover:bg-white/10 transition-colors disabled:opacity-60"
+        >
+          {loadingMore ? "Loading spans…" : `Load ${pageSize} more spans`}
+        </button>
+      )}
+    </div>
+  );
+}
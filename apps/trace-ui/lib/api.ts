@@ -3,7 +3,7 @@ const BASIC_AUTH = process.env.NEXT_PUBLIC_BASIC_AUTH || "viewer:viewer";
 
 const authHeader = `Basic ${Buffer.from(BASIC_AUTH).toString("base64")}`;
 
-type TraceSummary = {
+export type TraceSummary = {
   trace_id: string;
   service_name?: string;
   environment?: string;
@@ -17,6 +17,11 @@ type TraceSummary = {
   token_out?: number;
   cost_usd_estimate?: number;
   span_count?: number;
+  critical_path_ms?: number;
+  error_span_count?: number;
+  slowest_tool?: string;
+  slowest_tool_ms?: number;
+  sampling_decision?: string;
 };
 
 export type SpanRead = {
@@ -29,11 +34,29 @@ export type SpanRead = {
   end_time?: string;
   duration_ms?: number;
   status_code?: string;
-  attributes?: Record<string, unknown>;
-  resource?: Record<string, unknown>;
+  error_type?: string;
+  attributes?: Record<string, unknown> | null;
+  events?: Record<string, unknown>[] | null;
+  resource?: Record<string, unknown> | null;
+  payload_refs?: { payload_ref: string; payload_role: string }[];
 };
 
-async function request(path: string) {
+export type SpanPageOptions = {
+  limit?: number;
+  cursor?: string;
+  details?: boolean;
+  start?: string;
+  end?: string;
+  rootSpanId?: string;
+  depth?: number;
+};
+
+export type SpanPage = {
+  spans: SpanRead[];
+  nextCursor?: string;
+};
+
+async function rawRequest(path: string) {
   const res = await fetch(`${API_BASE_URL}${path}`, {
     headers: {
       Authorization: authHeader
@@ -43,6 +66,11 @@ async function request(path: string) {
   if (!res.ok) {
     throw new Error(`Request failed: ${res.status}`);
   }
+  return res;
+}
+
+async function request(path: string) {
+  const res = await rawRequest(path);
   return res.json();
 }
 
@@ -57,3 +85,40 @@ export async function fetchTrace(traceId: string): Promise<TraceSummary> {
 export async function fetchTraceSpans(traceId: string): Promise<SpanRead[]> {
   return request(`/api/traces/${traceId}/spans`);
 }
+
+export async function fetchSpan(spanId: string): Promise<SpanRead> {
+  return request(`/api/spans/${spanId}`);
+}
+
+export async function fetchTraceSpanPage(traceId: string, options: SpanPageOptions = {}): Promise<SpanPage> {
+  const params = new URLSearchParams();
+  if (options.limit !== undefined) params.set("limit", String(options.limit));
+  if (options.cursor) params.set("cursor", options.cursor);
+  if (options.details !== undefined) params.set("details", String(options.details));
+  if (options.start) params.set("start", options.start);
+  if (options.end) params.set("end", options.end);
+  if (options.rootSpanId) params.set("root_span_id", options.rootSpanId);
+  if (options.depth !== undefined) params.set("depth", String(options.depth));
+  const query = params.toString();
+  const res = await rawRequest(`/api/traces/${traceId}/spans${query ? `?${query}` : ""}`);
+  return {
+    spans: await res.json(),
+    nextCursor: res.headers.get("X-Next-Cursor") ?? undefined
+  };
+}
+
+// Opens the ingest SSE stream server-side; the browser reaches it through the
+// `/api/live/traces` route handler, which adds auth and avoids a cross-origin request.
+export async function openLiveTraceStream(
+  params: URLSearchParams,
+  lastEventId: string | null,
+  signal: AbortSignal
+): Promise<Response> {
+  const headers: Record<string, string> = { Authorization: authHeader, Accept: "text/event-stream" };
+  if (lastEventId) headers["Last-Event-ID"] = lastEventId;
+  return fetch(`${API_BASE_URL}/api/live/traces?${params.toString()}`, {
+    headers,
+    cache: "no-store",
+    signal
+  });
+}
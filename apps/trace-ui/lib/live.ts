@@ -0,0 +1,92 @@
+import type { TraceSummary } from "@/lib/api";
+
+// Same-origin route handler that proxies the ingest SSE stream with auth (app/api/live/traces).
+const LIVE_TRACES_PATH = "/api/live/traces";
+
+export type LiveTraceFilters = {
+  service?: string;
+  env?: string;
+  status?: string;
+  model?: string;
+};
+
+type LiveTraceOptions = {
+  filters: LiveTraceFilters;
+  onTrace: (trace: TraceSummary) => void;
+  onStatus?: (connected: boolean) => void;
+};
+
+const RECONNECT_DELAY_MS = 2000;
+
+// Read with fetch rather than EventSource so reconnects can send Last-Event-ID themselves.
+export function subscribeToTraces({ filters, onTrace, onStatus }: LiveTraceOptions): () => void {
+  const controller = new AbortController();
+  let lastEventId: string | undefined;
+  let stopped = false;
+
+  const params = new URLSearchParams();
+  Object.entries(filters).forEach(([key, value]) => {
+    if (value) params.set(key, value);
+  });
+
+  const connect = async () => {
+    while (!stopped) {
+      try {
+        const headers: Record<string, string> = {};
+        if (lastEventId) headers["Last-Event-ID"] = lastEventId;
+        const res = await fetch(`${LIVE_TRACES_PATH}?${params.toString()}`, {
+          headers,
+          cache: "no-store",
+          signal: controller.signal
+        });
+        if (!res.ok || !res.body) {
+          throw new Error(`Live stream failed: ${res.status}`);
+        }
+        onStatus?.(true);
+        const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = "";
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += value;
+          let boundary = buffer.indexOf("\n\n");
+          while (boundary !== -1) {
+            const message = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            lastEventId = handleMessage(message, onTrace) ?? lastEventId;
+            boundary = buffer.indexOf("\n\n");
+          }
+        }
+      } catch {
+        if (stopped) return;
+      }
+      onStatus?.(false);
+      await new Promise((resolve) => setTimeout(resolve, RECONNECT_DELAY_MS));
+    }
+  };
+
+  void connect();
+  return () => {
+    stopped = true;
+    controller.abort();
+  };
+}
+
+function handleMessage(message: string, onTrace: (trace: TraceSummary) => void): string | undefined {
+  let id: string | undefined;
+  let event = "message";
+  const data: string[] = [];
+  message.split("\n").forEach((line) => {
+    if (line.startsWith(":")) return;
+    const separator = line.indexOf(":");
+    const field = separator === -1 ? line : line.slice(0, separator);
+    const value = separator === -1 ? "" : line.slice(separator + 1).replace(/^ /, "");
+    if (field === "id") id = value;
+    else if (field === "event") event = value;
+    else if (field === "data") data.push(value);
+  });
+  if (event === "trace" && data.length) {
+    onTrace(JSON.parse(data.join("\n")) as TraceSummary);
+  }
+  return id;
+}
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Measure cold-storage compaction: storage reduction and read latency.
+
+Runs the ingest API in-process against a throwaway SQLite database, ingests a
+seeded set of traces, then compares database + payload store size and
+`/api/traces/{id}/spans` latency before compaction, for a cold archive read
+(decode cache cleared) and for a warm one.
+"""
+from __future__ import annotations
+
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+TRACE_COUNT = int(os.environ.get("BENCH_TRACES", "200"))
+SPANS_PER_TRACE = int(os.environ.get("BENCH_SPANS_PER_TRACE", "200"))
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+
+def main() -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="tf-bench-archive-"))
+    db_path = workdir / "bench.db"
+    os.environ["DB_URL"] = f"sqlite:///{db_path}"
+    os.environ["PAYLOAD_DIR"] = str(workdir / "payloads")
+    os.environ["WORKER_ENABLED"] = "false"
+    os.environ["ATTRIBUTE_ALLOWLIST_PATH"] = str(REPO_ROOT / "deploy" / "trace-allowlist.yaml")
+    sys.path.insert(0, str(REPO_ROOT / "apps" / "ingest-api"))
+
+    from fastapi.testclient import TestClient
+
+    from app.archive import load_archive, run_compaction_pass
+    from app.db import SessionLocal
+    from app.main import app
+
+    auth = ("viewer", "viewer")
+    with TestClient(app) as client:
+        _seed(SessionLocal)
+        trace_ids = [f"bench{i:05d}" for i in range(TRACE_COUNT)]
+        sample = random.Random(7).sample(trace_ids, min(50, len(trace_ids)))
+
+        before_bytes = _store_bytes(db_path, workdir / "payloads")
+        row_ms = _time_reads(client, auth, sample)
+
+        db = SessionLocal()
+        while run_compaction_pass(db, now=datetime.utcnow() + timedelta(days=2)):
+            pass
+        db.close()
+        after_bytes = _store_bytes(db_path, workdir / "payloads")
+
+        cold_ms = []
+        for trace_id in sample:
+            load_archive.cache_clear()
+            cold_ms.extend(_time_reads(client, auth, [trace_id]))
+        warm_ms = _time_reads(client, auth, sample)
+
+    print(
+        json.dumps(
+            {
+                "traces": TRACE_COUNT,
+                "spans_per_trace": SPANS_PER_TRACE,
+                "bytes_before": before_bytes,
+                "bytes_after": after_bytes,
+                "reduction": round(1 - after_bytes / before_bytes, 3),
+                "row_store_read_ms_p50": _p50(row_ms),
+                "archive_cold_read_ms_p50": _p50(cold_ms),
+                "archive_warm_read_ms_p50": _p50(warm_ms),
+            },
+            indent=2,
+        )
+    )
+
+
+def _seed(session_factory) -> None:
+    from app.models import Span, Trace
+
+    rng = random.Random(20240523)
+    base = datetime.utcnow() - timedelta(days=3)
+    db = session_factory()
+    for index in range(TRACE_COUNT):
+        trace_id = f"bench{index:05d}"
+        start = base + timedelta(seconds=index)
+        db.add(Trace(trace_id=trace_id, service_name=f"svc-{index % 5}", started_at=start, span_count=SPANS_PER_TRACE))
+        rows = []
+        for span_index in range(SPANS_PER_TRACE):
+            offset = span_index * rng.uniform(1, 20)
+            duration = rng.lognormvariate(3, 1)
+            is_tool = span_index % 3 == 1
+            rows.append(
+                {
+                    "trace_id": trace_id,
+                    "span_id": f"{trace_id}-{span_index:05d}",
+                    "parent_span_id": None if span_index == 0 else f"{trace_id}-{(span_index - 1) // 4:05d}",
+                    "name": "tool.execute" if is_tool else "llm.chat",
+                    "kind": "SPAN_KIND_INTERNAL",
+                    "start_time": start + timedelta(milliseconds=offset),
+                    "end_time": start + timedelta(milliseconds=offset + duration),
+                    "duration_ms": duration,
+                    "status_code": "STATUS_CODE_ERROR" if rng.random() < 0.02 else "STATUS_CODE_OK",
+                    "attributes": {
+                        "tracefoundry.tool.name": f"tool-{rng.randrange(20)}"
+                    }
+                    if is_tool
+                    else {
+                        "gen_ai.request.model": rng.choice(["gpt-4o", "claude-sonnet", "llama-3"]),
+                        "gen_ai.usage.input_tokens": rng.randrange(50, 4000),
+                        "gen_ai.usage.output_tokens": rng.randrange(10, 1000),
+                        "tracefoundry.cost.usd_estimate": round(rng.random() / 100, 6),
+                    },
+                    "events": [],
+                    "resource": {"service.name": f"svc-{index % 5}", "deployment.environment": "bench"},
+                }
+            )
+        db.bulk_insert_mappings(Span, rows)
+    db.commit()
+    db.close()
+
+
+def _time_reads(client, auth, trace_ids) -> list:
+    timings = []
+    for trace_id in trace_ids:
+        started = time.perf_counter()
+        response = client.get(f"/api/traces/{trace_id}/spans", auth=auth)
+        response.raise_for_status()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def _store_bytes(db_path: Path, payload_dir: Path) -> int:
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("VACUUM")
+    payload_bytes = sum(path.stat().st_size for path in payload_dir.glob("*") if path.is_file())
+    return db_path.stat().st_size + payload_bytes
+
+
+def _p50(values) -> float:
+    return round(statistics.median(values), 2) if values else 0.0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Replay a mixed trace-UI workload against a running ingest API and report latency.
+
+Discovers traces, spans and payloads through the API, then issues a seeded
+mix of list, detail, span page, span, payload, analysis and sketch requests
+from `BENCH_CONCURRENCY` keep-alive connections. Prints p50/p95/p99 per
+endpoint and checks the p95 against the PRD 6.1 targets: trace list within
+500 ms for 1,000 traces (five pages, the API caps a page at 200) and trace
+detail within 1 s for 1,000 spans. Exits non-zero when a target is missed.
+
+Point it at a database filled by `scripts/gen_corpus.py` (which stores
+analyses, sketches and archives up front) to get numbers for production-sized
+tables, and run the API with `ARCHIVE_ENABLED=false` so compaction does not
+change what is being measured.
+"""
+from __future__ import annotations
+
+import base64
+import gzip
+import http.client
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+BASE_URL = os.environ.get("BENCH_API_URL", "http://localhost:8000")
+BASIC_AUTH = os.environ.get("BENCH_AUTH", "engineer:engineer")
+REQUEST_COUNT = int(os.environ.get("BENCH_REQUESTS", "500"))
+CONCURRENCY = int(os.environ.get("BENCH_CONCURRENCY", "4"))
+WARMUP = int(os.environ.get("BENCH_WARMUP", "20"))
+SEED = int(os.environ.get("BENCH_SEED", "7"))
+LARGE_TRACE_SPANS = 1000
+LIST_TRACES = 1000
+# `/api/traces` caps `limit` at 200, so 1,000 traces take several pages.
+LIST_PAGE_SIZE = 200
+
+# PRD 6.1, checked against p95.
+TARGETS_MS = {
+    "trace_list": 500.0,
+    "trace_detail": 1000.0,
+    "trace_detail_1k": 1000.0,
+}
+# Share of the workload per operation, roughly what the UI issues.
+WEIGHTS = {
+    "trace_list": 20,
+    "trace_list_filtered": 20,
+    "trace_detail": 20,
+    "trace_detail_1k": 5,
+    "span_first_screen": 10,
+    "trace_analysis": 5,
+    "span_detail": 10,
+    "payload": 5,
+    "sketch_quantiles": 5,
+}
+TRACE_SORTS = ("newest", "slowest", "most_expensive", "slowest_tool", "critical_path", "most_errors")
+
+Request = Tuple[str, List[str]]
+
+
+class Client:
+    """One keep-alive connection per thread."""
+
+    def __init__(self, base_url: str, basic_auth: str) -> None:
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.https = parts.scheme == "https"
+        self.prefix = parts.path.rstrip("/")
+        token = base64.b64encode(basic_auth.encode("utf-8")).decode("ascii")
+        self.headers = {"Authorization": f"Basic {token}", "Accept-Encoding": "gzip"}
+        self._local = threading.local()
+
+    def get(self, path: str) -> Tuple[int, bytes]:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            factory = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            connection = self._local.connection = factory(self.host, self.port, timeout=60)
+        try:
+            connection.request("GET", self.prefix + path, headers=self.headers)
+            response = connection.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            self._local.connection = None
+            raise
+
+    def get_json(self, path: str) -> Any:
+        status, body = self.get(path)
+        if status != 200:
+            raise RuntimeError(f"GET {path} -> {status}: {body[:200]!r}")
+        return json.loads(gzip.decompress(body) if body[:2] == b"\x1f\x8b" else body)
+
+
+def main() -> None:
+    client = Client(BASE_URL, BASIC_AUTH)
+    corpus = _discover(client)
+    if not corpus["traces"]:
+        print("bench_queries: no traces found; load a corpus first", file=sys.stderr)
+        sys.exit(2)
+    rng = random.Random(SEED)
+    builders = _builders(corpus)
+    names = [name for name in WEIGHTS if name in builders]
+    schedule = [
+        builders[name](rng) for name in rng.choices(names, [WEIGHTS[name] for name in names], k=WARMUP + REQUEST_COUNT)
+    ]
+
+    for request in schedule[:WARMUP]:
+        _run(client, request)
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        results = list(executor.map(lambda request: _run(client, request), schedule[WARMUP:]))
+
+    endpoints: Dict[str, Dict[str, Any]] = {}
+    missed = []
+    for name in names:
+        timings = sorted(ms for op, ms, ok in results if op == name and ok)
+        errors = sum(1 for op, _, ok in results if op == name and not ok)
+        if not timings and not errors:
+            continue
+        report: Dict[str, Any] = {
+            "count": len(timings),
+            "errors": errors,
+            "p50_ms": _percentile(timings, 0.50),
+            "p95_ms": _percentile(timings, 0.95),
+            "p99_ms": _percentile(timings, 0.99),
+        }
+        target = TARGETS_MS.get(name)
+        if target is not None:
+            report["target_p95_ms"] = target
+            report["met"] = errors == 0 and report["p95_ms"] is not None and report["p95_ms"] <= target
+            if not report["met"]:
+                missed.append(name)
+        endpoints[name] = report
+    print(
+        json.dumps(
+            {
+                "base_url": BASE_URL,
+                "requests": REQUEST_COUNT,
+                "concurrency": CONCURRENCY,
+                "seed": SEED,
+                "traces_sampled": len(corpus["traces"]),
+                "large_traces_sampled": len(corpus["large_traces"]),
+                "endpoints": endpoints,
+                "targets_missed": missed,
+            },
+            indent=2,
+        )
+    )
+    if missed:
+        sys.exit(1)
+
+
+def _discover(client: Client) -> Dict[str, Any]:
+    traces: Dict[str, Dict[str, Any]] = {}
+    for sort in ("newest", "slowest"):
+        for path in _list_pages(sort):
+            for trace in client.get_json(path):
+                traces[trace["trace_id"]] = trace
+    trace_list = sorted(traces.values(), key=lambda trace: trace["trace_id"])
+    sample = random.Random(SEED).sample(trace_list, min(20, len(trace_list)))
+    span_ids: List[str] = []
+    payload_refs: List[str] = []
+    for trace in sample:
+        spans = client.get_json(f"/api/traces/{trace['trace_id']}/spans?limit=200")
+        span_ids.extend(span["span_id"] for span in spans)
+        payload_refs.extend(ref["payload_ref"] for span in spans for ref in span["payload_refs"])
+    return {
+        "traces": trace_list,
+        "large_traces": [trace for trace in trace_list if trace["span_count"] >= LARGE_TRACE_SPANS],
+        "services": sorted({trace["service_name"] for trace in trace_list if trace["service_name"]}),
+        "span_ids": span_ids,
+        "payload_refs": payload_refs,
+        # Sketch queries cover the day before the newest trace, which need not be today.
+        "latest_start": max((trace["started_at"] for trace in trace_list if trace["started_at"]), default=None),
+    }
+
+
+def _builders(corpus: Dict[str, Any]) -> Dict[str, Callable[[random.Random], Request]]:
+    traces = corpus["traces"]
+
+    def trace_list(rng: random.Random) -> Request:
+        return "trace_list", _list_pages("newest")
+
+    def trace_list_filtered(rng: random.Random) -> Request:
+        params: Dict[str, Any] = {"limit": 100, "sort": rng.choice(TRACE_SORTS)}
+        if corpus["services"] and rng.random() < 0.7:
+            params["service"] = rng.choice(corpus["services"])
+        if rng.random() < 0.3:
+            params["status"] = "STATUS_CODE_ERROR"
+        return "trace_list_filtered", ["/api/traces?" + urlencode(params)]
+
+    def detail(name: str, pool: List[Dict[str, Any]]) -> Callable[[random.Random], Request]:
+        def build(rng: random.Random) -> Request:
+            trace_id = rng.choice(pool)["trace_id"]
+            return name, [f"/api/traces/{trace_id}", f"/api/traces/{trace_id}/spans"]
+
+        return build
+
+    def span_first_screen(rng: random.Random) -> Request:
+        trace_id = rng.choice(traces)["trace_id"]
+        return "span_first_screen", [f"/api/traces/{trace_id}/spans?details=false&limit=500"]
+
+    def trace_analysis(rng: random.Random) -> Request:
+        return "trace_analysis", [f"/api/traces/{rng.choice(traces)['trace_id']}/analysis"]
+
+    def span_detail(rng: random.Random) -> Request:
+        return "span_detail", [f"/api/spans/{rng.choice(corpus['span_ids'])}"]
+
+    def payload(rng: random.Random) -> Request:
+        return "payload", [f"/api/payloads/{rng.choice(corpus['payload_refs'])}"]
+
+    def sketch_quantiles(rng: random.Random) -> Request:
+        end = datetime.fromisoformat(corpus["latest_start"])
+        window = {"start": (end - timedelta(days=1)).isoformat(), "end": end.isoformat()}
+        return "sketch_quantiles", ["/api/sketches/quantiles?" + urlencode(window)]
+
+    builders: Dict[str, Callable[[random.Random], Request]] = {
+        "trace_list": trace_list,
+        "trace_list_filtered": trace_list_filtered,
+        "trace_detail": detail("trace_detail", traces),
+        "span_first_screen": span_first_screen,
+        "trace_analysis": trace_analysis,
+    }
+    if corpus["large_traces"]:
+        builders["trace_detail_1k"] = detail("trace_detail_1k", corpus["large_traces"])
+    if corpus["span_ids"]:
+        builders["span_detail"] = span_detail
+    if corpus["payload_refs"]:
+        builders["payload"] = payload
+    if corpus["latest_start"]:
+        builders["sketch_quantiles"] = sketch_quantiles
+    return builders
+
+
+def _list_pages(sort: str) -> List[str]:
+    return [
+        "/api/traces?" + urlencode({"limit": LIST_PAGE_SIZE, "offset": offset, "sort": sort})
+        for offset in range(0, LIST_TRACES, LIST_PAGE_SIZE)
+    ]
+
+
+def _run(client: Client, request: Request) -> Tuple[str, float, bool]:
+    name, paths = request
+    ok = True
+    started = time.perf_counter()
+    for path in paths:
+        try:
+            status, _ = client.get(path)
+        except (http.client.HTTPException, OSError):
+            status = 0
+        ok = ok and status == 200
+    return name, (time.perf_counter() - started) * 1000, ok
+
+
+def _percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return round(sorted_values[index], 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""Benchmark `/api/traces/{id}/spans` serialization for a large trace.
+
+Runs the ingest API in-process against a throwaway SQLite database seeded
+with one trace of `BENCH_SPANS` spans (default 5,000). It reports CPU time
+and response size for the legacy path (ORM objects -> `SpanRead` ->
+FastAPI's `jsonable_encoder` + `json.dumps`) and for the endpoint as served,
+both uncompressed and with `Accept-Encoding: gzip`.
+"""
+from __future__ import annotations
+
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+SPAN_COUNT = int(os.environ.get("BENCH_SPANS", "5000"))
+ROUNDS = int(os.environ.get("BENCH_ROUNDS", "10"))
+REPO_ROOT = Path(__file__).resolve().parents[1]
+TRACE_ID = "bench-spans"
+
+
+def main() -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="tf-bench-spans-"))
+    os.environ["DB_URL"] = f"sqlite:///{workdir / 'bench.db'}"
+    os.environ["PAYLOAD_DIR"] = str(workdir / "payloads")
+    os.environ["WORKER_ENABLED"] = "false"
+    os.environ["ATTRIBUTE_ALLOWLIST_PATH"] = str(REPO_ROOT / "deploy" / "trace-allowlist.yaml")
+    sys.path.insert(0, str(REPO_ROOT / "apps" / "ingest-api"))
+
+    from fastapi.testclient import TestClient
+
+    from app.db import SessionLocal
+    from app.main import app
+
+    auth = ("viewer", "viewer")
+    with TestClient(app) as client:
+        _seed(SessionLocal)
+        legacy_cpu, legacy_bytes = _measure(lambda: _legacy_body(SessionLocal))
+        served = {}
+        for encoding in ("identity", "gzip"):
+            def fetch(encoding=encoding):
+                response = client.get(
+                    f"/api/traces/{TRACE_ID}/spans",
+                    auth=auth,
+                    headers={"Accept-Encoding": encoding},
+                )
+                response.raise_for_status()
+                return response.num_bytes_downloaded
+            served[encoding] = _measure(fetch)
+
+    print(
+        json.dumps(
+            {
+                "spans": SPAN_COUNT,
+                "legacy_cpu_ms_p50": legacy_cpu,
+                "legacy_bytes": legacy_bytes,
+                "served_cpu_ms_p50": served["identity"][0],
+                "served_bytes": served["identity"][1],
+                "served_gzip_cpu_ms_p50": served["gzip"][0],
+                "served_gzip_bytes": served["gzip"][1],
+            },
+            indent=2,
+        )
+    )
+
+
+def _legacy_body(session_factory) -> int:
+    """The pre-fast-path pipeline: ORM rows, `SpanRead` validation, default encoder."""
+    from fastapi.encoders import jsonable_encoder
+
+    from app import schemas
+    from app.models import Span
+
+    db = session_factory()
+    try:
+        spans = db.query(Span).filter(Span.trace_id == TRACE_ID).all()
+        models = [
+            schemas.SpanRead(
+                span_id=span.span_id,
+                trace_id=span.trace_id,
+                parent_span_id=span.parent_span_id,
+                name=span.name,
+                kind=span.kind,
+                start_time=span.start_time,
+                end_time=span.end_time,
+                duration_ms=span.duration_ms,
+                status_code=span.status_code,
+                error_type=span.error_type,
+                attributes=span.attributes,
+                events=span.events,
+                resource=span.resource,
+                payload_refs=[
+                    schemas.SpanPayloadRefSchema(payload_ref=ref.payload_ref, payload_role=ref.payload_role)
+                    for ref in span.payload_refs
+                ],
+            )
+            for span in spans
+        ]
+        body = json.dumps(
+            jsonable_encoder(models), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+        return len(body)
+    finally:
+        db.close()
+
+
+def _measure(run) -> tuple:
+    run()
+    timings = []
+    size = 0
+    for _ in range(ROUNDS):
+        started = time.process_time()
+        size = run()
+        timings.append((time.process_time() - started) * 1000)
+    return round(statistics.median(timings), 1), size
+
+
+def _seed(session_factory) -> None:
+    from app.models import Span, SpanPayloadRef, Trace
+
+    rng = random.Random(5000)
+    start = datetime.utcnow() - timedelta(hours=1)
+    db = session_factory()
+    db.add(Trace(trace_id=TRACE_ID, service_name="bench", started_at=start, span_count=SPAN_COUNT))
+    spans, refs = [], []
+    for index in range(SPAN_COUNT):
+        span_id = f"span{index:06d}"
+        offset = index * 3.0
+        duration = rng.lognormvariate(3, 1)
+        is_tool = index % 3 == 1
+        spans.append(
+            {
+                "trace_id": TRACE_ID,
+                "span_id": span_id,
+                "parent_span_id": None if index == 0 else f"span{(index - 1) // 4:06d}",
+                "name": "tool.execute" if is_tool else "llm.chat",
+                "kind": "SPAN_KIND_INTERNAL",
+                "start_time": start + timedelta(milliseconds=offset),
+                "end_time": start + timedelta(milliseconds=offset + duration),
+                "duration_ms": duration,
+                "status_code": "STATUS_CODE_OK",
+                "attributes": {"tracefoundry.tool.name": f"tool-{index % 20}"}
+                if is_tool
+                else {
+                    "gen_ai.request.model": "gpt-4o",
+                    "gen_ai.usage.input_tokens": rng.randrange(50, 4000),
+                    "gen_ai.usage.output_tokens": rng.randrange(10, 1000),
+                },
+                "events": [],
+                "resource": {"service.name": "bench", "deployment.environment": "bench"},
+            }
+        )
+        refs.append(
+            {
+                "trace_id": TRACE_ID,
+                "span_id": span_id,
+                "payload_ref": f"{index:064x}",
+                "payload_role": "tool_args" if is_tool else "prompt",
+            }
+        )
+    db.bulk_insert_mappings(Span, spans)
+    db.bulk_insert_mappings(SpanPayloadRef, refs)
+    db.commit()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""Bulk synthetic corpus generator for query benchmarks.
+
+Writes traces, spans and payloads straight into the database configured by
+`DB_URL` (and the payload store under `PAYLOAD_DIR`), bypassing `/otlp`:
+SQLAlchemy Core multi-row inserts on SQLite, `COPY ... FROM STDIN` on
+Postgres (psycopg 3). Rows match what ingest and the background worker would
+have written, so every query endpoint works on the result: each trace comes
+with its stored analysis, latency sketches are merged per batch, and a
+`CORPUS_ARCHIVED_RATE` share of traces is compacted into span archives.
+Benchmark with `ARCHIVE_ENABLED=false` so the worker does not compact more
+traces while requests are measured.
+
+Distributions are seeded (`CORPUS_SEED`), and with `CORPUS_END` pinned the
+output is byte-for-byte reproducible:
+
+- services: Zipf-weighted over `CORPUS_SERVICES`, each with its own error rate
+- spans per trace: log-normal around 12, plus a `CORPUS_LARGE_TRACE_RATE`
+  share of long agent runs with 500-3000 spans
+- models and tools: weighted model mix, Zipf over `CORPUS_TOOLS` tool names
+- payloads: prompt/completion on a `CORPUS_PAYLOAD_RATE` share of LLM spans,
+  log-normal sizes around 2 KiB capped at 512 KiB
+- start times: spread evenly over the last `CORPUS_DAYS`, in increasing order
+
+Target an empty database; trace ids repeat for the same seed.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+TRACE_COUNT = int(os.environ.get("CORPUS_TRACES", "10000"))
+SEED = int(os.environ.get("CORPUS_SEED", "20240523"))
+DAYS = float(os.environ.get("CORPUS_DAYS", "7"))
+END = os.environ.get("CORPUS_END")
+SERVICE_COUNT = int(os.environ.get("CORPUS_SERVICES", "20"))
+TOOL_COUNT = int(os.environ.get("CORPUS_TOOLS", "200"))
+LARGE_TRACE_RATE = float(os.environ.get("CORPUS_LARGE_TRACE_RATE", "0.002"))
+PAYLOAD_RATE = float(os.environ.get("CORPUS_PAYLOAD_RATE", "0.2"))
+ARCHIVED_RATE = float(os.environ.get("CORPUS_ARCHIVED_RATE", "0"))
+BATCH_TRACES = int(os.environ.get("CORPUS_BATCH_TRACES", "2000"))
+MAX_PAYLOAD_BYTES = 512 * 1024
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+ENVIRONMENTS = (("prod", 0.7), ("staging", 0.2), ("dev", 0.1))
+# (model, provider, USD per 1K input tokens, USD per 1K output tokens, traffic weight)
+MODELS = (
+    ("gpt-4o", "openai", 0.0025, 0.01, 0.30),
+    ("gpt-4o-mini", "openai", 0.00015, 0.0006, 0.30),
+    ("claude-sonnet", "anthropic", 0.003, 0.015, 0.25),
+    ("llama-3-70b", "meta", 0.0009, 0.0009, 0.15),
+)
+TOOL_ERRORS = ("timeout", "http_500", "invalid_arguments", "rate_limited")
+LLM_ERRORS = ("rate_limit", "context_length_exceeded", "server_error")
+
+TRACE_COLUMNS = (
+    "trace_id",
+    "service_name",
+    "environment",
+    "started_at",
+    "duration_ms",
+    "root_span_name",
+    "status_code",
+    "error_type",
+    "model",
+    "token_in",
+    "token_out",
+    "cost_usd_estimate",
+    "span_count",
+    "last_span_at",
+    "analyzed_at",
+    "critical_path_ms",
+    "error_span_count",
+    "slowest_tool",
+    "slowest_tool_ms",
+)
+ANALYSIS_COLUMNS = ("trace_id", "analyzed_at", "result")
+SPAN_COLUMNS = (
+    "trace_id",
+    "span_id",
+    "parent_span_id",
+    "name",
+    "kind",
+    "start_time",
+    "end_time",
+    "duration_ms",
+    "status_code",
+    "error_type",
+    "attributes",
+    "events",
+    "resource",
+)
+BLOB_COLUMNS = ("payload_ref", "content_type", "compression", "byte_length", "storage_path", "created_at")
+REF_COLUMNS = ("trace_id", "span_id", "payload_ref", "payload_role")
+JSON_COLUMNS = {"attributes", "events", "resource", "result"}
+
+
+class CorpusGenerator:
+    def __init__(
+        self, seed: int, end: datetime, payload_dir: Path, analyze: Callable[[Sequence[Any]], Dict[str, Any]]
+    ) -> None:
+        self.rng = random.Random(seed)
+        self.end = end
+        self.payload_dir = payload_dir
+        self.analyze = analyze
+        self.generated = 0
+        self.services = [f"agent-{index:02d}" for index in range(SERVICE_COUNT)]
+        self.service_weights = _zipf_weights(SERVICE_COUNT)
+        self.service_error_rates = {
+            service: self.rng.uniform(0.001, 0.02) for service in self.services
+        }
+        self.tools = [f"tool-{index}" for index in range(TOOL_COUNT)]
+        self.tool_weights = _zipf_weights(TOOL_COUNT)
+        # Per-tool median latency, so tools differ the way real integrations do.
+        self.tool_latency_ms = {tool: self.rng.lognormvariate(math.log(120), 0.9) for tool in self.tools}
+        self.text = _seeded_text(self.rng, 2 * MAX_PAYLOAD_BYTES)
+        self.seen_payloads: set = set()
+
+    def batch(self, count: int) -> Dict[str, List[Dict[str, Any]]]:
+        rows: Dict[str, List[Dict[str, Any]]] = {
+            "traces": [],
+            "analyses": [],
+            "spans": [],
+            "blobs": [],
+            "refs": [],
+            "archived": [],
+        }
+        for _ in range(count):
+            self._trace(rows)
+        return rows
+
+    def _trace(self, rows: Dict[str, List[Dict[str, Any]]]) -> None:
+        rng = self.rng
+        trace_id = f"{rng.getrandbits(128):032x}"
+        service = rng.choices(self.services, self.service_weights)[0]
+        environment = rng.choices([e for e, _ in ENVIRONMENTS], [w for _, w in ENVIRONMENTS])[0]
+        model = rng.choices(MODELS, [m[4] for m in MODELS])[0]
+        error_rate = self.service_error_rates[service]
+        if rng.random() < LARGE_TRACE_RATE:
+            span_target = rng.randint(500, 3000)
+        else:
+            span_target = max(2, min(400, int(rng.lognormvariate(math.log(12), 1.0))))
+        # Evenly spread and increasing, so each batch covers a short stretch of time.
+        window = DAYS * 86400
+        started = self.end - timedelta(seconds=window - (self.generated + rng.random()) * window / TRACE_COUNT)
+        self.generated += 1
+        resource = {"service.name": service, "deployment.environment": environment}
+
+        spans: List[Dict[str, Any]] = []
+        root_id = f"{rng.getrandbits(64):016x}"
+        cursor = started + timedelta(milliseconds=rng.uniform(1, 20))
+        while len(spans) + 1 < span_target:
+            step_id = f"{rng.getrandbits(64):016x}"
+            step_start = cursor
+            children = min(rng.randint(1, 6), span_target - len(spans) - 2)
+            step_spans = []
+            for _ in range(max(0, children)):
+                span = self._leaf(trace_id, step_id, cursor, model, error_rate, resource, rows)
+                step_spans.append(span)
+                cursor = span["end_time"] + timedelta(milliseconds=rng.uniform(0.5, 15))
+            step_status = _worst_status(step_spans)
+            spans.append(
+                _span_row(
+                    trace_id,
+                    step_id,
+                    root_id,
+                    "agent.step",
+                    step_start,
+                    max(cursor, step_start + timedelta(milliseconds=1)),
+                    step_status,
+                    None,
+                    {},
+                    [],
+                    resource,
+                )
+            )
+            spans.extend(step_spans)
+        # Agents often recover from a failed step; the root only fails half the time.
+        failed = any(span["status_code"] == "STATUS_CODE_ERROR" for span in spans)
+        root_status = "STATUS_CODE_ERROR" if failed and rng.random() < 0.5 else "STATUS_CODE_OK"
+        end = cursor + timedelta(milliseconds=rng.uniform(1, 30))
+        spans.insert(
+            0,
+            _span_row(
+                trace_id,
+                root_id,
+                None,
+                "invoke_agent",
+                started,
+                end,
+                root_status,
+                "agent_failed" if root_status == "STATUS_CODE_ERROR" else None,
+                {"gen_ai.request.model": model[0], "gen_ai.provider.name": model[1]},
+                [],
+                resource,
+            ),
+        )
+
+        token_in = sum(span["attributes"].get("gen_ai.usage.input_tokens", 0) for span in spans)
+        token_out = sum(span["attributes"].get("gen_ai.usage.output_tokens", 0) for span in spans)
+        cost = sum(span["attributes"].get("tracefoundry.cost.usd_estimate", 0.0) for span in spans)
+        analysis = self.analyze([SimpleNamespace(**span) for span in spans])
+        slowest_tool = analysis["slowest_tool"] or {}
+        rows["spans"].extend(spans)
+        rows["analyses"].append({"trace_id": trace_id, "analyzed_at": self.end, "result": analysis})
+        if rng.random() < ARCHIVED_RATE:
+            rows["archived"].append(trace_id)
+        rows["traces"].append(
+            {
+                "trace_id": trace_id,
+                "service_name": service,
+                "environment": environment,
+                "started_at": started,
+                "duration_ms": (end - started).total_seconds() * 1000,
+                "root_span_name": "invoke_agent",
+                "status_code": _worst_status(spans),
+                "error_type": None,
+                "model": model[0],
+                "token_in": token_in or None,
+                "token_out": token_out or None,
+                "cost_usd_estimate": round(cost, 6) if cost else None,
+                "span_count": len(spans),
+                "last_span_at": end,
+                "analyzed_at": self.end,
+                "critical_path_ms": analysis["critical_path_ms"],
+                "error_span_count": analysis["error_span_count"],
+                "slowest_tool": slowest_tool.get("tool_name"),
+                "slowest_tool_ms": slowest_tool.get("duration_ms"),
+            }
+        )
+
+    def _leaf(self, trace_id, parent_id, start, model, error_rate, resource, rows) -> Dict[str, Any]:
+        rng = self.rng
+        span_id = f"{rng.getrandbits(64):016x}"
+        failed = rng.random() < error_rate
+        events: List[Dict[str, Any]] = []
+        if rng.random() < 0.45:
+            name, model_name, provider, price_in, price_out, _ = ("llm.chat",) + model
+            duration = rng.lognormvariate(math.log(900), 0.7)
+            tokens_in = int(rng.lognormvariate(math.log(1200), 0.8))
+            tokens_out = int(rng.lognormvariate(math.log(250), 0.9))
+            attributes = {
+                "gen_ai.request.model": model_name,
+                "gen_ai.provider.name": provider,
+                "gen_ai.usage.input_tokens": tokens_in,
+                "gen_ai.usage.output_tokens": tokens_out,
+                "tracefoundry.cost.usd_estimate": round(
+                    tokens_in / 1000 * price_in + tokens_out / 1000 * price_out, 6
+                ),
+            }
+            error_type = rng.choice(LLM_ERRORS) if failed else None
+        else:
+            name = "tool.execute"
+            tool = rng.choices(self.tools, self.tool_weights)[0]
+            duration = rng.lognormvariate(math.log(self.tool_latency_ms[tool]), 0.6)
+            attributes = {"tracefoundry.tool.name": tool, "http.status_code": 500 if failed else 200}
+            error_type = rng.choice(TOOL_ERRORS) if failed else None
+            if failed or rng.random() < 0.03:
+                events.append(
+                    {
+                        "name": "timeout" if error_type == "timeout" else "retry",
+                        "attributes": {"attempt": rng.randint(2, 4)},
+                        "time_unix_nano": _unix_nano(start + timedelta(milliseconds=duration / 2)),
+                    }
+                )
+        end = start + timedelta(milliseconds=duration)
+        status = "STATUS_CODE_ERROR" if failed else "STATUS_CODE_OK"
+        if name == "llm.chat" and rng.random() < PAYLOAD_RATE:
+            for role in ("prompt", "completion"):
+                self._payload(trace_id, span_id, role, rows)
+        return _span_row(
+            trace_id, span_id, parent_id, name, start, end, status, error_type, attributes, events, resource
+        )
+
+    def _payload(self, trace_id: str, span_id: str, role: str, rows: Dict[str, List[Dict[str, Any]]]) -> None:
+        rng = self.rng
+        size = min(MAX_PAYLOAD_BYTES, max(16, int(rng.lognormvariate(math.log(2048), 1.1))))
+        offset = rng.randrange(0, len(self.text) - size)
+        content = self.text[offset : offset + size]
+        payload_ref = hashlib.sha256(content).hexdigest()
+        if payload_ref not in self.seen_payloads:
+            self.seen_payloads.add(payload_ref)
+            path = self.payload_dir / payload_ref
+            if not path.exists():
+                path.write_bytes(content)
+            rows["blobs"].append(
+                {
+                    "payload_ref": payload_ref,
+                    "content_type": "text/plain",
+                    "compression": "none",
+                    "byte_length": size,
+                    "storage_path": str(path),
+                    "created_at": self.end,
+                }
+            )
+        rows["refs"].append(
+            {"trace_id": trace_id, "span_id": span_id, "payload_ref": payload_ref, "payload_role": role}
+        )
+
+
+def main() -> None:
+    os.environ.setdefault("ATTRIBUTE_ALLOWLIST_PATH", str(REPO_ROOT / "deploy" / "trace-allowlist.yaml"))
+    sys.path.insert(0, str(REPO_ROOT / "apps" / "ingest-api"))
+
+    from app.analysis import analyze_spans
+    from app.config import get_settings
+    from app.db import Base, SessionLocal, create_missing_indexes, engine, upgrade_schema
+    from app.sketches import SketchAggregator
+
+    settings = get_settings()
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    create_missing_indexes(engine)
+    end = datetime.fromisoformat(END) if END else datetime.utcnow().replace(microsecond=0)
+    generator = CorpusGenerator(SEED, end, settings.payload_dir, analyze_spans)
+    sketches = SketchAggregator()
+    writer = _copy_batch if engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg" else _insert_batch
+
+    started = time.perf_counter()
+    totals = {"traces": 0, "analyses": 0, "spans": 0, "blobs": 0, "refs": 0, "archived": 0, "sketch_series": 0}
+    for offset in range(0, TRACE_COUNT, BATCH_TRACES):
+        rows = generator.batch(min(BATCH_TRACES, TRACE_COUNT - offset))
+        writer(engine, rows)
+        db = SessionLocal()
+        try:
+            sketches.observe(
+                SimpleNamespace(**span, service_name=span["resource"]["service.name"]) for span in rows["spans"]
+            )
+            totals["sketch_series"] += sketches.flush(db)
+            _archive(db, rows["archived"], end)
+        finally:
+            db.close()
+        for key, value in rows.items():
+            totals[key] += len(value)
+        elapsed = time.perf_counter() - started
+        print(
+            f"gen_corpus: {totals['traces']}/{TRACE_COUNT} traces, {totals['spans']} spans "
+            f"({totals['spans'] / elapsed:,.0f} spans/s)",
+            file=sys.stderr,
+        )
+    print(
+        json.dumps(
+            {
+                "db": engine.dialect.name,
+                "seed": SEED,
+                "end": end.isoformat(),
+                "traces": totals["traces"],
+                "spans": totals["spans"],
+                "payloads": totals["blobs"],
+                "payload_refs": totals["refs"],
+                "archived_traces": totals["archived"],
+                "sketch_series_buckets": totals["sketch_series"],
+                "seconds": round(time.perf_counter() - started, 1),
+            },
+            indent=2,
+        )
+    )
+
+
+def _archive(db, trace_ids: List[str], archived_at: datetime) -> None:
+    """Compact the given traces the way the worker's archive pass would."""
+    from app.archive import compact_trace
+    from app.models import Trace
+
+    for trace_id in trace_ids:
+        trace = db.get(Trace, trace_id)
+        if trace is not None:
+            compact_trace(db, trace, archived_at)
+    db.commit()
+
+
+def _insert_batch(engine, rows: Dict[str, List[Dict[str, Any]]]) -> None:
+    from app.models import PayloadBlob, Span, SpanPayloadRef, Trace, TraceAnalysis
+
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            # Bulk load: skip fsync; an interrupted load is regenerated anyway.
+            conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        for model, key in (
+            (Trace, "traces"),
+            (TraceAnalysis, "analyses"),
+            (Span, "spans"),
+            (PayloadBlob, "blobs"),
+            (SpanPayloadRef, "refs"),
+        ):
+            if rows[key]:
+                conn.execute(model.__table__.insert(), rows[key])
+
+
+def _copy_batch(engine, rows: Dict[str, List[Dict[str, Any]]]) -> None:
+    import orjson
+
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cursor:
+            for table, key, columns in (
+                ("traces", "traces", TRACE_COLUMNS),
+                ("trace_analyses", "analyses", ANALYSIS_COLUMNS),
+                ("spans", "spans", SPAN_COLUMNS),
+                ("payload_blobs", "blobs", BLOB_COLUMNS),
+                ("span_payload_refs", "refs", REF_COLUMNS),
+            ):
+                with cursor.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+                    for row in rows[key]:
+                        copy.write_row(
+                            [
+                                orjson.dumps(row[column]).decode("utf-8") if column in JSON_COLUMNS else row[column]
+                                for column in columns
+                            ]
+                        )
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def _span_row(
+    trace_id: str,
+    span_id: str,
+    parent_span_id: Optional[str],
+    name: str,
+    start: datetime,
+    end: datetime,
+    status: str,
+    error_type: Optional[str],
+    attributes: Dict[str, Any],
+    events: List[Dict[str, Any]],
+    resource: Dict[str, Any],
+) -> Dict[str, Any]:
+    return {
+        "trace_id": trace_id,
+        "span_id": span_id,
+        "parent_span_id": parent_span_id,
+        "name": name,
+        "kind": "SPAN_KIND_CLIENT" if name in ("llm.chat", "tool.execute") else "SPAN_KIND_INTERNAL",
+        "start_time": start,
+        "end_time": end,
+        "duration_ms": (end - start).total_seconds() * 1000,
+        "status_code": status,
+        "error_type": error_type,
+        "attributes": attributes,
+        "events": events,
+        "resource": resource,
+    }
+
+
+def _worst_status(spans: Sequence[Dict[str, Any]]) -> str:
+    if any(span["status_code"] == "STATUS_CODE_ERROR" for span in spans):
+        return "STATUS_CODE_ERROR"
+    return "STATUS_CODE_OK"
+
+
+def _zipf_weights(count: int, exponent: float = 1.1) -> List[float]:
+    return [1 / (rank**exponent) for rank in range(1, count + 1)]
+
+
+def _seeded_text(rng: random.Random, size: int) -> bytes:
+    words = [
+        "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 10)))
+        for _ in range(2000)
+    ]
+    chunks: List[str] = []
+    length = 0
+    while length < size:
+        word = rng.choice(words)
+        chunks.append(word)
+        length += len(word) + 1
+    return " ".join(chunks).encode("utf-8")[:size]
+
+
+def _unix_nano(value: datetime) -> int:
+    return int((value - datetime(1970, 1, 1)).total_seconds() * 1_000_000_000)
+
+
+if __name__ == "__main__":
+    main()